@@ -0,0 +1,4 @@
+"""性能测试.
+
+在项目根目录下运行, 例如 `python -m bench.bench_base64`.
+"""
@@ -0,0 +1,96 @@
+"""模运算: `ModN` 逐个计算 vs `ModArray` 逐元素计算, 每秒处理的元素个数.
+
+RSA: 各模数位数下生成密钥的时间, 以及使用和不使用 CRT 时单次解密的时间.
+
+密钥分配中心: 各种 `KeyStore` 下, 逐个签发和批量签发时每秒签发的会话数.
+"""
+
+import os
+import random
+import secrets
+import tempfile
+import time
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+from bench.util import best_time
+from nami.asymmetric import (
+    RSA, KeyDistributionCenter, MemoryKeyStore, MmapKeyStore, ModArray, ModN, SQLiteKeyStore, generate_rsa_key,
+)
+
+N = 10 ** 9 + 7
+COUNT = 1 << 20
+RSA_BITS = (1024, 2048, 3072)
+# 每种位数生成密钥的次数, 取平均值
+KEYGEN_COUNT = 3
+PRINCIPALS = 10000
+SESSIONS = 10000
+BATCH_SIZES = (1, 100, 1000)
+
+
+def bench_rsa():
+    for bits in RSA_BITS:
+        start = time.perf_counter()
+        keys = [generate_rsa_key(bits) for _ in range(KEYGEN_COUNT)]
+        keygen_ms = (time.perf_counter() - start) / KEYGEN_COUNT * 1e3
+        rsa = RSA(keys[0])
+        c = rsa.encrypt_int(secrets.randbelow(keys[0].n))
+        crt_ms = best_time(lambda: rsa.decrypt_int(c), number=10) * 1e3
+        plain_ms = best_time(lambda: rsa.decrypt_int(c, crt=False), number=10) * 1e3
+        print(f'RSA-{bits:<5} keygen {keygen_ms:8.1f} ms  decrypt {plain_ms:6.2f} ms  '
+              f'CRT {crt_ms:6.2f} ms  x{plain_ms / crt_ms:.1f}')
+
+
+def bench_mod():
+    if np is None:
+        print('ModArray: skipped, numpy is not installed')
+        return
+    rng = np.random.default_rng(0)
+    x = ModArray(rng.integers(1, N, COUNT, dtype=np.uint64), N)
+    y = ModArray(rng.integers(1, N, COUNT, dtype=np.uint64), N)
+    xs = [ModN(v, N) for v in x.tolist()[:COUNT // 16]]
+    ys = [ModN(v, N) for v in y.tolist()[:COUNT // 16]]
+
+    for name, scalar, vector in (
+        ('mul', lambda: [a * b for a, b in zip(xs, ys)], lambda: x * y),
+        ('pow 65537', lambda: [a ** 65537 for a in xs], lambda: x ** 65537),
+        ('inverse', lambda: [a.inverse() for a in xs], lambda: x.inverse()),
+    ):
+        scalar_rate = len(xs) / best_time(scalar, number=1)
+        vector_rate = COUNT / best_time(vector, number=1)
+        print(f'{name:<10} ModN {scalar_rate / 1e6:8.2f} M/s  ModArray {vector_rate / 1e6:8.2f} M/s')
+
+
+def bench_kdc():
+    rng = random.Random(0)
+    names = [f'user{i}' for i in range(PRINCIPALS)]
+    pairs = [(rng.choice(names), rng.choice(names)) for _ in range(SESSIONS)]
+    with tempfile.TemporaryDirectory() as tmp:
+        for store_name, store in (
+            ('memory', MemoryKeyStore()),
+            ('sqlite', SQLiteKeyStore(os.path.join(tmp, 'keys.db'))),
+            ('mmap', MmapKeyStore(os.path.join(tmp, 'keys.bin'))),
+        ):
+            with KeyDistributionCenter(store, cache_size=SESSIONS) as kdc:
+                kdc.register_many(names)
+                rates = []
+                for batch_size in BATCH_SIZES:
+                    seconds = best_time(lambda: [
+                        kdc.issue_sessions(pairs[start:start + batch_size])
+                        for start in range(0, SESSIONS, batch_size)
+                    ], number=1)
+                    rates.append(f'batch {batch_size:<5} {SESSIONS / seconds / 1e3:7.1f} k/s')
+                print(f'KDC {store_name:<7}', '  '.join(rates))
+
+
+def main():
+    bench_mod()
+    bench_rsa()
+    bench_kdc()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+"""Base64 编码解码吞吐量: 二进制字符串版 vs 查表版 vs 标准库, 以及各变体的解码速度."""
+
+import base64
+import secrets
+
+from bench.util import best_time, mb_per_s
+from nami.base64_ import (
+    MIME, STANDARD, URL_SAFE, URL_SAFE_NO_PADDING,
+    b64decode, b64encode, bin_str_b64decode, bin_str_b64encode,
+)
+
+SIZES = (1 << 10, 1 << 16, 1 << 20)
+# 二进制字符串版太慢, 只测小数据
+BIN_STR_MAX_SIZE = 1 << 16
+# 类似 JWT 的短 token
+TOKEN_SIZE = 96
+TOKEN_COUNT = 10000
+
+
+def main():
+    print(f'{"size":>8} {"impl":>8} {"encode MB/s":>12} {"decode MB/s":>12}')
+    for size in SIZES:
+        data = secrets.token_bytes(size)
+        encoded = base64.b64encode(data)
+        impls = [
+            ('table', b64encode, b64decode),
+            ('stdlib', base64.b64encode, base64.b64decode),
+        ]
+        if size <= BIN_STR_MAX_SIZE:
+            impls.insert(0, ('bin_str', bin_str_b64encode, bin_str_b64decode))
+        for name, encode, decode in impls:
+            encode_s = best_time(lambda: encode(data))
+            decode_s = best_time(lambda: decode(encoded))
+            print(f'{size:>8} {name:>8} {mb_per_s(size, encode_s):>12.2f} {mb_per_s(size, decode_s):>12.2f}')
+
+    print()
+    print(f'{"variant":>20} {"tokens/s":>12}')
+    tokens = [secrets.token_bytes(TOKEN_SIZE) for _ in range(TOKEN_COUNT)]
+    for name, variant in (
+        ('STANDARD', STANDARD),
+        ('URL_SAFE', URL_SAFE),
+        ('URL_SAFE_NO_PADDING', URL_SAFE_NO_PADDING),
+        ('MIME', MIME),
+    ):
+        encoded = [variant.encode(token) for token in tokens]
+        seconds = best_time(lambda: [variant.decode(token) for token in encoded], number=1)
+        print(f'{name:>20} {TOKEN_COUNT / seconds:>12.0f}')
+
+
+if __name__ == '__main__':
+    main()
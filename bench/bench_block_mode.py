@@ -0,0 +1,73 @@
+"""
+- AES-CTR 吞吐量: 单线程 `encrypt` vs 不同线程数和分段大小的 `parallel_encrypt`.
+- 小消息的单条成本: 逐条 `encrypt` vs 不同批量大小的 `encrypt_many`.
+
+用法: python -m bench.bench_block_mode [数据大小 MB]
+"""
+
+import os
+import secrets
+import sys
+
+from cryptography.hazmat.primitives.ciphers import modes
+
+from bench.util import best_time, mb_per_s
+from nami.block_mode import AES
+
+WORKERS = (1, 2, 4, 8, 16, 32)
+SEGMENT_SIZES = (1 << 16, 1 << 20, 1 << 22, 1 << 24)
+BATCH_SIZES = (1, 10, 100, 1000, 10000, 100000)
+RECORD_SIZE = 64
+
+
+def bench_parallel(size: int):
+    msg = secrets.token_bytes(size)
+    out = bytearray(size)
+    aes = AES(modes.CTR(secrets.token_bytes(AES.BLOCK_SIZE)), secrets.token_bytes(32))
+
+    print(f'cpu count: {os.cpu_count()}, data size: {size >> 20} MB')
+    print(f'single thread encrypt: {mb_per_s(size, best_time(lambda: aes.encrypt(msg))):.0f} MB/s')
+    print()
+    print(f'{"workers":>8}' + ''.join(f'{f"{segment_size >> 10} KB":>12}' for segment_size in SEGMENT_SIZES))
+    for workers in WORKERS:
+        row = f'{workers:>8}'
+        for segment_size in SEGMENT_SIZES:
+            seconds = best_time(lambda: aes.parallel_encrypt(
+                msg, out=out, workers=workers, segment_size=segment_size,
+            ))
+            row += f'{mb_per_s(size, seconds):>12.0f}'
+        print(row)
+
+
+def bench_many():
+    key = secrets.token_bytes(32)
+    print(f'{"mode":>6} {"batch":>8} {"loop us":>10} {"many us":>10}')
+    for mode_name in ('ECB', 'CBC'):
+        for batch_size in BATCH_SIZES:
+            records = [secrets.token_bytes(RECORD_SIZE) for _ in range(batch_size)]
+            ivs = [secrets.token_bytes(AES.BLOCK_SIZE) for _ in range(batch_size)]
+            if mode_name == 'ECB':
+                aes = AES(modes.ECB(), key)
+                impls = (
+                    lambda: [aes.encrypt(record) for record in records],
+                    lambda: aes.encrypt_many(records),
+                )
+            else:
+                aes = AES(modes.CBC(ivs[0]), key)
+                impls = (
+                    lambda: [AES(modes.CBC(iv), key).encrypt(record) for iv, record in zip(ivs, records)],
+                    lambda: aes.encrypt_many(records, ivs),
+                )
+            number = max(1, 10000 // batch_size)
+            loop_us, many_us = (best_time(func, number=number) / batch_size * 1e6 for func in impls)
+            print(f'{mode_name:>6} {batch_size:>8} {loop_us:>10.2f} {many_us:>10.2f}')
+
+
+def main():
+    bench_parallel(int(sys.argv[1]) << 20 if len(sys.argv) > 1 else 64 << 20)
+    print()
+    bench_many()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,29 @@
+"""碰撞试验的吞吐量 (每秒处理的键数) 和 `BirthdayParadox` 的单次耗时."""
+
+import itertools
+import math
+
+from bench.util import best_time
+from nami.hash_func import BirthdayParadox, counter_keys, first_collision
+
+BITS = (16, 24, 30, 32, 40)
+# 每种截断位数最多处理的键数
+MAX_KEYS = 1 << 20
+
+
+def main():
+    for bits in BITS:
+        n = first_collision(counter_keys(0), bits) or MAX_KEYS
+        n = min(n, MAX_KEYS)
+        seconds = best_time(lambda: first_collision(itertools.islice(counter_keys(0), n), bits), number=1)
+        print(f'first_collision bits={bits:<3} keys={n:<8} {n / seconds / 1e6:.2f} M keys/s')
+
+    for y in (365, 1 << 32, 1 << 64, 1 << 128):
+        seconds = best_time(lambda: BirthdayParadox.least_number(y, 0.5), number=1000)
+        print(f'least_number log2(y)={math.log2(y):<6.1f} {seconds * 1e6:.1f} us')
+        seconds = best_time(lambda: BirthdayParadox.probability(y, 10 ** 6), number=1000)
+        print(f'probability  log2(y)={math.log2(y):<6.1f} {seconds * 1e6:.1f} us')
+
+
+if __name__ == '__main__':
+    main()
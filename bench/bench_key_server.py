@@ -0,0 +1,74 @@
+"""密钥分配中心服务: 不同并发数下每秒完成的请求数, 以及请求延迟的 p50 和 p99.
+
+服务端和负载生成器运行在同一个进程的同一个事件循环中, 分别测试 TCP 和 Unix socket.
+每个并发的协程串行地发送请求, 等到响应后再发送下一个.
+"""
+
+import asyncio
+import os
+import tempfile
+import time
+from typing import List
+
+from nami.asymmetric import KeyDistributionCenter
+from nami.key_server import KeyClient, KeyServer
+
+PRINCIPALS = 1000
+# 每个并发数下运行的秒数
+DURATION = 2.0
+CONCURRENCY = (1, 4, 16, 64, 256)
+POOL_SIZE = 4
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+async def load(client: KeyClient, concurrency: int, duration: float) -> None:
+    latencies = []
+    deadline = time.perf_counter() + duration
+
+    async def worker(i: int):
+        j = i
+        while time.perf_counter() < deadline:
+            a, b = f'user{j % PRINCIPALS}', f'user{(j * 7 + 1) % PRINCIPALS}'
+            start = time.perf_counter()
+            await client.issue_session(a, b)
+            latencies.append(time.perf_counter() - start)
+            j += concurrency
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    print(f'  concurrency {concurrency:<4} {len(latencies) / elapsed / 1e3:7.1f} k req/s  '
+          f'p50 {percentile(latencies, 0.5) * 1e3:7.3f} ms  p99 {percentile(latencies, 0.99) * 1e3:7.3f} ms')
+
+
+async def bench_transport(transport: str, tmp: str) -> None:
+    kdc = KeyDistributionCenter()
+    kdc.register_many(f'user{i}' for i in range(PRINCIPALS))
+    server = KeyServer(kdc)
+    if transport == 'unix':
+        path = os.path.join(tmp, 'kdc.sock')
+        await server.start(path=path)
+        client = KeyClient(path=path, pool_size=POOL_SIZE)
+    else:
+        await server.start()
+        client = KeyClient(port=server.address[1], pool_size=POOL_SIZE)
+
+    print(f'{transport} (pool size {POOL_SIZE})')
+    async with server, client:
+        for concurrency in CONCURRENCY:
+            await load(client, concurrency, DURATION)
+    print(f'  {server.requests} requests in {server.batches} batches')
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        for transport in ('tcp', 'unix'):
+            asyncio.run(bench_transport(transport, tmp))
+
+
+if __name__ == '__main__':
+    main()
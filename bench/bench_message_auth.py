@@ -0,0 +1,29 @@
+"""HMAC 吞吐量: 散列函数 x 消息大小, 使用预先计算状态的 `Hmac.digest_many`."""
+
+import hashlib
+import secrets
+
+from bench.util import best_time, mb_per_s
+from nami.message_auth import Hmac
+
+DIGESTMODS = ('sha256', 'sha512', 'blake2b', 'blake2s', 'sha3_256')
+SIZES = (64, 1 << 10, 1 << 16, 1 << 20)
+# 每种消息大小总共处理的字节数
+TOTAL_SIZE = 1 << 22
+
+
+def main():
+    key = secrets.token_bytes(32)
+    print(f'{"MB/s":>10}' + ''.join(f'{size:>10}' for size in SIZES))
+    for name in DIGESTMODS:
+        mac = Hmac(key, digestmod=getattr(hashlib, name))
+        row = f'{name:>10}'
+        for size in SIZES:
+            msgs = [secrets.token_bytes(size)] * max(1, TOTAL_SIZE // size)
+            seconds = best_time(lambda: mac.digest_many(msgs), number=1)
+            row += f'{mb_per_s(size * len(msgs), seconds):>10.1f}'
+        print(row)
+
+
+if __name__ == '__main__':
+    main()
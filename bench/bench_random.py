@@ -0,0 +1,50 @@
+"""伪随机数生成器: 逐个调用 `random` 与批量生成的吞吐量, 以及 `spawn` 后在进程池中生成的扩展性."""
+
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from bench.util import best_time, mb_per_s
+from nami.random_ import HashDrbg, HashRandom, LinearCongruentialRandom
+
+# 每种方式生成的值的个数
+COUNT = 1 << 20
+WORKERS = (1, 2, 4)
+
+
+def random_bytes(gen: HashRandom, size: int) -> int:
+    return len(gen.random_bytes(size))
+
+
+def main():
+    lcg = LinearCongruentialRandom(48271, 0, 2 ** 31 - 1)
+    seconds = best_time(lambda: [lcg.random() for _ in range(COUNT)], number=1)
+    print(f'LCG random       {COUNT / seconds / 1e6:8.2f} M values/s')
+    seconds = best_time(lambda: lcg.random_array(COUNT), number=1)
+    print(f'LCG random_array {COUNT / seconds / 1e6:8.2f} M values/s')
+
+    hash_random = HashRandom()
+    count = COUNT // 32
+    size = COUNT * 32
+    seconds = best_time(lambda: [hash_random.random() for _ in range(count)], number=1)
+    print(f'HashRandom random       {mb_per_s(count * 32, seconds):8.2f} MB/s')
+    seconds = best_time(lambda: hash_random.random_bytes(count * 32), number=1)
+    print(f'HashRandom random_bytes {mb_per_s(count * 32, seconds):8.2f} MB/s')
+
+    drbg = HashDrbg()
+    seconds = best_time(lambda: drbg.randbytes(size), number=1)
+    print(f'HashDrbg randbytes      {mb_per_s(size, seconds):8.2f} MB/s')
+    seconds = best_time(lambda: [drbg.randbelow(1000) for _ in range(count)], number=1)
+    print(f'HashDrbg randbelow      {count / seconds / 1e6:8.2f} M values/s')
+
+    # 总量固定, 按进程数切分成互不重叠的子序列
+    for workers in WORKERS:
+        gens = hash_random.spawn(workers, size // workers // 32)
+        with ProcessPoolExecutor(workers) as pool:
+            start = time.perf_counter()
+            list(pool.map(random_bytes, gens, [size // workers] * workers))
+            seconds = time.perf_counter() - start
+        print(f'HashRandom spawn workers={workers} {mb_per_s(size, seconds):8.2f} MB/s')
+
+
+if __name__ == '__main__':
+    main()
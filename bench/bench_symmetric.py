@@ -0,0 +1,70 @@
+"""TripleDES 小消息的单条成本: 逐条 `encrypt` vs 不同批量大小的 `encrypt_many`.
+
+Feistel 网络每秒加密的分组数: `Feistel` 逐条加密 vs `FeistelEngine` 逐个分组和批量加密.
+
+FF1 每秒加密的值的个数: 逐个 `encrypt` vs `encrypt_many`, 以及循环行走的 `encrypt_ints`.
+"""
+
+import secrets
+
+from bench.util import best_time
+from nami.symmetric import FF1, Feistel, FeistelEngine, TripleDES
+from nami.util import Binary
+
+BATCH_SIZES = (1, 10, 100, 1000, 10000, 100000)
+RECORD_SIZE = 64
+
+
+def bench_many():
+    key, _ = TripleDES.generate_key()
+    print(f'{"batch":>8} {"loop us":>10} {"many us":>10}')
+    for batch_size in BATCH_SIZES:
+        records = [secrets.token_bytes(RECORD_SIZE) for _ in range(batch_size)]
+        ivs = [TripleDES.generate_key()[1] for _ in range(batch_size)]
+        des = TripleDES(key, ivs[0])
+        number = max(1, 10000 // batch_size)
+        loop_us = best_time(
+            lambda: [TripleDES(key, iv).encrypt(record) for iv, record in zip(ivs, records)],
+            number=number,
+        ) / batch_size * 1e6
+        many_us = best_time(lambda: des.encrypt_many(records, ivs), number=number) / batch_size * 1e6
+        print(f'{batch_size:>8} {loop_us:>10.2f} {many_us:>10.2f}')
+
+
+def bench_feistel(count: int = 1 << 16):
+    legacy = Feistel(Feistel.generate_key(4), 10, lambda key, r: Binary.bytes_xor(key, r))
+    msgs = [secrets.token_bytes(8) for _ in range(count // 16)]
+    seconds = best_time(lambda: [legacy.encrypt(msg) for msg in msgs], number=1)
+    print(f'Feistel              {len(msgs) / seconds / 1e6:8.3f} M blocks/s')
+
+    engine = FeistelEngine.from_key(secrets.token_bytes(16), 32)
+    blocks = [secrets.randbits(64) for _ in range(count)]
+    seconds = best_time(lambda: [engine.encrypt(block) for block in blocks[:count // 16]], number=1)
+    print(f'FeistelEngine        {count // 16 / seconds / 1e6:8.3f} M blocks/s')
+    seconds = best_time(lambda: engine.encrypt_blocks(blocks), number=1)
+    print(f'FeistelEngine blocks {count / seconds / 1e6:8.3f} M blocks/s')
+
+
+def bench_ff1(count: int = 1 << 15):
+    ff1 = FF1(secrets.token_bytes(16))
+    for length in (10, 16, 40):
+        texts = [str(secrets.randbelow(10 ** length)).zfill(length) for _ in range(count)]
+        seconds = best_time(lambda: [ff1.encrypt(text) for text in texts[:count // 8]], number=1)
+        loop = count // 8 / seconds
+        seconds = best_time(lambda: ff1.encrypt_many(texts), number=1)
+        print(f'FF1 length={length:<3} encrypt {loop / 1e3:8.1f} K/s  encrypt_many {count / seconds / 1e3:8.1f} K/s')
+
+    domain = 5_000_000
+    values = [secrets.randbelow(domain) for _ in range(count)]
+    seconds = best_time(lambda: ff1.encrypt_ints(values, domain), number=1)
+    print(f'FF1 encrypt_ints domain={domain} {count / seconds / 1e3:8.1f} K/s')
+
+
+def main():
+    bench_many()
+    bench_feistel()
+    bench_ff1()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+"""XOR 吞吐量: 逐字节生成器 vs `bulk_xor` 的大整数 / NumPy 后端, 以及写入已有 buffer."""
+
+import secrets
+
+from bench.util import best_time, mb_per_s
+from nami import util
+from nami.util import bulk_xor
+
+SIZES = (16, 256, 4096, 1 << 16, 1 << 20)
+
+
+def generator_xor(b1: bytes, b2: bytes) -> bytes:
+    return bytes(item1 ^ item2 for item1, item2 in zip(b1, b2))
+
+
+def main():
+    numpy = util.np
+    print(f'{"size":>8} {"impl":>10} {"MB/s":>10}')
+    for size in SIZES:
+        b1, b2 = secrets.token_bytes(size), secrets.token_bytes(size)
+        out = bytearray(size)
+        impls = [
+            ('generator', lambda: generator_xor(b1, b2)),
+            ('bulk', lambda: bulk_xor(b1, b2)),
+            ('bulk_into', lambda: bulk_xor(b1, b2, out=out)),
+        ]
+        for name, func in impls:
+            print(f'{size:>8} {name:>10} {mb_per_s(size, best_time(func, number=20)):>10.2f}')
+        if numpy is not None:
+            # 强制使用大整数后端做对比
+            util.np = None
+            seconds = best_time(lambda: bulk_xor(b1, b2), number=20)
+            util.np = numpy
+            print(f'{size:>8} {"bulk_int":>10} {mb_per_s(size, seconds):>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
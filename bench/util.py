@@ -0,0 +1,16 @@
+__all__ = (
+    'best_time',
+    'mb_per_s',
+)
+
+import timeit
+from typing import Callable
+
+
+def best_time(func: Callable, number: int = 3, repeat: int = 3) -> float:
+    """多次运行取最快的一次, 返回单次调用的秒数."""
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def mb_per_s(size: int, seconds: float) -> float:
+    return size / seconds / 1e6
@@ -2,22 +2,75 @@
 
 demo:
   - P105 密钥中心. `KeyCenter`
-  - P110 时钟运算. `Mod12`
+  - P110 时钟运算. `Mod12`, 任意模数的 `ModN`, 以及 NumPy 数组版本的 `ModArray`.
 
-RSA 的最终实现可以用于生产环境, 所以放到了:
+教科书式的 RSA `RSA`:
+  - 素数生成: 先用小素数筛掉一个窗口内的合数, 剩下的再做 Miller-Rabin 检验.
+  - 加密使用 OAEP 填充 (RFC 8017, SHA-256 + MGF1), 可以与 `cryptography` 互相加解密.
+  - 解密使用中国剩余定理 (CRT), 用预先计算的 dP, dQ, qInv 分别在 mod p 和 mod q 下求幂.
+  - `generate_rsa_keys` 在进程池中批量生成密钥.
+
+密钥分配中心 `KeyDistributionCenter`:
+  - 主密钥存放在可替换的 `KeyStore` 中: 内存字典, SQLite, 或者 mmap 映射的定长记录文件,
+    都以主体名为索引.
+  - 会话密钥用双方的主密钥以 AES-GCM 封装, 会话编号和双方名字作为附加数据.
+  - 签发的会话保存在按 TTL 过期, 按 LRU 淘汰的 `SessionCache` 中.
+  - `issue_sessions` 一次签发多个会话, 主密钥一次查出, 随机数一次生成.
+
+可以用于生产环境的 RSA 放到了:
 https://github.com/dyq666/sanji/blob/master/util/third_cryptography.py
 """
 
+import asyncio
+import hashlib
+import hmac
+import math
+import mmap
+import os
 import secrets
-from typing import Optional
+import sqlite3
+import struct
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 
-from nami.util import Binary
+from nami.util import Binary, bulk_xor
+
+# 模数不超过此值时, 一次算出所有元素的逆元并缓存
+INVERSE_TABLE_MAX = 1 << 16
+# `ModArray` 的模数上限, 保证两个元素的乘积不超过 uint64
+MOD_ARRAY_MAX = 1 << 32
+# 筛选素数候选时使用的小素数的上限
+SIEVE_LIMIT = 2000
+# 每次筛选的候选数个数 (只包含奇数)
+SIEVE_WINDOW = 4096
+# 检验任意整数时 Miller-Rabin 的轮数, 合数通过检验的概率不超过 4 ** -40
+MR_ROUNDS = 40
+# 主密钥和会话密钥的默认长度 (AES-256)
+MASTER_KEY_SIZE = 32
+SESSION_KEY_SIZE = 32
+SESSION_ID_SIZE = 16
+NONCE_SIZE = 12
+# 会话的默认有效期 (秒) 和缓存的会话个数上限
+SESSION_TTL = 300.0
+SESSION_CACHE_SIZE = 1 << 16
 
 
 class KeyCenter:
     """密钥中心.
 
-    假设 `keys` 是存储密钥的数据库, 加密算法是 XOR.
+    假设 `keys` 是存储密钥的数据库, 加密算法是 XOR. 实际使用的版本见 `KeyDistributionCenter`.
     """
 
     keys = {
@@ -40,6 +93,509 @@ class KeyCenter:
         return secrets.token_bytes(1)
 
 
+class KeyStore(ABC):
+    """主密钥的存储, 以主体名为键. 子类实现 `get`, `put`, `delete`, `__len__`.
+
+    所有实现都可以在多个线程中同时使用.
+    """
+
+    def __enter__(self) -> 'KeyStore':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __repr__(self):
+        return (
+            f'<{self.__class__.__name__}'
+            f' size={len(self)!r}'
+            f'>'
+        )
+
+    @abstractmethod
+    def __len__(self):
+        """已登记的主体数."""
+
+    def __contains__(self, name: str) -> bool:
+        return self.get(name) is not None
+
+    @abstractmethod
+    def get(self, name: str) -> Optional[bytes]:
+        """`name` 的密钥, 不存在时返回 None."""
+
+    @abstractmethod
+    def put(self, name: str, key: bytes) -> None:
+        """保存 `name` 的密钥, 已存在时覆盖."""
+
+    @abstractmethod
+    def delete(self, name: str) -> bool:
+        """删除 `name` 的密钥, 返回是否存在."""
+
+    def get_many(self, names: Iterable[str]) -> Dict[str, bytes]:
+        """一次取出多个主体的密钥, 不存在的主体不出现在结果中."""
+        res = {}
+        for name in names:
+            key = self.get(name)
+            if key is not None:
+                res[name] = key
+        return res
+
+    def put_many(self, items: Iterable[Tuple[str, bytes]]) -> None:
+        for name, key in items:
+            self.put(name, key)
+
+    def close(self) -> None:
+        pass
+
+
+class MemoryKeyStore(KeyStore):
+    """保存在字典中, 进程退出后丢失."""
+
+    def __init__(self, keys: Optional[Dict[str, bytes]] = None):
+        self.keys = dict(keys or {})
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def get(self, name: str) -> Optional[bytes]:
+        # 字典的单次读取是原子的, 不需要加锁
+        return self.keys.get(name)
+
+    def get_many(self, names: Iterable[str]) -> Dict[str, bytes]:
+        # 先判断再读取不是原子的, 两步之间其他线程可能删除密钥, 因此每个名字只读取一次
+        get = self.keys.get
+        res = {}
+        for name in names:
+            key = get(name)
+            if key is not None:
+                res[name] = key
+        return res
+
+    def put(self, name: str, key: bytes) -> None:
+        with self.lock:
+            self.keys[name] = bytes(key)
+
+    def put_many(self, items: Iterable[Tuple[str, bytes]]) -> None:
+        with self.lock:
+            self.keys.update((name, bytes(key)) for name, key in items)
+
+    def delete(self, name: str) -> bool:
+        with self.lock:
+            return self.keys.pop(name, None) is not None
+
+
+class SQLiteKeyStore(KeyStore):
+    """保存在 SQLite 中, 主体名是主键. 使用 WAL 模式, 多个进程可以同时读写同一个文件."""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS principals (
+            name TEXT PRIMARY KEY,
+            key BLOB NOT NULL
+        ) WITHOUT ROWID;
+    """
+    # 单条 SQL 中参数个数的上限 (SQLite 旧版本的默认值是 999)
+    MAX_PARAMS = 900
+
+    def __init__(self, path: str = ':memory:', timeout: float = 30.0):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(path), timeout=timeout, isolation_level=None, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript(self.SCHEMA)
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute('SELECT COUNT(*) FROM principals').fetchone()[0]
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def get(self, name: str) -> Optional[bytes]:
+        with self.lock:
+            row = self.conn.execute('SELECT key FROM principals WHERE name = ?', (name,)).fetchone()
+        return None if row is None else row[0]
+
+    def get_many(self, names: Iterable[str]) -> Dict[str, bytes]:
+        names = list(dict.fromkeys(names))
+        res = {}
+        with self.lock:
+            for start in range(0, len(names), self.MAX_PARAMS):
+                chunk = names[start:start + self.MAX_PARAMS]
+                rows = self.conn.execute(
+                    f'SELECT name, key FROM principals WHERE name IN ({", ".join("?" * len(chunk))})',
+                    chunk,
+                )
+                res.update(rows)
+        return res
+
+    def put(self, name: str, key: bytes) -> None:
+        with self.lock:
+            self.conn.execute('INSERT OR REPLACE INTO principals VALUES (?, ?)', (name, bytes(key)))
+
+    def put_many(self, items: Iterable[Tuple[str, bytes]]) -> None:
+        with self.lock:
+            # 放在一个事务中, 避免每行都同步一次磁盘
+            with self.conn:
+                self.conn.execute('BEGIN')
+                self.conn.executemany(
+                    'INSERT OR REPLACE INTO principals VALUES (?, ?)',
+                    ((name, bytes(key)) for name, key in items),
+                )
+
+    def delete(self, name: str) -> bool:
+        with self.lock:
+            return self.conn.execute('DELETE FROM principals WHERE name = ?', (name,)).rowcount > 0
+
+
+class MmapKeyStore(KeyStore):
+    """保存在 mmap 映射的文件中, 适合只在一个进程中使用的大量密钥.
+
+    文件由文件头和定长的记录组成, 每条记录是 (状态, 名字长度, 名字, 密钥长度, 密钥).
+    打开时扫描一遍所有记录, 在内存中建立主体名到记录位置的索引, 之后的读取只需一次切片.
+    删除只把记录标记为空闲, 空闲记录在之后插入时复用. 记录用完时文件容量翻倍.
+    """
+
+    MAGIC = b'NAMIKEYS'
+    # 魔数, 已使用的记录数
+    HEADER = struct.Struct('<8sQ')
+    MAX_NAME = 64
+    MAX_KEY = 64
+    RECORD = struct.Struct(f'<BB{MAX_NAME}sB{MAX_KEY}s')
+    KEY_OFFSET = 2 + MAX_NAME
+    FREE, USED = 0, 1
+
+    def __init__(self, path: str, capacity: int = 1024):
+        self.lock = threading.RLock()
+        self.file = open(path, 'a+b')
+        self.file.seek(0, os.SEEK_END)
+        if self.file.tell() == 0:
+            self.file.write(self.HEADER.pack(self.MAGIC, 0))
+            self.file.truncate(self.HEADER.size + max(1, capacity) * self.RECORD.size)
+            self.file.flush()
+            self.file.seek(0, os.SEEK_END)
+        if self.file.tell() < self.HEADER.size + self.RECORD.size:
+            self.file.close()
+            raise ValueError(f'{str(path)!r} is not a key store file')
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        magic, self.used = self.HEADER.unpack_from(self.map)
+        if magic != self.MAGIC:
+            self.map.close()
+            self.file.close()
+            raise ValueError(f'{str(path)!r} is not a key store file')
+        self.capacity = (len(self.map) - self.HEADER.size) // self.RECORD.size
+        self.index = {}
+        self.free = []
+        for slot in range(self.used):
+            state, name_size, name, _, _ = self.RECORD.unpack_from(self.map, self.offset(slot))
+            if state == self.USED:
+                self.index[name[:name_size].decode()] = slot
+            else:
+                self.free.append(slot)
+
+    def __len__(self):
+        return len(self.index)
+
+    def offset(self, slot: int) -> int:
+        return self.HEADER.size + slot * self.RECORD.size
+
+    def close(self) -> None:
+        with self.lock:
+            if not self.map.closed:
+                self.map.flush()
+                self.map.close()
+            self.file.close()
+
+    def flush(self) -> None:
+        with self.lock:
+            self.map.flush()
+
+    def get(self, name: str) -> Optional[bytes]:
+        with self.lock:
+            slot = self.index.get(name)
+            if slot is None:
+                return None
+            start = self.offset(slot) + self.KEY_OFFSET
+            return self.map[start + 1:start + 1 + self.map[start]]
+
+    def get_many(self, names: Iterable[str]) -> Dict[str, bytes]:
+        res = {}
+        with self.lock:
+            for name in names:
+                slot = self.index.get(name)
+                if slot is not None:
+                    start = self.offset(slot) + self.KEY_OFFSET
+                    res[name] = self.map[start + 1:start + 1 + self.map[start]]
+        return res
+
+    def put(self, name: str, key: bytes) -> None:
+        encoded = name.encode()
+        if len(encoded) > self.MAX_NAME:
+            raise ValueError(f'name must be at most {self.MAX_NAME} bytes')
+        if len(key) > self.MAX_KEY:
+            raise ValueError(f'key must be at most {self.MAX_KEY} bytes')
+        with self.lock:
+            slot = self.index.get(name)
+            if slot is None:
+                slot = self.allocate()
+            offset = self.offset(slot)
+            # 先写入内容再标记为已使用, 中途崩溃时这条记录只会被当作空闲
+            self.RECORD.pack_into(self.map, offset, self.FREE, len(encoded), encoded, len(key), bytes(key))
+            self.map[offset] = self.USED
+            self.index[name] = slot
+
+    def delete(self, name: str) -> bool:
+        with self.lock:
+            slot = self.index.pop(name, None)
+            if slot is None:
+                return False
+            offset = self.offset(slot)
+            self.map[offset:offset + self.RECORD.size] = bytes(self.RECORD.size)
+            self.free.append(slot)
+            return True
+
+    def allocate(self) -> int:
+        if self.free:
+            return self.free.pop()
+        if self.used == self.capacity:
+            self.grow(self.capacity * 2)
+        slot = self.used
+        self.used += 1
+        struct.pack_into('<Q', self.map, len(self.MAGIC), self.used)
+        return slot
+
+    def grow(self, capacity: int) -> None:
+        self.map.flush()
+        self.map.close()
+        self.file.truncate(self.HEADER.size + capacity * self.RECORD.size)
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        self.capacity = capacity
+
+
+class Session(NamedTuple):
+    id: bytes
+    key: bytes
+    a: str
+    b: str
+    # `SessionCache.clock` 下的过期时间
+    expires: float
+
+
+class SessionGrant(NamedTuple):
+    """签发的会话, 以及分别用 a 和 b 的主密钥封装的会话密钥."""
+
+    session: Session
+    to_a: bytes
+    to_b: bytes
+
+
+class SessionCache:
+    """会话缓存, 超过 `ttl` 秒的会话视为过期, 超过 `maxsize` 时淘汰最久未使用的会话.
+
+    过期的会话在读取时或者插入时 (从最久未使用的一端) 顺带删除, 不需要后台线程.
+    """
+
+    def __init__(self, maxsize: int = SESSION_CACHE_SIZE, ttl: float = SESSION_TTL,
+                 clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __repr__(self):
+        return (
+            f'<{self.__class__.__name__}'
+            f' size={len(self.entries)!r}'
+            f' maxsize={self.maxsize!r}'
+            f' ttl={self.ttl!r}'
+            f'>'
+        )
+
+    def __len__(self):
+        return len(self.entries)
+
+    def expires(self) -> float:
+        return self.clock() + self.ttl
+
+    def get(self, session_id: bytes) -> Optional[Session]:
+        with self.lock:
+            session = self.entries.get(session_id)
+            if session is None:
+                self.misses += 1
+                return None
+            if session.expires <= self.clock():
+                del self.entries[session_id]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self.entries.move_to_end(session_id)
+            self.hits += 1
+            return session
+
+    def put(self, session: Session) -> None:
+        self.put_many((session,))
+
+    def put_many(self, sessions: Iterable[Session]) -> None:
+        with self.lock:
+            entries = self.entries
+            for session in sessions:
+                entries[session.id] = session
+                entries.move_to_end(session.id)
+            self.trim()
+
+    def pop(self, session_id: bytes) -> Optional[Session]:
+        with self.lock:
+            return self.entries.pop(session_id, None)
+
+    def purge(self) -> int:
+        """删除所有过期的会话, 返回删除的个数."""
+        with self.lock:
+            now = self.clock()
+            expired = [session_id for session_id, session in self.entries.items() if session.expires <= now]
+            for session_id in expired:
+                del self.entries[session_id]
+            self.expirations += len(expired)
+            return len(expired)
+
+    def trim(self) -> None:
+        entries = self.entries
+        now = self.clock()
+        while entries:
+            session = next(iter(entries.values()))
+            if session.expires <= now:
+                self.expirations += 1
+            elif len(entries) > self.maxsize:
+                self.evictions += 1
+            else:
+                break
+            entries.popitem(last=False)
+
+
+def session_aad(session_id: bytes, a: str, b: str) -> bytes:
+    """封装会话密钥时的附加数据, 名字带长度前缀, 避免拼接后产生歧义."""
+    a_bytes, b_bytes = a.encode(), b.encode()
+    return b''.join((session_id, struct.pack('>H', len(a_bytes)), a_bytes, struct.pack('>H', len(b_bytes)), b_bytes))
+
+
+def unwrap_session_key(master_key: bytes, wrapped: bytes, session_id: bytes, a: str, b: str) -> bytes:
+    """主体用自己的主密钥解开 `SessionGrant.to_a` 或 `to_b`, 被篡改时抛出 `ValueError`."""
+    try:
+        return AESGCM(master_key).decrypt(wrapped[:NONCE_SIZE], wrapped[NONCE_SIZE:], session_aad(session_id, a, b))
+    except Exception:
+        raise ValueError('Invalid wrapped session key.') from None
+
+
+class KeyDistributionCenter:
+    """密钥分配中心.
+
+    `KeyCenter` 的服务版本: 主密钥存放在 `store` 中, 签发的会话保存在 `sessions` 中,
+    会话密钥用 AES-GCM 封装. 同一个实例可以在多个线程中使用, 协程中使用 `*_async` 方法,
+    签发在线程池中进行, 不会阻塞事件循环.
+    """
+
+    def __init__(self, store: Optional[KeyStore] = None, ttl: float = SESSION_TTL,
+                 cache_size: int = SESSION_CACHE_SIZE, key_size: int = SESSION_KEY_SIZE,
+                 clock: Callable[[], float] = time.monotonic):
+        self.store = MemoryKeyStore() if store is None else store
+        self.sessions = SessionCache(cache_size, ttl, clock)
+        self.key_size = key_size
+        # 多个线程同时签发时保护 `issued`
+        self.lock = threading.Lock()
+        self.issued = 0
+
+    def __repr__(self):
+        return (
+            f'<{self.__class__.__name__}'
+            f' store={self.store!r}'
+            f' sessions={len(self.sessions)!r}'
+            f' issued={self.issued!r}'
+            f'>'
+        )
+
+    def __enter__(self) -> 'KeyDistributionCenter':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.store.close()
+
+    def register(self, name: str, key: Optional[bytes] = None) -> bytes:
+        """登记主体, 不提供 `key` 时生成一个新的主密钥. 返回主密钥."""
+        if key is None:
+            key = secrets.token_bytes(MASTER_KEY_SIZE)
+        if len(key) not in (16, 24, 32):
+            raise ValueError('master key must be 16, 24 or 32 bytes')
+        self.store.put(name, key)
+        return bytes(key)
+
+    def register_many(self, names: Iterable[str]) -> Dict[str, bytes]:
+        """为多个主体生成主密钥并一次写入."""
+        keys = {name: secrets.token_bytes(MASTER_KEY_SIZE) for name in names}
+        self.store.put_many(keys.items())
+        return keys
+
+    def issue_session(self, a: str, b: str) -> SessionGrant:
+        return self.issue_sessions([(a, b)])[0]
+
+    def issue_sessions(self, pairs: Iterable[Tuple[str, str]]) -> List[SessionGrant]:
+        """为每一对主体签发一个会话.
+
+        所有主密钥一次从 `store` 中查出, 会话编号, 会话密钥和 nonce 一次生成, 同一个主体的
+        AES-GCM 对象只构造一次. 有未登记的主体时抛出 `KeyError`, 不签发任何会话.
+        """
+        pairs = list(pairs)
+        names = {name for pair in pairs for name in pair}
+        masters = self.store.get_many(names)
+        missing = names - masters.keys()
+        if missing:
+            raise KeyError(f'unknown principals: {", ".join(sorted(missing))}')
+
+        ciphers = {name: AESGCM(key) for name, key in masters.items()}
+        step = SESSION_ID_SIZE + self.key_size + 2 * NONCE_SIZE
+        randomness = memoryview(secrets.token_bytes(step * len(pairs)))
+        expires = self.sessions.expires()
+        grants = []
+        for i, (a, b) in enumerate(pairs):
+            start = i * step
+            session_id = bytes(randomness[start:start + SESSION_ID_SIZE])
+            start += SESSION_ID_SIZE
+            key = bytes(randomness[start:start + self.key_size])
+            start += self.key_size
+            nonce_a = bytes(randomness[start:start + NONCE_SIZE])
+            nonce_b = bytes(randomness[start + NONCE_SIZE:start + 2 * NONCE_SIZE])
+            aad = session_aad(session_id, a, b)
+            grants.append(SessionGrant(
+                Session(session_id, key, a, b, expires),
+                nonce_a + ciphers[a].encrypt(nonce_a, key, aad),
+                nonce_b + ciphers[b].encrypt(nonce_b, key, aad),
+            ))
+        self.sessions.put_many(grant.session for grant in grants)
+        with self.lock:
+            self.issued += len(grants)
+        return grants
+
+    def session(self, session_id: bytes) -> Optional[Session]:
+        """取出未过期的会话."""
+        return self.sessions.get(session_id)
+
+    def revoke(self, session_id: bytes) -> bool:
+        return self.sessions.pop(session_id) is not None
+
+    async def issue_session_async(self, a: str, b: str, executor: Optional[Executor] = None) -> SessionGrant:
+        return (await self.issue_sessions_async([(a, b)], executor))[0]
+
+    async def issue_sessions_async(self, pairs: Iterable[Tuple[str, str]],
+                                   executor: Optional[Executor] = None) -> List[SessionGrant]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, self.issue_sessions, list(pairs))
+
+
 class Mod12:
     """mod 12 的世界只有 0 - 11"""
 
@@ -88,14 +644,16 @@ class Mod12:
         只要满足 (y * y') mod12 = 1, 即可将 (x / y) mod12 改为计算
         (x * y') mod12.
 
-        采用枚举法找规律, 具体过程在 `search_truediv`.
+        采用枚举法找规律, 具体过程在 `search_truediv`. mod12 中可逆的元素都是自身的逆元.
         """
-        if other.v not in {1, 5, 7, 11}:
+        inverse = inverse_table(12)[other.v % 12]
+        if inverse == 0:
             return
-        return self * other
+        return self * type(self)(inverse)
 
     def __pow__(self, other: 'Mod12') -> 'Mod12':
-        value = (self.v ** other.v) % 12
+        # 三个参数的 `pow` 每一步都取模, 不会先算出完整的 self.v ** other.v
+        value = pow(self.v, other.v, 12)
         return type(self)(value)
 
     @classmethod
@@ -117,3 +675,450 @@ class Mod12:
                 res = x * y
                 if res.v == 1:
                     print(f'{x.v:2d} + {y.v:2d} = {res.v}')
+
+
+def egcd(a: int, b: int) -> Tuple[int, int, int]:
+    """扩展欧几里得算法, 返回 (g, x, y), 满足 a * x + b * y = g = gcd(a, b)."""
+    x0, x1, y0, y1 = 1, 0, 0, 1
+    while b:
+        q, r = divmod(a, b)
+        a, b = b, r
+        x0, x1 = x1, x0 - q * x1
+        y0, y1 = y1, y0 - q * y1
+    return a, x0, y0
+
+
+def mod_inverse(a: int, n: int) -> int:
+    """a 在 mod n 下的逆元, 不存在时抛出 `ValueError`."""
+    g, x, _ = egcd(a % n, n)
+    if g != 1:
+        raise ValueError(f'{a} is not invertible mod {n}')
+    return x % n
+
+
+@lru_cache(maxsize=32)
+def inverse_table(n: int) -> Tuple[int, ...]:
+    """mod n 下 0 到 n - 1 的逆元, 不可逆的元素记为 0 (n > 1 时 0 不会是逆元)."""
+    table = []
+    for a in range(n):
+        g, x, _ = egcd(a, n)
+        table.append(x % n if g == 1 else 0)
+    return tuple(table)
+
+
+class ModN:
+    """mod n 的剩余类, `Mod12` 推广到任意模数.
+
+    运算的另一方可以是同模数的 `ModN` 或 `int`. 除法乘以逆元, 逆元由扩展欧几里得算法求出,
+    小模数 (不超过 `INVERSE_TABLE_MAX`) 查缓存的逆元表. 幂运算使用三个参数的 `pow`,
+    指数是普通的整数, 负数表示逆元的幂.
+
+    和 `Mod12` 一样, 只与模数和值都相同的 `ModN` 相等, 不与 `int` 相等 (否则 `ModN(1, 12)`
+    要同时等于 1 和 13, 无法和它们的散列值一致). 需要比较时用 `int(x)` 或 `x.v`.
+    """
+
+    __slots__ = ('v', 'n')
+
+    def __init__(self, value: int, n: int):
+        if n <= 0:
+            raise ValueError('n must be positive')
+        self.n = n
+        self.v = value % n
+
+    def __repr__(self):
+        return (
+            f'<{self.__class__.__name__}'
+            f' v={self.v!r}'
+            f' n={self.n!r}'
+            f'>'
+        )
+
+    def __eq__(self, other):
+        if isinstance(other, ModN):
+            return self.n == other.n and self.v == other.v
+        return NotImplemented
+
+    def __hash__(self):
+        return hash((self.v, self.n))
+
+    def __int__(self):
+        return self.v
+
+    def value_of(self, other) -> int:
+        if isinstance(other, ModN):
+            if other.n != self.n:
+                raise ValueError('moduli mismatch')
+            return other.v
+        if isinstance(other, int):
+            return other
+        raise TypeError(f'unsupported operand type {type(other).__name__!r}')
+
+    def __add__(self, other: Union['ModN', int]) -> 'ModN':
+        return ModN(self.v + self.value_of(other), self.n)
+
+    __radd__ = __add__
+
+    def __sub__(self, other: Union['ModN', int]) -> 'ModN':
+        return ModN(self.v - self.value_of(other), self.n)
+
+    def __rsub__(self, other: int) -> 'ModN':
+        return ModN(self.value_of(other) - self.v, self.n)
+
+    def __neg__(self) -> 'ModN':
+        return ModN(-self.v, self.n)
+
+    def __mul__(self, other: Union['ModN', int]) -> 'ModN':
+        return ModN(self.v * self.value_of(other), self.n)
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other: Union['ModN', int]) -> 'ModN':
+        """乘以 `other` 的逆元, 不可逆时抛出 `ValueError`."""
+        return ModN(self.v * ModN(self.value_of(other), self.n).inverse().v, self.n)
+
+    def __rtruediv__(self, other: int) -> 'ModN':
+        return ModN(self.value_of(other) * self.inverse().v, self.n)
+
+    def __pow__(self, exponent: int) -> 'ModN':
+        if exponent < 0:
+            return ModN(pow(self.inverse().v, -exponent, self.n), self.n)
+        return ModN(pow(self.v, exponent, self.n), self.n)
+
+    def inverse(self) -> 'ModN':
+        if self.n <= INVERSE_TABLE_MAX:
+            value = inverse_table(self.n)[self.v]
+            if value == 0 and self.n > 1:
+                raise ValueError(f'{self.v} is not invertible mod {self.n}')
+            return ModN(value, self.n)
+        return ModN(mod_inverse(self.v, self.n), self.n)
+
+
+class ModArray:
+    """NumPy 数组表示的一组 mod n 的剩余类, 逐元素运算.
+
+    元素保存为 uint64, 模数不超过 `MOD_ARRAY_MAX`, 两个元素的乘积不会溢出.
+    另一方可以是同模数的 `ModArray`, 整数或可以转为数组的对象 (先取模).
+    """
+
+    __slots__ = ('values', 'n')
+
+    def __init__(self, values, n: int):
+        if not 0 < n <= MOD_ARRAY_MAX:
+            raise ValueError(f'n must be in [1, {MOD_ARRAY_MAX}]')
+        self.n = n
+        values = np.asarray(values)
+        if values.dtype.kind == 'u':
+            self.values = values.astype(np.uint64) % np.uint64(n)
+        else:
+            # 有符号整数和 Python 大整数先按 Python 的规则取模, 结果非负
+            self.values = np.asarray(np.mod(values, n) if values.dtype.kind == 'i' else
+                                     [int(v) % n for v in values.ravel()], np.uint64).reshape(values.shape)
+
+    def __repr__(self):
+        return (
+            f'<{self.__class__.__name__}'
+            f' values={self.values!r}'
+            f' n={self.n!r}'
+            f'>'
+        )
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, index) -> Union[ModN, 'ModArray']:
+        value = self.values[index]
+        if isinstance(value, np.ndarray):
+            return self.wrap(value)
+        return ModN(int(value), self.n)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, ModArray):
+            return NotImplemented
+        return self.n == other.n and np.array_equal(self.values, other.values)
+
+    __hash__ = None
+
+    def tolist(self) -> list:
+        return self.values.tolist()
+
+    def wrap(self, values: 'np.ndarray') -> 'ModArray':
+        """不再取模, `values` 必须已经在 [0, n) 中."""
+        res = object.__new__(ModArray)
+        res.values, res.n = values, self.n
+        return res
+
+    def values_of(self, other) -> 'np.ndarray':
+        if isinstance(other, ModArray):
+            if other.n != self.n:
+                raise ValueError('moduli mismatch')
+            return other.values
+        if isinstance(other, ModN):
+            other = other.v
+        if isinstance(other, int):
+            return np.uint64(other % self.n)
+        return ModArray(other, self.n).values
+
+    def __add__(self, other) -> 'ModArray':
+        return self.wrap((self.values + self.values_of(other)) % np.uint64(self.n))
+
+    __radd__ = __add__
+
+    def __sub__(self, other) -> 'ModArray':
+        n = np.uint64(self.n)
+        return self.wrap((self.values + (n - self.values_of(other))) % n)
+
+    def __rsub__(self, other) -> 'ModArray':
+        n = np.uint64(self.n)
+        return self.wrap((self.values_of(other) + (n - self.values)) % n)
+
+    def __neg__(self) -> 'ModArray':
+        n = np.uint64(self.n)
+        return self.wrap((n - self.values) % n)
+
+    def __mul__(self, other) -> 'ModArray':
+        return self.wrap(self.values * self.values_of(other) % np.uint64(self.n))
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other) -> 'ModArray':
+        if isinstance(other, ModArray):
+            return self * other.inverse()
+        values = np.broadcast_to(self.values_of(other), self.values.shape)
+        return self * ModArray(values, self.n).inverse()
+
+    def __pow__(self, exponent) -> 'ModArray':
+        """逐元素的幂, `exponent` 可以是非负整数或同样形状的非负整数数组. 平方-乘法, 每一步都取模."""
+        n = np.uint64(self.n)
+        exponent = np.asarray(exponent, np.uint64)
+        result = np.full(self.values.shape, 1 % self.n, np.uint64)
+        base = self.values.copy()
+        while exponent.any():
+            odd = (exponent & np.uint64(1)).astype(bool)
+            result = np.where(odd, result * base % n, result)
+            base = base * base % n
+            exponent = exponent >> np.uint64(1)
+        return self.wrap(result)
+
+    def inverse(self) -> 'ModArray':
+        """逐元素的逆元, 任意元素不可逆时抛出 `ValueError`.
+
+        小模数查逆元表, 否则对整个数组同时进行扩展欧几里得算法.
+        """
+        if self.n <= INVERSE_TABLE_MAX:
+            inverses = np.asarray(inverse_table(self.n), np.uint64)[self.values]
+            if self.n > 1 and not inverses.all():
+                raise ValueError(f'not all values are invertible mod {self.n}')
+            return self.wrap(inverses)
+
+        # 模数不超过 2 ** 32, 中间结果都能放进 int64
+        r0 = np.full(self.values.shape, self.n, np.int64)
+        r1 = self.values.astype(np.int64)
+        s0, s1 = np.zeros_like(r0), np.ones_like(r0)
+        while r1.any():
+            nonzero = r1 != 0
+            q = np.where(nonzero, r0 // np.where(nonzero, r1, 1), 0)
+            r0, r1 = np.where(nonzero, r1, r0), np.where(nonzero, r0 - q * r1, r1)
+            s0, s1 = np.where(nonzero, s1, s0), np.where(nonzero, s0 - q * s1, s1)
+        if not (r0 == 1).all():
+            raise ValueError(f'not all values are invertible mod {self.n}')
+        return self.wrap((s0 % self.n).astype(np.uint64))
+
+
+def small_primes(limit: int) -> List[int]:
+    """埃拉托斯特尼筛法, 小于 `limit` 的所有素数."""
+    sieve = bytearray([1]) * limit
+    sieve[:2] = b'\x00\x00'
+    for i in range(2, math.isqrt(limit - 1) + 1):
+        if sieve[i]:
+            sieve[i * i::i] = bytes(len(range(i * i, limit, i)))
+    return [i for i, flag in enumerate(sieve) if flag]
+
+
+SMALL_PRIMES = small_primes(SIEVE_LIMIT)
+
+
+def miller_rabin(n: int, rounds: int) -> bool:
+    """Miller-Rabin 检验, n 是大于 3 的奇数, 底数随机选取."""
+    d, s = n - 1, 0
+    while d % 2 == 0:
+        d, s = d // 2, s + 1
+    for _ in range(rounds):
+        x = pow(2 + secrets.randbelow(n - 3), d, n)
+        if x == 1 or x == n - 1:
+            continue
+        for _ in range(s - 1):
+            x = x * x % n
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+
+def is_probable_prime(n: int, rounds: int = MR_ROUNDS) -> bool:
+    """先用小素数试除, 再做 `rounds` 轮 Miller-Rabin 检验."""
+    if n < 2:
+        return False
+    for p in SMALL_PRIMES:
+        if n % p == 0:
+            return n == p
+    if n < SIEVE_LIMIT ** 2:
+        return True
+    return miller_rabin(n, rounds)
+
+
+def prime_rounds(bits: int) -> int:
+    """随机候选数需要的 Miller-Rabin 轮数, 错误概率小于 2 ** -100 (FIPS 186-4 附录 C.3)."""
+    if bits >= 1536:
+        return 4
+    if bits >= 1024:
+        return 5
+    if bits >= 512:
+        return 7
+    return MR_ROUNDS
+
+
+def generate_prime(bits: int) -> int:
+    """`bits` 位的随机素数, 最高两位是 1, 两个这样的素数的乘积正好是 2 * `bits` 位.
+
+    从随机起点开始, 先筛掉窗口内能被小素数整除的奇数, 只对剩下的数做 Miller-Rabin 检验.
+    """
+    if bits < 16:
+        raise ValueError('bits must be at least 16')
+    rounds = prime_rounds(bits)
+    while True:
+        start = secrets.randbits(bits) | (0b11 << (bits - 2)) | 1
+        # sieve[i] 对应 start + 2 * i
+        sieve = bytearray([1]) * SIEVE_WINDOW
+        for p in SMALL_PRIMES[1:]:
+            # start + 2 * i ≡ 0 (mod p) 的最小的 i, (p + 1) // 2 是 2 在 mod p 下的逆元
+            first = -start * ((p + 1) // 2) % p
+            sieve[first::p] = bytes(len(range(first, SIEVE_WINDOW, p)))
+        for i, flag in enumerate(sieve):
+            candidate = start + 2 * i
+            if candidate.bit_length() != bits:
+                break
+            if flag and miller_rabin(candidate, rounds):
+                return candidate
+
+
+class RSAPublicKey(NamedTuple):
+    n: int
+    e: int
+
+    @property
+    def size(self) -> int:
+        """模数的字节数."""
+        return (self.n.bit_length() + 7) // 8
+
+
+class RSAPrivateKey(NamedTuple):
+    n: int
+    e: int
+    d: int
+    p: int
+    q: int
+    # CRT 参数: d mod (p - 1), d mod (q - 1), q 在 mod p 下的逆元
+    dp: int
+    dq: int
+    qinv: int
+
+    @classmethod
+    def from_primes(cls, p: int, q: int, e: int = 65537) -> 'RSAPrivateKey':
+        # d 是 e 在 mod lcm(p - 1, q - 1) 下的逆元
+        d = mod_inverse(e, math.lcm(p - 1, q - 1))
+        return cls(p * q, e, d, p, q, d % (p - 1), d % (q - 1), mod_inverse(q, p))
+
+    @property
+    def public_key(self) -> RSAPublicKey:
+        return RSAPublicKey(self.n, self.e)
+
+
+def generate_rsa_key(bits: int = 2048, e: int = 65537) -> RSAPrivateKey:
+    """模数为 `bits` 位的 RSA 私钥."""
+    while True:
+        p = generate_prime(bits - bits // 2)
+        q = generate_prime(bits // 2)
+        if p != q and math.gcd(e, (p - 1) * (q - 1)) == 1:
+            return RSAPrivateKey.from_primes(p, q, e)
+
+
+def generate_rsa_keys(count: int, bits: int = 2048, e: int = 65537,
+                      workers: Optional[int] = None) -> List[RSAPrivateKey]:
+    """在进程池中生成 `count` 个私钥."""
+    with ProcessPoolExecutor(workers) as pool:
+        return list(pool.map(generate_rsa_key, [bits] * count, [e] * count))
+
+
+def mgf1(seed: bytes, length: int, hash_func=hashlib.sha256) -> bytes:
+    """RFC 8017 的掩码生成函数 MGF1."""
+    return b''.join(
+        hash_func(seed + i.to_bytes(4, 'big')).digest()
+        for i in range(-(-length // hash_func().digest_size))
+    )[:length]
+
+
+class RSA:
+    """教科书式的 RSA, 加密使用 OAEP 填充 (SHA-256).
+
+    只有公钥时只能加密. 私钥操作默认使用 CRT, 比直接计算 c ** d mod n 快 3 倍左右.
+    """
+
+    HASH = hashlib.sha256
+
+    def __init__(self, key: Union[RSAPrivateKey, RSAPublicKey]):
+        self.key = key
+        self.public_key = key.public_key if isinstance(key, RSAPrivateKey) else key
+
+    @classmethod
+    def generate(cls, bits: int = 2048, e: int = 65537) -> 'RSA':
+        return cls(generate_rsa_key(bits, e))
+
+    def encrypt_int(self, m: int) -> int:
+        n, e = self.public_key
+        if not 0 <= m < n:
+            raise ValueError('message representative out of range')
+        return pow(m, e, n)
+
+    def decrypt_int(self, c: int, crt: bool = True) -> int:
+        key = self.key
+        if not isinstance(key, RSAPrivateKey):
+            raise TypeError('a private key is required')
+        if not 0 <= c < key.n:
+            raise ValueError('ciphertext representative out of range')
+        if not crt:
+            return pow(c, key.d, key.n)
+        m1 = pow(c, key.dp, key.p)
+        m2 = pow(c, key.dq, key.q)
+        h = key.qinv * (m1 - m2) % key.p
+        return m2 + h * key.q
+
+    def encrypt(self, msg: bytes, label: bytes = b'') -> bytes:
+        """RSAES-OAEP 加密, 消息最长为模数字节数 - 2 * 32 - 2."""
+        k, h_len = self.public_key.size, self.HASH().digest_size
+        if len(msg) > k - 2 * h_len - 2:
+            raise ValueError('message too long')
+        db = self.HASH(label).digest() + bytes(k - len(msg) - 2 * h_len - 2) + b'\x01' + msg
+        seed = secrets.token_bytes(h_len)
+        masked_db = bulk_xor(db, mgf1(seed, len(db), self.HASH))
+        masked_seed = bulk_xor(seed, mgf1(masked_db, h_len, self.HASH))
+        em = b'\x00' + masked_seed + masked_db
+        return self.encrypt_int(int.from_bytes(em, 'big')).to_bytes(k, 'big')
+
+    def decrypt(self, ciphertext: bytes, label: bytes = b'', crt: bool = True) -> bytes:
+        """RSAES-OAEP 解密, 任何错误都抛出同样的 `ValueError`, 不暴露是哪一步出错."""
+        k, h_len = self.public_key.size, self.HASH().digest_size
+        if len(ciphertext) != k or k < 2 * h_len + 2:
+            raise ValueError('Decryption error.')
+        em = self.decrypt_int(int.from_bytes(ciphertext, 'big'), crt).to_bytes(k, 'big')
+        masked_seed, masked_db = em[1: 1 + h_len], em[1 + h_len:]
+        seed = bulk_xor(masked_seed, mgf1(masked_db, h_len, self.HASH))
+        db = bulk_xor(masked_db, mgf1(seed, len(masked_db), self.HASH))
+        # 检查完所有条件再判断, 避免通过耗时区分错误
+        bad = not hmac.compare_digest(db[:h_len], self.HASH(label).digest())
+        separator = db.find(b'\x01', h_len)
+        bad |= em[0] != 0
+        bad |= separator < 0 or db[h_len: max(separator, h_len)].strip(b'\x00') != b''
+        if bad:
+            raise ValueError('Decryption error.')
+        return db[separator + 1:]
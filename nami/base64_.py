@@ -36,32 +36,326 @@ https://stackoverflow.com/questions/4080988/why-does-base64-encoding-require-pad
   011000 010110 001100 -> 01100001 01100011 00 -> 01100001 01100011 ->  a c
 
 8 bits
+
+## 查表法
+
+上面的过程会把每个字节转成 8 个字符的二进制字符串, 内存和速度都很差, 只保留在
+`bin_str_b64encode` 和 `bin_str_b64decode` 中用于演示. `b64encode` 和 `b64decode`
+直接用整数移位处理 3 字节 / 4 字符一组:
+
+  a c -> 0x61 0x63 -> 0x616300 -> 0x616 0x300 -> 查 4096 项的表 -> YW Mw -> YWM (去掉补齐的部分)
+
+解码时用 256 项的表配合 `bytes.translate` 一次把所有字符转为 6 位整数, 再 4 个一组移位拼成 3 字节.
+性能对比见 `bench/bench_base64.py`.
+
+## 变体
+
+`B64Variant` 可以配置字母表 (标准 `STANDARD`, url 安全的 `URL_SAFE`, 或自定义), 是否补 '=',
+MIME 每 76 个字符换行, 以及解码时是否严格校验字符和 '=' 的个数. 所有变体都使用上面的查表法.
 """
 
 __all__ = (
+    'B64Decoder',
+    'B64Encoder',
+    'B64Variant',
+    'MIME',
+    'STANDARD',
+    'URL_SAFE',
+    'URL_SAFE_NO_PADDING',
     'b64decode',
+    'b64decode_stream',
     'b64encode',
+    'b64encode_stream',
+    'urlsafe_b64decode',
+    'urlsafe_b64encode',
 )
 
 
+from functools import lru_cache
 from string import ascii_uppercase, ascii_lowercase, digits
+from typing import BinaryIO, Optional
 
 from nami.util import Binary, fill_seq, seq_grouper, strip_seq
 
 B64_CHARS = ascii_uppercase + ascii_lowercase + digits + '+/'
+URL_SAFE_CHARS = ascii_uppercase + ascii_lowercase + digits + '-_'
 # 6 位二进制 -> char, 表中记录二进制比十进制在 base64 的编码解码过程中更加方便 (不是通过理论得出的, 仅从 Python 编写代码的角度上考虑)
 B64_ENCODE_MAP = {format(i, '06b'): char for i, char in enumerate(B64_CHARS)}
 B64_DECODE_MAP = {char: i for i, char in B64_ENCODE_MAP.items()}
 
+# 查表法用到的两张表:
+#   12 位整数 -> 2 个字符, 共 4096 项, 3 字节 (24 位) 查两次即可得到 4 个字符.
+#   字符 -> 6 位整数, 共 256 项, '=' 对应 `PAD`, 其余非法字符对应 `INVALID`,
+#   配合 `bytes.translate` 一次转换 (并校验) 整个序列.
+INVALID = 0xff
+PAD = 0xfe
+# 流式处理时每次读取的字节数, 是 3 和 4 的倍数, 编码解码都不会产生余数
+CHUNK_SIZE = 3 * 4 * (1 << 14)
+MIME_LINE_LENGTH = 76
+
+
+@lru_cache(maxsize=None)
+def encode_table(chars: str) -> list:
+    chars = chars.encode('ascii')
+    return [bytes((chars[i >> 6], chars[i & 0x3f])) for i in range(4096)]
+
+
+@lru_cache(maxsize=None)
+def decode_table(chars: str) -> bytes:
+    table = bytearray([INVALID] * 256)
+    table[ord('=')] = PAD
+    for i, char in enumerate(chars.encode('ascii')):
+        table[char] = i
+    return bytes(table)
+
+
+def encode_groups(s: bytes, table: list) -> bytes:
+    """将 `s` 按 3 字节一组编码, 不补 '='."""
+    s = memoryview(s).cast('B')
+    tail = len(s) % 3
+    it = iter(s[:len(s) - tail])
+    body = b''.join([
+        table[v >> 12] + table[v & 0xfff]
+        for v in (x << 16 | y << 8 | z for x, y, z in zip(it, it, it))
+    ])
+    if tail == 1:
+        v = s[-1] << 16
+        return body + table[v >> 12]
+    if tail == 2:
+        v = s[-2] << 16 | s[-1] << 8
+        return body + table[v >> 12] + table[v & 0xfff][:1]
+    return body
+
+
+def decode_values(values: bytes) -> bytes:
+    """将 6 位整数按 4 个一组解码, `values` 中不能包含 `PAD` 和 `INVALID`."""
+    tail = len(values) % 4
+    if tail == 1:
+        raise ValueError('invalid base64 length')
+
+    it = iter(memoryview(values)[:len(values) - tail])
+    body = b''.join([
+        (w << 18 | x << 12 | y << 6 | z).to_bytes(3, 'big')
+        for w, x, y, z in zip(it, it, it, it)
+    ])
+    if tail == 2:
+        v = values[-2] << 18 | values[-1] << 12
+        return body + (v >> 16).to_bytes(1, 'big')
+    if tail == 3:
+        v = values[-3] << 18 | values[-2] << 12 | values[-1] << 6
+        return body + (v >> 8).to_bytes(2, 'big')
+    return body
+
+
+class B64Variant:
+    """base64 的变体.
+
+    `chars`: 64 个不重复的 ascii 字符, 不能包含 '='.
+    `padding`: 编码时是否补 '='.
+    `line_length`: 编码时每行的最大长度, 行之间用 `line_sep` 分隔. MIME 是 76.
+    `strict`: 解码时是否拒绝字母表以外的字符 (包括换行), 非严格模式直接丢弃这些字符.
+              两种模式都只需一次 `bytes.translate`.
+    `strict_padding`: 解码时是否检查 '=' 的个数: `padding` 为真时必须补齐, 否则不能出现.
+                      默认与最初的 `b64decode` 一样, 允许省略末尾的 '='.
+    """
+
+    def __init__(self, chars: str = B64_CHARS, padding: bool = True,
+                 line_length: Optional[int] = None, line_sep: bytes = b'\r\n',
+                 strict: bool = True, strict_padding: bool = False):
+        if len(chars) != 64 or len(set(chars)) != 64 or '=' in chars or not chars.isascii():
+            raise ValueError('chars must be 64 distinct ascii chars except "="')
+        if line_length is not None and (line_length <= 0 or line_length % 4 != 0):
+            raise ValueError('line_length must be a positive multiple of 4')
+
+        self.chars = chars
+        self.padding = padding
+        self.line_length = line_length
+        self.line_sep = line_sep
+        self.strict = strict
+        self.strict_padding = strict_padding
+        self.encode_table = encode_table(chars)
+        self.decode_table = decode_table(chars)
+
+    def __repr__(self):
+        return (
+            f'<{self.__class__.__name__}'
+            f' chars={self.chars!r}'
+            f' padding={self.padding!r}'
+            f' line_length={self.line_length!r}'
+            f' strict={self.strict!r}'
+            f' strict_padding={self.strict_padding!r}'
+            f'>'
+        )
+
+    def encode(self, s: bytes) -> bytes:
+        res = encode_groups(s, self.encode_table)
+        if self.padding:
+            res = fill_seq(res, 4, b'=')
+        if self.line_length is not None:
+            res = self.line_sep.join(seq_grouper(res, self.line_length))
+        return res
+
+    def decode(self, s: bytes) -> bytes:
+        return self.decode_padded(self.to_values(s))
+
+    def to_values(self, s: bytes) -> bytes:
+        """字符 -> 6 位整数, 严格模式下有非法字符则报错, 否则丢弃."""
+        values = bytes(s).translate(self.decode_table)
+        if self.strict:
+            if INVALID in values:
+                raise ValueError('invalid base64 character')
+            return values
+        return values.translate(None, bytes((INVALID,)))
+
+    def decode_padded(self, values: bytes) -> bytes:
+        """解码可能以 `PAD` 结尾的 6 位整数序列."""
+        stripped = values.rstrip(bytes((PAD,)))
+        if PAD in stripped:
+            raise ValueError('invalid base64 padding')
+        if self.strict_padding:
+            pad_count = len(values) - len(stripped)
+            if self.padding and pad_count != -len(stripped) % 4:
+                raise ValueError('invalid base64 padding')
+            if not self.padding and pad_count:
+                raise ValueError('invalid base64 padding')
+        return decode_values(stripped)
+
+    def encoder(self) -> 'B64Encoder':
+        return B64Encoder(self)
+
+    def decoder(self) -> 'B64Decoder':
+        return B64Decoder(self)
+
+
+STANDARD = B64Variant()
+URL_SAFE = B64Variant(URL_SAFE_CHARS)
+# JWT 等场景使用
+URL_SAFE_NO_PADDING = B64Variant(URL_SAFE_CHARS, padding=False)
+MIME = B64Variant(line_length=MIME_LINE_LENGTH, strict=False)
+
 
 def b64encode(s: bytes) -> bytes:
+    return STANDARD.encode(s)
+
+
+def b64decode(s: bytes) -> bytes:
+    return STANDARD.decode(s)
+
+
+def urlsafe_b64encode(s: bytes) -> bytes:
+    return URL_SAFE.encode(s)
+
+
+def urlsafe_b64decode(s: bytes) -> bytes:
+    return URL_SAFE.decode(s)
+
+
+class B64Encoder:
+    """流式编码.
+
+    每次 `update` 只编码能凑成 3 字节一组的部分, 剩余的 0 - 2 字节留到下一次,
+    `finalize` 时再编码剩余部分并补 '='. 如果需要换行, 则记录当前行已写入的字符数.
+    """
+
+    def __init__(self, variant: B64Variant = STANDARD):
+        self.variant = variant
+        self.rest = b''
+        self.column = 0
+
+    def update(self, chunk: bytes) -> bytes:
+        table = self.variant.encode_table
+        chunk = memoryview(chunk).cast('B')
+        head = b''
+        if self.rest:
+            # 先用 `chunk` 的开头补齐上一次剩余的字节, 避免拷贝整个 `chunk`
+            need = 3 - len(self.rest)
+            if len(chunk) < need:
+                self.rest += bytes(chunk)
+                return b''
+            head = encode_groups(self.rest + chunk[:need], table)
+            chunk = chunk[need:]
+        size = len(chunk) - len(chunk) % 3
+        self.rest = bytes(chunk[size:])
+        return self.wrap(head + encode_groups(chunk[:size], table))
+
+    def finalize(self) -> bytes:
+        rest, self.rest = self.rest, b''
+        res = encode_groups(rest, self.variant.encode_table)
+        if self.variant.padding:
+            res = fill_seq(res, 4, b'=')
+        res = self.wrap(res)
+        self.column = 0
+        return res
+
+    def wrap(self, data: bytes) -> bytes:
+        line_length = self.variant.line_length
+        if line_length is None or not data:
+            return data
+
+        # 先补满当前行, 再按整行切分
+        first = line_length - self.column
+        lines = [data[:first]]
+        lines.extend(seq_grouper(data[first:], line_length))
+        self.column = len(lines[-1]) if len(lines) > 1 else self.column + len(lines[0])
+        return self.variant.line_sep.join(lines)
+
+
+class B64Decoder:
+    """流式解码.
+
+    字符转为 6 位整数后, 每次 `update` 只解码能凑成 4 个一组的部分. '=' 只会出现在最后,
+    因此遇到 '=' 后的所有内容都留到 `finalize` 时再校验解码.
+    """
+
+    def __init__(self, variant: B64Variant = STANDARD):
+        self.variant = variant
+        self.rest = b''
+
+    def update(self, chunk: bytes) -> bytes:
+        values = self.rest + self.variant.to_values(chunk)
+        end = values.find(PAD)
+        if end == -1:
+            end = len(values)
+        size = end - end % 4
+        self.rest = values[size:]
+        return decode_values(memoryview(values)[:size])
+
+    def finalize(self) -> bytes:
+        rest, self.rest = self.rest, b''
+        return self.variant.decode_padded(rest)
+
+
+def b64encode_stream(src: BinaryIO, dst: BinaryIO, chunk_size: int = CHUNK_SIZE,
+                     variant: B64Variant = STANDARD) -> None:
+    """从 `src` 按块读取并编码, 写入 `dst`. 内存占用只和 `chunk_size` 有关.
+
+    `src` 和 `dst` 可以是任意二进制文件对象, 例如 `open(path, 'rb')` 或 `socket.makefile('rb')`.
+    """
+    encoder = B64Encoder(variant)
+    for chunk in iter(lambda: src.read(chunk_size), b''):
+        dst.write(encoder.update(chunk))
+    dst.write(encoder.finalize())
+
+
+def b64decode_stream(src: BinaryIO, dst: BinaryIO, chunk_size: int = CHUNK_SIZE,
+                     variant: B64Variant = STANDARD) -> None:
+    """从 `src` 按块读取并解码, 写入 `dst`."""
+    decoder = B64Decoder(variant)
+    for chunk in iter(lambda: src.read(chunk_size), b''):
+        dst.write(decoder.update(chunk))
+    dst.write(decoder.finalize())
+
+
+def bin_str_b64encode(s: bytes) -> bytes:
+    """按模块文档中的核心过程编码, 便于理解, 但速度很慢."""
     bin_str = Binary.bytes_2_str(s)
     # 6 个一组, 不足用 '0' 补齐, 分组后按 sbase64 表转换
     b64_chars = ''.join(B64_ENCODE_MAP[i] for i in seq_grouper(bin_str, 6, '0'))
     return fill_seq(b64_chars, 4, '=').encode('ascii')
 
 
-def b64decode(s: bytes) -> bytes:
+def bin_str_b64decode(s: bytes) -> bytes:
+    """按模块文档中的核心过程解码, 便于理解, 但速度很慢."""
     b64_chars = s.decode('ascii').rstrip('=')
     bin_str = ''.join(B64_DECODE_MAP[char] for char in b64_chars)
     # 8 个一组, 多余部分删除 (多余的部分实际上 `b64encode` 过程中补充的 '0')
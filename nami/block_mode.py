@@ -9,17 +9,122 @@ demo:
 
 比较推荐的两种模式是 CBC 和 CTR. AES_CBC 和 AES_CTR 两种的详细实现在:
 https://github.com/dyq666/sanji/blob/master/util/third_cryptography.py
+
+大文件使用流式接口 `AES.encryptor`, `AES.iter_encrypt` 和 `AES.encrypt_file`, 内存占用只和分块大小有关.
+
+CTR 和 ECB 模式中各分组互相独立, 因此可以用 `AES.parallel_encrypt` 按分组对齐切成多段,
+每段 (CTR 模式下计数器从对应的分组开始) 在线程池中加密并写入同一个输出 buffer.
+
+大量互相独立的小消息使用 `AES.encrypt_many`, 所有消息拼接到同一个 buffer 中, 返回指向同一个
+输出 buffer 的 `memoryview`. ECB 模式一次处理所有消息, 其余模式必须为每条消息提供 iv, 逐条处理.
 """
 
 __all__ = (
     'AES',
+    'AESStream',
 )
 
+import mmap
+import os
+from concurrent.futures import ThreadPoolExecutor
+from itertools import accumulate
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Sequence, Tuple
+
 from cryptography.hazmat.backends import default_backend
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms
+from cryptography.hazmat.primitives.ciphers import Cipher, CipherContext, algorithms, modes
+
+from nami.util import Buffer
 
 backend = default_backend()
 
+# 流式处理时每次读取的字节数
+CHUNK_SIZE = 1 << 20
+# 并行加密时每段的字节数
+SEGMENT_SIZE = 1 << 22
+
+
+def batch_apply(cipher: Cipher, packed: Buffer, offsets: Sequence[int], encrypt: bool = True,
+                mode_list: Optional[Sequence] = None) -> memoryview:
+    """加密 / 解密拼接在一起的多条消息, 第 i 条消息是 `packed[offsets[i]:offsets[i + 1]]`.
+
+    `mode_list`: 每条消息的模式. 只有 ECB 模式可以为 `None`, 其余模式必须为每条消息提供
+                 不同的 iv / nonce, 否则 CTR 等模式会在多条消息间复用同一段密钥流.
+    返回与 `packed` 等长的输出 buffer 的 `memoryview`, 每条消息的结果位置与输入相同.
+
+    只有 ECB 模式能把所有消息一次加密完成; 其余模式每条消息的初始状态不同, 只能逐条处理,
+    省下的只是逐条调用时的对象构造和输出拷贝: 都复用同一个算法对象并直接写入输出 buffer.
+    """
+    block_size = cipher.algorithm.block_size // 8
+    src = memoryview(packed).cast('B')
+    out = bytearray(len(src) + block_size - 1)
+    dst = memoryview(out)
+
+    if mode_list is None and not isinstance(cipher.mode, modes.ECB):
+        raise ValueError(f'{cipher.mode.name} mode requires a distinct iv for each record')
+    if mode_list is not None and len(mode_list) != len(offsets) - 1:
+        raise ValueError('ivs and records length mismatch')
+
+    if mode_list is None:
+        if any((end - start) % block_size for start, end in zip(offsets, offsets[1:])):
+            raise ValueError
+        context = cipher.encryptor() if encrypt else cipher.decryptor()
+        context.update_into(src, out)
+        context.finalize()
+        return dst[:len(src)]
+
+    for mode, start, end in zip(mode_list, offsets, offsets[1:]):
+        record_cipher = Cipher(cipher.algorithm, mode, backend)
+        context = record_cipher.encryptor() if encrypt else record_cipher.decryptor()
+        context.update_into(src[start:end], dst[start:])
+        context.finalize()
+    return dst[:len(src)]
+
+
+def pack(records: Iterable[Buffer]) -> Tuple[bytes, List[int]]:
+    """拼接多条消息, 返回拼接结果和偏移量 (长度为消息数 + 1)."""
+    records = list(records)
+    offsets = list(accumulate([0] + [len(record) for record in records]))
+    return b''.join(records), offsets
+
+
+class AESStream:
+    """流式加密 / 解密的上下文.
+
+    `update_into` 把结果写入调用方提供的 buffer, `out` 的长度至少是 `len(chunk) + AES.BLOCK_SIZE - 1`.
+    """
+
+    def __init__(self, context: CipherContext):
+        self.context = context
+
+    def update(self, chunk: bytes) -> bytes:
+        return self.context.update(chunk)
+
+    def update_into(self, chunk: bytes, out: bytearray) -> int:
+        """返回写入 `out` 的字节数."""
+        return self.context.update_into(chunk, out)
+
+    def finalize(self) -> bytes:
+        return self.context.finalize()
+
+    def iter_file(self, src: BinaryIO, chunk_size: int = CHUNK_SIZE) -> Iterator[memoryview]:
+        """按块读取 `src` 并处理, 输入和输出都复用同一个预分配的 buffer.
+
+        注意: 返回的 `memoryview` 在下一次迭代时会被覆盖, 需要保留的话请自行拷贝.
+        """
+        in_buf = bytearray(chunk_size)
+        out_buf = bytearray(chunk_size + AES.BLOCK_SIZE - 1)
+        in_view, out_view = memoryview(in_buf), memoryview(out_buf)
+        while True:
+            size = src.readinto(in_buf)
+            if not size:
+                break
+            size = self.update_into(in_view[:size], out_buf)
+            if size:
+                yield out_view[:size]
+        tail = self.finalize()
+        if tail:
+            yield memoryview(tail)
+
 
 class AES:
     """AES 加密, 解密."""
@@ -27,11 +132,10 @@ class AES:
     BLOCK_SIZE = 16
 
     def __init__(self, mode, key: bytes):
-        self.cipher = Cipher(
-            algorithm=algorithms.AES(key),
-            mode=mode,
-            backend=backend,
-        )
+        # 不单独保存原始密钥, 分段和批量加密时复用算法对象
+        self.mode = mode
+        self.algorithm = algorithms.AES(key)
+        self.cipher = Cipher(algorithm=self.algorithm, mode=mode, backend=backend)
 
     def encrypt(self, msg: bytes) -> bytes:
         encryptor = self.cipher.encryptor()
@@ -40,3 +144,128 @@ class AES:
     def decrypt(self, msg: bytes) -> bytes:
         decryptor = self.cipher.decryptor()
         return decryptor.update(msg) + decryptor.finalize()
+
+    def encrypt_many(self, records: Iterable[Buffer], ivs: Optional[Sequence[bytes]] = None) -> List[memoryview]:
+        """批量加密互相独立的消息, 每条消息的结果与单独调用 `encrypt` 相同.
+
+        `ivs`: 每条消息的 iv (CTR 模式下是 nonce), 除 ECB 以外的模式都必须提供, 否则抛出
+               `ValueError`. 只有 ECB 模式是一次处理所有消息的, 其余模式仍逐条处理.
+        返回的 `memoryview` 都指向同一个输出 buffer, 没有额外拷贝.
+        """
+        return self._many(records, ivs, True)
+
+    def decrypt_many(self, records: Iterable[Buffer], ivs: Optional[Sequence[bytes]] = None) -> List[memoryview]:
+        return self._many(records, ivs, False)
+
+    def _many(self, records: Iterable[Buffer], ivs: Optional[Sequence[bytes]], encrypt: bool) -> List[memoryview]:
+        packed, offsets = pack(records)
+        if ivs is not None and isinstance(self.mode, modes.ECB):
+            raise ValueError('ECB mode takes no ivs')
+        mode_list = None if ivs is None else [type(self.mode)(iv) for iv in ivs]
+        view = batch_apply(self.cipher, packed, offsets, encrypt, mode_list)
+        return [view[start:end] for start, end in zip(offsets, offsets[1:])]
+
+    def encryptor(self) -> AESStream:
+        return AESStream(self.cipher.encryptor())
+
+    def decryptor(self) -> AESStream:
+        return AESStream(self.cipher.decryptor())
+
+    def iter_encrypt(self, src: BinaryIO, chunk_size: int = CHUNK_SIZE) -> Iterator[memoryview]:
+        return self.encryptor().iter_file(src, chunk_size)
+
+    def iter_decrypt(self, src: BinaryIO, chunk_size: int = CHUNK_SIZE) -> Iterator[memoryview]:
+        return self.decryptor().iter_file(src, chunk_size)
+
+    def encrypt_file(self, src: str, dst: str, chunk_size: int = CHUNK_SIZE) -> None:
+        """加密文件 `src` 并写入 `dst`. ECB 和 CBC 模式要求文件长度是 `BLOCK_SIZE` 的倍数."""
+        with open(src, 'rb') as f_src, open(dst, 'wb') as f_dst:
+            for chunk in self.iter_encrypt(f_src, chunk_size):
+                f_dst.write(chunk)
+
+    def decrypt_file(self, src: str, dst: str, chunk_size: int = CHUNK_SIZE) -> None:
+        with open(src, 'rb') as f_src, open(dst, 'wb') as f_dst:
+            for chunk in self.iter_decrypt(f_src, chunk_size):
+                f_dst.write(chunk)
+
+    def parallel_encrypt(self, msg: Buffer, out: Optional[bytearray] = None,
+                         workers: Optional[int] = None, segment_size: int = SEGMENT_SIZE) -> Buffer:
+        """多线程加密, 只支持 CTR 和 ECB 模式.
+
+        `out`: 可写的 buffer, 如果传入则结果直接写入并返回 `out`, 否则返回新的 `bytearray`.
+        `workers`: 线程数, 默认与 `ThreadPoolExecutor` 相同.
+        `segment_size`: 每段的字节数, 会向下对齐到 `BLOCK_SIZE`.
+        """
+        return self._parallel(msg, out, True, workers, segment_size)
+
+    def parallel_decrypt(self, msg: Buffer, out: Optional[bytearray] = None,
+                         workers: Optional[int] = None, segment_size: int = SEGMENT_SIZE) -> Buffer:
+        return self._parallel(msg, out, False, workers, segment_size)
+
+    def parallel_encrypt_file(self, src: str, dst: str,
+                              workers: Optional[int] = None, segment_size: int = SEGMENT_SIZE) -> None:
+        """多线程加密文件, 输入和输出都用 `mmap` 映射."""
+        self._parallel_file(src, dst, True, workers, segment_size)
+
+    def parallel_decrypt_file(self, src: str, dst: str,
+                              workers: Optional[int] = None, segment_size: int = SEGMENT_SIZE) -> None:
+        self._parallel_file(src, dst, False, workers, segment_size)
+
+    def segment_cipher(self, block_index: int) -> Cipher:
+        """从第 `block_index` 个分组开始加密的 `Cipher`. CTR 模式下计数器需要加上分组的偏移."""
+        if isinstance(self.mode, modes.ECB):
+            return self.cipher
+        counter = (int.from_bytes(self.mode.nonce, 'big') + block_index) % (1 << self.BLOCK_SIZE * 8)
+        return Cipher(
+            algorithm=self.algorithm,
+            mode=modes.CTR(counter.to_bytes(self.BLOCK_SIZE, 'big')),
+            backend=backend,
+        )
+
+    def _parallel(self, msg: Buffer, out: Optional[bytearray], encrypt: bool,
+                  workers: Optional[int], segment_size: int) -> Buffer:
+        if not isinstance(self.mode, (modes.CTR, modes.ECB)):
+            raise ValueError('only CTR and ECB mode can be parallelized')
+
+        src = memoryview(msg).cast('B')
+        size = len(src)
+        if isinstance(self.mode, modes.ECB) and size % self.BLOCK_SIZE != 0:
+            raise ValueError
+        if out is None:
+            out = bytearray(size)
+        dst = memoryview(out).cast('B')
+        if len(dst) < size:
+            raise ValueError('out is too small')
+        segment_size = max(segment_size - segment_size % self.BLOCK_SIZE, self.BLOCK_SIZE)
+
+        def work(start: int):
+            end = min(start + segment_size, size)
+            cipher = self.segment_cipher(start // self.BLOCK_SIZE)
+            context = cipher.encryptor() if encrypt else cipher.decryptor()
+            # `update_into` 要求输出 buffer 多出 `BLOCK_SIZE - 1` 字节, 最后一段可能不够,
+            # 只能先得到结果再拷贝. 多出的部分不会被写入, 因此各段之间不会互相覆盖.
+            if len(dst) - end >= self.BLOCK_SIZE - 1:
+                context.update_into(src[start:end], dst[start:])
+            else:
+                dst[start:end] = context.update(src[start:end])
+            context.finalize()
+
+        with ThreadPoolExecutor(workers) as pool:
+            # `list` 用于抛出线程中的异常
+            list(pool.map(work, range(0, size, segment_size)))
+        return out
+
+    def _parallel_file(self, src: str, dst: str, encrypt: bool,
+                       workers: Optional[int], segment_size: int) -> None:
+        size = os.path.getsize(src)
+        with open(dst, 'wb') as f:
+            f.truncate(size)
+        # 空文件不能 `mmap`
+        if size == 0:
+            return
+
+        with open(src, 'rb') as f_src, open(dst, 'r+b') as f_dst, \
+                mmap.mmap(f_src.fileno(), 0, access=mmap.ACCESS_READ) as src_map, \
+                mmap.mmap(f_dst.fileno(), 0, access=mmap.ACCESS_WRITE) as dst_map:
+            self._parallel(src_map, dst_map, encrypt, workers, segment_size)
+            dst_map.flush()
@@ -2,16 +2,78 @@
 
 demo:
   - P158 sha256 的散列值长度. `sha256_demo`
-  - P180 生日攻击. `BirthdayParadox`
+  - P180 生日攻击. `BirthdayParadox`, 用 `simulate_collisions` 对截断后的散列值做实际的碰撞试验.
+
+文件散列:
+  - `hash_file` 散列单个文件, 优先 `mmap` 整个文件, 否则用可复用的 buffer `readinto`.
+  - `hash_files`, `hash_tree` 在线程池中同时散列多个文件 (`hashlib` 处理大块数据时会释放 GIL),
+    结果按完成顺序逐个返回.
+  - `merkle_hash_file` 将单个大文件分块并行散列, 再按 Merkle 树合并.
+  - `DigestCache` 用 SQLite 持久化文件的散列值, 文件的 (路径, inode, 大小, 修改时间) 不变时直接返回,
+    不再读取文件.
 """
 
 __all__ = (
     'BirthdayParadox',
+    'CollisionReport',
+    'DigestCache',
+    'FileDigest',
+    'first_collision',
+    'hash_file',
+    'hash_files',
+    'hash_tree',
+    'merkle_hash_file',
+    'simulate_collisions',
 )
 
+import bisect
 import hashlib
-from functools import partialmethod, reduce
-from operator import mul
+import itertools
+import math
+import mmap
+import os
+import sqlite3
+import statistics
+import threading
+import time
+from array import array
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from functools import partial, partialmethod
+from typing import Callable, Iterable, Iterator, List, NamedTuple, Optional
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+# `readinto` 每次读取的字节数
+BUFFER_SIZE = 1 << 20
+# Merkle 树每个叶子的字节数
+CHUNK_SIZE = 1 << 22
+# 每个线程复用的 buffer
+local = threading.local()
+# `DigestCache` 默认最多保存的条目数
+MAX_ENTRIES = 1 << 20
+# `DigestCache` 命中时, 距离上次记录的访问时间超过此值 (纳秒) 才更新访问时间
+TOUCH_INTERVAL_NS = 60 * 10 ** 9
+# `BirthdayParadox.log_not_same`: (n - 1) / y 小于此值时使用幂级数
+SERIES_RATIO = 1e-3
+# Stirling 公式只用于大于此值的参数, 此时省略的项小于 1e-16
+STIRLING_MIN = 64
+# 截断位数不超过此值时用位图记录出现过的散列值, 最多占用 2 ** 30 / 8 = 128 MiB
+BITMAP_MAX_BITS = 30
+# 开放寻址表最多容纳的键数的上限, 此时装载因子为 3/4, 占用 2 ** 27 * 8 = 1 GiB
+TABLE_MAX_KEYS = 3 << 25
+# 开放寻址表初始容纳的键数, 之后按需翻倍, 占用 2 ** 16 * 8 = 512 KiB
+TABLE_INITIAL_KEYS = 3 << 14
+# 默认的 `max_keys` 下, 所有试验中未碰撞的试验数的期望值
+CENSORED_EXPECTATION = 1e-3
+
+
+class FileDigest(NamedTuple):
+    path: str
+    digest: bytes
+    size: int
 
 
 def sha256_demo():
@@ -19,24 +81,552 @@ def sha256_demo():
 
 
 class BirthdayParadox:
-    """生日悖论."""
+    """生日悖论.
+
+    假设一年有 y 天, n 个人的生日都不相同的概率是:
+
+      q = y/y * (y-1)/y * ... * (y-n+1)/y = y! / ((y-n)! * y^n)
+
+    至少两人生日相同的概率是 1 - q. y 很大时 (例如截断到 64 位的散列值, y = 2 ** 64) 不能逐项相乘,
+    因此在对数空间计算 ln(q), 按 n / y 的大小选择不同的方法, 避免大数相减损失精度:
+      - n / y 很小时, ln(q) = sum(ln(1 - k/y)) 展开成幂级数, 用幂和公式直接求和.
+      - n 非常接近 y 时, 直接使用 `math.lgamma`.
+      - 其余情况使用 Stirling 公式, 并将 ln(y) 项提前消去.
+    最后用 `math.expm1` 计算 1 - q, 概率很小时也不会损失精度.
+    """
 
     @staticmethod
-    def least_number(y: int, p: float) -> int:
-        """假设一年有 `y` 天, 从 `n` 个人中找到两个相同生日的概率大于 `p`, 求满足条件的最小的 `n`."""
-        not_same_p = 1.0
-        for n, number in enumerate(range(y, 0, -1), start=1):
-            not_same_p *= number / y
-            if 1 - not_same_p > p:
-                return n
+    def least_number(y: int, p: float) -> Optional[int]:
+        """假设一年有 `y` 天, 从 `n` 个人中找到两个相同生日的概率大于 `p`, 求满足条件的最小的 `n`.
+
+        先用近似公式 n = sqrt(2y * ln(1 / (1 - p))) 估计, 再在附近倍增找到区间并二分查找.
+        """
+        if p >= 1:
+            return None
+        if p < 0:
+            return 1
+
+        def ok(n: int) -> bool:
+            return BirthdayParadox.probability(y, n) > p
+
+        guess = min(max(int(math.sqrt(2 * y * -math.log1p(-p))), 1), y + 1)
+        step = 1
+        if ok(guess):
+            hi = guess
+            while True:
+                lo = max(hi - step, 1)
+                if lo == 1 or not ok(lo):
+                    break
+                hi, step = lo, step * 2
+            if lo == 1 and ok(1):
+                return 1
+        else:
+            lo = guess
+            while True:
+                hi = min(lo + step, y + 1)
+                if ok(hi):
+                    break
+                lo, step = hi, step * 2
+        # 此时 ok(lo) 为假, ok(hi) 为真
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            if ok(mid):
+                hi = mid
+            else:
+                lo = mid
+        return hi
 
     least_number_365 = partialmethod(least_number, 365)
 
     @staticmethod
     def probability(y: int, n: int) -> float:
         """假设一年有 `y` 天, 求从 `n` 个人中找到两个相同生日的概率."""
-        seq = [1.0] + [number / y for number in range(y, y - n, -1)]
-        not_same_p = reduce(mul, seq)
-        return 1 - not_same_p
+        return -math.expm1(BirthdayParadox.log_not_same(y, n))
 
     probability_365 = partialmethod(probability, 365)
+
+    @staticmethod
+    def log_not_same(y: int, n: int) -> float:
+        """`n` 个人生日都不相同的概率的自然对数 ln(q)."""
+        if n <= 1:
+            return 0.0
+        if n > y:
+            return -math.inf
+
+        if (n - 1) / y < SERIES_RATIO:
+            # 整数相除, 结果是正确舍入的 float
+            return log_not_same_series(n - 1, y)
+
+        # ln(q) = lgamma(y + 1) - lgamma(y - n + 1) - n * ln(y)
+        a, b = y + 1, y - n + 1
+        if b < STIRLING_MIN:
+            return math.lgamma(a) - math.lgamma(b) - n * math.log(y)
+        # 将 ln(a) = ln(y) + ln(1 + 1/y), ln(b) = ln(y) + ln(1 - (n-1)/y) 代入 Stirling 公式后,
+        # 所有 ln(y) 项恰好抵消.
+        return (
+            (a - 0.5) * math.log1p(1 / y) - (b - 0.5) * math.log1p(-(n - 1) / y) - n
+            + stirling_correction(a) - stirling_correction(b)
+        )
+
+    @staticmethod
+    def probability_array(y, n) -> 'np.ndarray':
+        """`probability` 的向量化版本, `y` 和 `n` 可以是数组 (按 NumPy 的规则广播).
+
+        需要安装 NumPy. 数组使用 float64, 因此 `y` 超过 2 ** 53 后会有舍入, 但结果的相对误差仍在 1e-13 以内.
+        """
+        if np is None:
+            raise ImportError('probability_array requires numpy')
+
+        y, n = np.broadcast_arrays(np.asarray(y, dtype=np.float64), np.asarray(n, dtype=np.float64))
+        log_q = np.zeros(y.shape)
+        log_q[n > y] = -np.inf
+        todo = (n > 1) & (n <= y)
+
+        series = todo & ((n - 1) / y < SERIES_RATIO)
+        log_q[series] = log_not_same_series(n[series] - 1, y[series])
+
+        todo &= ~series
+        a, b = y + 1, y - n + 1
+        small = todo & (b < STIRLING_MIN)
+        # NumPy 没有 lgamma, 这部分只能逐个计算, 但只会出现在 n 非常接近 y 的情况
+        lgamma = np.frompyfunc(math.lgamma, 1, 1)
+        log_q[small] = (
+            lgamma(a[small]).astype(np.float64) - lgamma(b[small]).astype(np.float64)
+            - n[small] * np.log(y[small])
+        )
+
+        stirling = todo & ~small
+        a, b, yy, nn = a[stirling], b[stirling], y[stirling], n[stirling]
+        log_q[stirling] = (
+            (a - 0.5) * np.log1p(1 / yy) - (b - 0.5) * np.log1p(-(nn - 1) / yy) - nn
+            + stirling_correction(a) - stirling_correction(b)
+        )
+        return -np.expm1(log_q)
+
+
+def log_not_same_series(m, y):
+    """n = m + 1 且 m / y 很小时的 ln(q).
+
+    ln(q) = sum(ln(1 - k/y)) = -sum(S_j / (j * y^j)), 其中 S_j = sum(k^j for k in range(n)) 有
+    封闭形式 (Faulhaber 公式). 取前 6 项, m / y < 1e-3 时截断误差小于 1e-18.
+    `m` 和 `y` 可以是 `int` 或 NumPy 数组.
+    """
+    m1 = m * (m + 1)
+    return -(
+        m1 / (2 * y)
+        + m1 * (2 * m + 1) / (12 * y ** 2)
+        + m1 * m1 / (12 * y ** 3)
+        + m1 * (2 * m + 1) * (3 * m * m + 3 * m - 1) / (120 * y ** 4)
+        + m1 * m1 * (2 * m * m + 2 * m - 1) / (60 * y ** 5)
+        + m1 * (2 * m + 1) * (3 * m ** 4 + 6 * m ** 3 - 3 * m + 1) / (252 * y ** 6)
+    )
+
+
+def stirling_correction(x):
+    """lgamma(x) 的 Stirling 展开中 (x - 0.5) * ln(x) - x + 0.5 * ln(2 * pi) 之后的部分, 省略了常数项."""
+    return 1 / (12 * x) - 1 / (360 * x ** 3) + 1 / (1260 * x ** 5)
+
+
+class BitmapSet:
+    """k 位整数的集合, 每个可能的值占 1 bit."""
+
+    def __init__(self, bits: int):
+        self.bitmap = bytearray(max(1, (1 << bits) >> 3))
+
+    def add(self, value: int) -> int:
+        """加入 `value`, 已经存在时返回非 0."""
+        i, bit = value >> 3, 1 << (value & 7)
+        byte = self.bitmap[i]
+        self.bitmap[i] = byte | bit
+        return byte & bit
+
+
+class IntHashSet:
+    """64 位无符号整数的集合, 线性探测的开放寻址表.
+
+    从 `TABLE_INITIAL_KEYS` 个键的容量开始, 装载因子超过 3/4 时容量翻倍, 内存占用只与实际
+    加入的值的个数有关. 调用者需要保证加入的值不超过 `max_keys` 个. 0 用来表示空槽, 单独记录.
+    """
+
+    def __init__(self, max_keys: int):
+        self.max_capacity = self.capacity_for(max_keys)
+        self.resize(min(self.max_capacity, self.capacity_for(TABLE_INITIAL_KEYS)))
+        self.has_zero = False
+
+    @staticmethod
+    def capacity_for(keys: int) -> int:
+        """装载因子不超过 3/4 时容纳 `keys` 个值需要的槽数."""
+        return 1 << max(3, (keys * 4 // 3).bit_length())
+
+    def resize(self, capacity: int) -> None:
+        old = getattr(self, 'slots', ())
+        self.mask = capacity - 1
+        self.slots = array('Q', bytes(capacity * 8))
+        self.count = 0
+        # 超过此值时翻倍
+        self.limit = capacity * 3 // 4 if capacity < self.max_capacity else capacity - 1
+        for value in old:
+            if value:
+                self.add(value)
+
+    def add(self, value: int) -> bool:
+        """加入 `value`, 已经存在时返回 `True`."""
+        if value == 0:
+            found, self.has_zero = self.has_zero, True
+            return found
+        slots, mask = self.slots, self.mask
+        # 值本身是散列值, 低位已经足够均匀
+        i = value & mask
+        while True:
+            slot = slots[i]
+            if slot == 0:
+                slots[i] = value
+                self.count += 1
+                if self.count > self.limit:
+                    self.resize(len(slots) * 2)
+                return False
+            if slot == value:
+                return True
+            i = (i + 1) & mask
+
+
+def default_max_keys(bits: int, trials: int = 1) -> int:
+    """截断为 `bits` 位时, 进行 `trials` 次试验, 未碰撞的试验数的期望值不超过 `CENSORED_EXPECTATION`
+    时每次试验需要的键数, 不超过 `TABLE_MAX_KEYS`."""
+    return min(TABLE_MAX_KEYS, BirthdayParadox.least_number(1 << bits, 1 - CENSORED_EXPECTATION / max(1, trials)))
+
+
+def first_collision(keys: Iterable[bytes], bits: int, algorithm: str = 'sha256',
+                    max_keys: Optional[int] = None) -> Optional[int]:
+    """依次散列 `keys` 并截断为前 `bits` 位, 返回第一次出现重复值时已经处理的键数.
+
+    即前 n 个键中出现了碰撞, 而前 n - 1 个键中没有. `keys` 可以是生成器, 最多取 `max_keys` 个,
+    仍未碰撞则返回 `None`.
+
+    `bits` 不超过 `BITMAP_MAX_BITS` 时用位图, 否则用开放寻址表, 容量随处理的键数增长, 不超过
+    `max_keys` 对应的容量.
+    """
+    if not 0 < bits <= 64 or hashlib.new(algorithm).digest_size * 8 < bits:
+        raise ValueError(f'cannot truncate {algorithm} to {bits} bits')
+    if bits <= BITMAP_MAX_BITS:
+        seen = BitmapSet(bits)
+    else:
+        if max_keys is None:
+            max_keys = default_max_keys(bits)
+        seen = IntHashSet(max_keys)
+    if max_keys is not None:
+        keys = itertools.islice(keys, max_keys)
+
+    new = getattr(hashlib, algorithm, None) or partial(hashlib.new, algorithm)
+    add, shift = seen.add, 64 - bits
+    for n, key in enumerate(keys, 1):
+        if add(int.from_bytes(new(key).digest()[:8], 'big') >> shift):
+            return n
+    return None
+
+
+def counter_keys(trial: int) -> Iterator[bytes]:
+    """第 `trial` 次试验使用的键: 8 字节的试验编号加上 8 字节的计数器."""
+    prefix = trial.to_bytes(8, 'little')
+    return (prefix + i.to_bytes(8, 'little') for i in itertools.count())
+
+
+def collision_trial(bits: int, algorithm: str, key_source: Callable[[int], Iterable[bytes]],
+                    max_keys: Optional[int], trial: int) -> Optional[int]:
+    return first_collision(key_source(trial), bits, algorithm, max_keys)
+
+
+class CollisionReport(NamedTuple):
+    """`simulate_collisions` 的结果."""
+    bits: int
+    # 各次试验第一次碰撞时的键数, 从小到大排列
+    indices: List[int]
+    # 处理了 `max_keys` 个键仍未碰撞的试验数
+    censored: int
+
+    @property
+    def trials(self) -> int:
+        return len(self.indices) + self.censored
+
+    @property
+    def mean(self) -> float:
+        """发生碰撞的试验中, 键数的平均值."""
+        return statistics.fmean(self.indices)
+
+    def quantile(self, q: float) -> Optional[int]:
+        """所有试验中键数的 `q` 分位数, 落在未碰撞的试验中时返回 `None`."""
+        i = max(0, math.ceil(q * self.trials) - 1)
+        return self.indices[i] if i < len(self.indices) else None
+
+    def cdf(self, n: int) -> float:
+        """n 个键以内发生碰撞的试验所占的比例, 理论值是 `BirthdayParadox.probability(2 ** bits, n)`."""
+        return bisect.bisect_right(self.indices, n) / self.trials
+
+    def max_deviation(self) -> float:
+        """经验分布函数与理论值的最大差值 (Kolmogorov-Smirnov 统计量)."""
+        y = 1 << self.bits
+        return max(
+            (abs(self.cdf(n) - BirthdayParadox.probability(y, n)) for n in set(self.indices)),
+            default=0.0,
+        )
+
+
+def simulate_collisions(bits: int, trials: int, algorithm: str = 'sha256',
+                        key_source: Callable[[int], Iterable[bytes]] = counter_keys,
+                        max_keys: Optional[int] = None, workers: Optional[int] = None) -> CollisionReport:
+    """在进程池中进行 `trials` 次 `first_collision` 试验.
+
+    `key_source(trial)` 返回第 `trial` 次试验的键, 可以从文件或数据库中逐个读取, 需要能被 pickle
+    (例如模块级函数或其 `functools.partial`). 默认使用 `counter_keys`, 结果可以复现.
+
+    `max_keys` 默认按 `default_max_keys(bits, trials)` 计算. 每个进程同时只进行一次试验, 内存
+    占用为位图或开放寻址表的大小, 后者只与该次试验实际处理的键数有关.
+    """
+    if max_keys is None and bits > BITMAP_MAX_BITS:
+        max_keys = default_max_keys(bits, trials)
+    trial = partial(collision_trial, bits, algorithm, key_source, max_keys)
+    with ProcessPoolExecutor(workers) as pool:
+        results = list(pool.map(trial, range(trials)))
+    indices = sorted(n for n in results if n is not None)
+    return CollisionReport(bits, indices, trials - len(indices))
+
+
+def read_buffer(size: int) -> bytearray:
+    """当前线程复用的 buffer."""
+    buf = getattr(local, 'buffer', None)
+    if buf is None or len(buf) != size:
+        buf = local.buffer = bytearray(size)
+    return buf
+
+
+def hash_file(path: str, algorithm: str = 'sha256', buffer_size: int = BUFFER_SIZE) -> bytes:
+    """散列文件 `path`.
+
+    普通文件直接 `mmap` 后一次输入散列函数, 无法 `mmap` 的 (空文件, 管道等) 用当前线程
+    复用的 buffer 按 `buffer_size` 读取.
+    """
+    hash_obj = hashlib.new(algorithm)
+    with open(path, 'rb') as f:
+        try:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                hash_obj.update(mapped)
+                return hash_obj.digest()
+        except (ValueError, OSError):
+            pass
+
+        buf = read_buffer(buffer_size)
+        view = memoryview(buf)
+        for size in iter(lambda: f.readinto(buf), 0):
+            hash_obj.update(view[:size])
+    return hash_obj.digest()
+
+
+def hash_files(paths: Iterable[str], algorithm: str = 'sha256', workers: Optional[int] = None,
+               buffer_size: int = BUFFER_SIZE, cache: Optional['DigestCache'] = None) -> Iterator[FileDigest]:
+    """在线程池中散列多个文件, 按完成顺序逐个返回 `FileDigest`.
+
+    `paths` 会被逐个取出, 同时只提交少量任务, 因此 `paths` 可以是很长的生成器.
+    `cache`: 如果传入, 则先从缓存中查找.
+    """
+    def work(path: str) -> FileDigest:
+        if cache is not None:
+            return FileDigest(path, cache.hash_file(path, algorithm, buffer_size), os.path.getsize(path))
+        return FileDigest(path, hash_file(path, algorithm, buffer_size), os.path.getsize(path))
+
+    # 与 `ThreadPoolExecutor` 的默认线程数相同
+    workers = workers or min(32, (os.cpu_count() or 1) + 4)
+    with ThreadPoolExecutor(workers) as pool:
+        max_pending = workers * 4
+        pending = set()
+        for path in paths:
+            pending.add(pool.submit(work, path))
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                yield from (future.result() for future in done)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            yield from (future.result() for future in done)
+
+
+def walk_files(root: str) -> Iterator[str]:
+    """`root` 下的所有普通文件, 不跟随符号链接."""
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            if os.path.isfile(path) and not os.path.islink(path):
+                yield path
+
+
+def hash_tree(root: str, algorithm: str = 'sha256', workers: Optional[int] = None,
+              buffer_size: int = BUFFER_SIZE, cache: Optional['DigestCache'] = None) -> Iterator[FileDigest]:
+    """散列目录 `root` 下的所有文件, 参数含义见 `hash_files`."""
+    return hash_files(walk_files(root), algorithm, workers, buffer_size, cache)
+
+
+def merkle_root(leaves: List[bytes], algorithm: str = 'sha256') -> bytes:
+    """按 RFC 6962 的方式合并叶子: 内部节点是 hash(0x01 + 左 + 右), 奇数个时最后一个直接上移."""
+    level = leaves
+    while len(level) > 1:
+        next_level = [
+            hashlib.new(algorithm, b'\x01' + level[i] + level[i + 1]).digest()
+            for i in range(0, len(level) - 1, 2)
+        ]
+        if len(level) % 2:
+            next_level.append(level[-1])
+        level = next_level
+    return level[0]
+
+
+def merkle_hash_file(path: str, algorithm: str = 'sha256', chunk_size: int = CHUNK_SIZE,
+                     workers: Optional[int] = None) -> bytes:
+    """按 `chunk_size` 将文件分块, 并行计算叶子 hash(0x00 + 块), 再合并为 Merkle 树的根.
+
+    结果只与文件内容, `algorithm` 和 `chunk_size` 有关, 与 `workers` 无关.
+    """
+    def leaf(data: memoryview) -> bytes:
+        hash_obj = hashlib.new(algorithm, b'\x00')
+        hash_obj.update(data)
+        return hash_obj.digest()
+
+    size = os.path.getsize(path)
+    # 空文件不能 `mmap`
+    if size == 0:
+        return leaf(memoryview(b''))
+
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        with memoryview(mapped) as view, ThreadPoolExecutor(workers) as pool:
+            leaves = list(pool.map(leaf, (view[i: i + chunk_size] for i in range(0, size, chunk_size))))
+    return merkle_root(leaves, algorithm)
+
+
+class DigestCache:
+    """持久化的文件散列值缓存.
+
+    以 (路径, 散列算法) 为主键, 记录文件的 inode, 大小和修改时间 (纳秒), 三者都不变时认为
+    文件未修改, 直接返回缓存的散列值. 超过 `max_entries` 时淘汰最久未使用的条目, 一次淘汰到
+    `max_entries` 的 15/16, 之后插入的条目数达到余量时才再次统计和淘汰. 打开时也会检查一次.
+    多个进程同时写入时, 每个进程只计入自己插入的条目, 条目数可能暂时超过 `max_entries`,
+    直到某个进程下一次淘汰.
+
+    命中时只读不写, 访问时间距上次记录超过 `touch_interval_ns` 才更新一次, 因此淘汰顺序的
+    精度是 `touch_interval_ns`. 这样多个进程 / 线程查询时不会因为 SQLite 只有一个写锁而串行.
+
+    使用 SQLite 的 WAL 模式, 多个进程可以同时读写同一个缓存文件. 同一个实例可以在多个线程中使用.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS digests (
+            path TEXT NOT NULL,
+            algorithm TEXT NOT NULL,
+            inode INTEGER NOT NULL,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            digest BLOB NOT NULL,
+            used_ns INTEGER NOT NULL,
+            PRIMARY KEY (path, algorithm)
+        );
+        CREATE INDEX IF NOT EXISTS digests_used_ns ON digests (used_ns);
+    """
+
+    def __init__(self, path: str = ':memory:', max_entries: int = MAX_ENTRIES, timeout: float = 30.0,
+                 touch_interval_ns: int = TOUCH_INTERVAL_NS):
+        self.max_entries = max_entries
+        self.touch_interval_ns = touch_interval_ns
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(str(path), timeout=timeout, isolation_level=None, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.executescript(self.SCHEMA)
+        self.hits = 0
+        self.misses = 0
+        self.bytes_skipped = 0
+        self.bytes_hashed = 0
+        # 条目数的上限估计: 上次统计的条目数加上之后插入的条目数 (替换已有条目也计入)
+        self.count = 0
+        with self.lock:
+            self.trim(max_entries)
+
+    def __repr__(self):
+        return (
+            f'<{self.__class__.__name__}'
+            f' hits={self.hits!r}'
+            f' misses={self.misses!r}'
+            f' bytes_skipped={self.bytes_skipped!r}'
+            f'>'
+        )
+
+    def __enter__(self) -> 'DigestCache':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute('SELECT COUNT(*) FROM digests').fetchone()[0]
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def get(self, path: str, algorithm: str, stat: os.stat_result) -> Optional[bytes]:
+        with self.lock:
+            row = self.conn.execute(
+                'SELECT digest, used_ns FROM digests'
+                ' WHERE path = ? AND algorithm = ? AND inode = ? AND size = ? AND mtime_ns = ?',
+                (path, algorithm, stat.st_ino, stat.st_size, stat.st_mtime_ns),
+            ).fetchone()
+            if row is None:
+                return None
+            now = time.time_ns()
+            if now - row[1] >= self.touch_interval_ns:
+                self.conn.execute(
+                    'UPDATE digests SET used_ns = ? WHERE path = ? AND algorithm = ?',
+                    (now, path, algorithm),
+                )
+        return row[0]
+
+    def put(self, path: str, algorithm: str, stat: os.stat_result, digest: bytes) -> None:
+        with self.lock:
+            self.conn.execute(
+                'INSERT OR REPLACE INTO digests VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (path, algorithm, stat.st_ino, stat.st_size, stat.st_mtime_ns, digest, time.time_ns()),
+            )
+            self.count += 1
+            # 估计值超过上限时才 `COUNT`, 多淘汰一些留出余量, 避免之后每次插入都要统计
+            if self.count > self.max_entries:
+                self.trim(self.max_entries - self.max_entries // 16)
+
+    def trim(self, limit: int) -> None:
+        """淘汰最久未使用的条目, 只保留 `limit` 个, 并更新 `count`. 调用时需要持有 `lock`."""
+        count = self.conn.execute('SELECT COUNT(*) FROM digests').fetchone()[0]
+        if count > limit:
+            self.conn.execute(
+                'DELETE FROM digests WHERE rowid IN (SELECT rowid FROM digests ORDER BY used_ns LIMIT ?)',
+                (count - limit,),
+            )
+        self.count = min(count, limit)
+
+    def hash_file(self, path: str, algorithm: str = 'sha256', buffer_size: int = BUFFER_SIZE) -> bytes:
+        """与 `hash_file` 相同, 命中缓存时不读取文件."""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        digest = self.get(path, algorithm, stat)
+        if digest is not None:
+            with self.lock:
+                self.hits += 1
+                self.bytes_skipped += stat.st_size
+            return digest
+
+        digest = hash_file(path, algorithm, buffer_size)
+        with self.lock:
+            self.misses += 1
+            self.bytes_hashed += stat.st_size
+        # 散列过程中文件被修改时不缓存
+        new_stat = os.stat(path)
+        if (stat.st_ino, stat.st_size, stat.st_mtime_ns) == (new_stat.st_ino, new_stat.st_size, new_stat.st_mtime_ns):
+            self.put(path, algorithm, stat, digest)
+        return digest
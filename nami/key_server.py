@@ -0,0 +1,446 @@
+"""密钥分配中心的网络服务.
+
+`KeyServer` 在 TCP 或 Unix socket 上提供 `nami.asymmetric.KeyDistributionCenter` 的会话签发,
+`KeyClient` 是对应的客户端. 协议是带长度前缀的二进制帧, 整数都是大端序:
+
+    帧:   长度 (u32) | 内容
+    请求: 请求编号 (u32) | 操作 (u8) | 参数
+    响应: 请求编号 (u32) | 状态 (u8) | 结果
+
+    ISSUE 的参数: len(a) (u16) | a | len(b) (u16) | b
+    ISSUE 的结果: 会话编号 (16 字节) | 有效期毫秒数 (u32) | len(to_a) (u16) | to_a | len(to_b) (u16) | to_b
+    状态不是 OK 时, 结果是 UTF-8 编码的错误信息.
+
+客户端不必等待响应就可以继续发送请求 (pipelining), 按请求编号匹配响应. 服务端把一个连接上
+已经收到的请求合并后调用一次 `issue_sessions`, 按收到的顺序返回响应. 签发在线程池中进行,
+不阻塞事件循环, 其他连接的请求在此期间照常读取和处理.
+
+背压: 服务端每个连接最多缓存 `max_pending` 个未处理的请求, 写缓冲区满时等待客户端读取,
+在此期间不再读取新的请求; 客户端每个连接最多有 `max_inflight` 个未收到响应的请求.
+
+在项目根目录下运行, 例如:
+
+    python -m nami.key_server --port 9000 --db keys.db
+"""
+
+__all__ = (
+    'KeyClient',
+    'KeyServer',
+    'SessionTicket',
+)
+
+import argparse
+import asyncio
+import struct
+from concurrent.futures import Executor
+from typing import Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from nami.asymmetric import KeyDistributionCenter, SQLiteKeyStore, SessionGrant
+
+FRAME = struct.Struct('>I')
+HEADER = struct.Struct('>IB')
+NAME_SIZE = struct.Struct('>H')
+TTL_MS = struct.Struct('>I')
+SESSION_ID_SIZE = 16
+# 单个帧的长度上限, 超过时断开连接
+MAX_FRAME = 1 << 16
+
+# 操作
+PING = 0
+ISSUE = 1
+
+# 状态
+OK = 0
+UNKNOWN_PRINCIPAL = 1
+BAD_REQUEST = 2
+
+
+class SessionTicket(NamedTuple):
+    """客户端收到的会话, `to_a` 和 `to_b` 分别用 `unwrap_session_key` 解开."""
+
+    session_id: bytes
+    # 剩余有效期 (秒)
+    ttl: float
+    to_a: bytes
+    to_b: bytes
+
+
+def pack_frame(request_id: int, code: int, body: bytes = b'') -> bytes:
+    return FRAME.pack(HEADER.size + len(body)) + HEADER.pack(request_id, code) + body
+
+
+def pack_names(a: str, b: str) -> bytes:
+    a_bytes, b_bytes = a.encode(), b.encode()
+    return NAME_SIZE.pack(len(a_bytes)) + a_bytes + NAME_SIZE.pack(len(b_bytes)) + b_bytes
+
+
+def unpack_fields(body: memoryview, count: int) -> List[bytes]:
+    """依次取出 `count` 个带 u16 长度前缀的字段, 长度不符时抛出 `ValueError`."""
+    fields = []
+    offset = 0
+    for _ in range(count):
+        if offset + NAME_SIZE.size > len(body):
+            raise ValueError('truncated field')
+        size, = NAME_SIZE.unpack_from(body, offset)
+        offset += NAME_SIZE.size
+        if offset + size > len(body):
+            raise ValueError('truncated field')
+        fields.append(bytes(body[offset:offset + size]))
+        offset += size
+    if offset != len(body):
+        raise ValueError('trailing bytes')
+    return fields
+
+
+def pack_grant(grant: SessionGrant, ttl: float) -> bytes:
+    return b''.join((
+        grant.session.id,
+        TTL_MS.pack(max(0, int(ttl * 1000))),
+        NAME_SIZE.pack(len(grant.to_a)), grant.to_a,
+        NAME_SIZE.pack(len(grant.to_b)), grant.to_b,
+    ))
+
+
+def unpack_ticket(body: bytes) -> SessionTicket:
+    view = memoryview(body)
+    head = SESSION_ID_SIZE + TTL_MS.size
+    if len(view) < head:
+        raise ValueError('truncated ticket')
+    ttl_ms, = TTL_MS.unpack_from(view, SESSION_ID_SIZE)
+    to_a, to_b = unpack_fields(view[head:], 2)
+    return SessionTicket(bytes(view[:SESSION_ID_SIZE]), ttl_ms / 1000, to_a, to_b)
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Optional[bytes]:
+    """读取一个帧的内容, 连接正常关闭时返回 `None`."""
+    try:
+        size, = FRAME.unpack(await reader.readexactly(FRAME.size))
+    except asyncio.IncompleteReadError as e:
+        if e.partial:
+            raise ConnectionError('connection closed in the middle of a frame') from None
+        return None
+    if not HEADER.size <= size <= MAX_FRAME:
+        raise ConnectionError(f'invalid frame size {size}')
+    return await reader.readexactly(size)
+
+
+class KeyServer:
+    """密钥分配中心的服务端.
+
+    一个连接对应两个协程: 一个读取请求放入队列, 一个从队列中取出所有已收到的请求 (最多
+    `max_batch` 个), 签发后一次写回. 签发在 `executor` 中运行, 默认使用事件循环的线程池.
+    """
+
+    def __init__(self, kdc: KeyDistributionCenter, max_pending: int = 1024, max_batch: int = 256,
+                 executor: Optional[Executor] = None):
+        self.kdc = kdc
+        self.executor = executor
+        self.max_pending = max_pending
+        self.max_batch = max_batch
+        self.server = None
+        # 连接 -> 处理该连接的任务
+        self.connections = {}
+        self.requests = 0
+        self.batches = 0
+
+    def __repr__(self):
+        return (
+            f'<{self.__class__.__name__}'
+            f' requests={self.requests!r}'
+            f' batches={self.batches!r}'
+            f'>'
+        )
+
+    async def __aenter__(self) -> 'KeyServer':
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def start(self, host: Optional[str] = '127.0.0.1', port: int = 0,
+                    path: Optional[str] = None) -> 'KeyServer':
+        """监听 TCP 端口, 提供 `path` 时改为监听 Unix socket. `port` 为 0 时随机选择端口."""
+        if path is not None:
+            self.server = await asyncio.start_unix_server(self.handle, str(path))
+        else:
+            self.server = await asyncio.start_server(self.handle, host, port)
+        return self
+
+    @property
+    def address(self):
+        """TCP 时是 (host, port), Unix socket 时是路径."""
+        return self.server.sockets[0].getsockname()
+
+    async def serve_forever(self) -> None:
+        await self.server.serve_forever()
+
+    async def close(self) -> None:
+        """停止监听并断开所有连接."""
+        if self.server is not None:
+            self.server.close()
+            # 直接中断而不是 `close`, 后者会等待写缓冲区中的数据被对方读取
+            for writer in list(self.connections):
+                writer.transport.abort()
+            await asyncio.gather(*self.connections.values(), return_exceptions=True)
+            await self.server.wait_closed()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        queue = asyncio.Queue(self.max_pending)
+        responder = asyncio.ensure_future(self.respond(queue, writer))
+        self.connections[writer] = asyncio.current_task()
+        try:
+            while True:
+                frame = await read_frame(reader)
+                if frame is None:
+                    break
+                # 队列满时在这里等待, 不再读取 socket, 客户端的发送随之受阻
+                await queue.put(frame)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except asyncio.CancelledError:
+            responder.cancel()
+            writer.close()
+            self.connections.pop(writer, None)
+            raise
+        # 处理完已收到的请求再关闭连接
+        await queue.put(None)
+        await responder
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except ConnectionError:
+            pass
+        finally:
+            self.connections.pop(writer, None)
+
+    async def respond(self, queue: asyncio.Queue, writer: asyncio.StreamWriter) -> None:
+        broken = False
+        while True:
+            frames = [await queue.get()]
+            while len(frames) < self.max_batch and not queue.empty():
+                frames.append(queue.get_nowait())
+            stop = None in frames
+            if stop:
+                frames = frames[:frames.index(None)]
+            # 连接断开后继续取出请求并丢弃, 避免读取请求的协程卡在 `queue.put`
+            if frames and not broken:
+                try:
+                    writer.write(b''.join(await self.process(frames)))
+                    await writer.drain()
+                except ConnectionError:
+                    broken = True
+            if stop:
+                return
+
+    async def process(self, frames: Sequence[bytes]) -> List[bytes]:
+        """处理一批请求, 按原顺序返回响应帧."""
+        self.requests += len(frames)
+        self.batches += 1
+        responses = [b''] * len(frames)
+        issues = []
+        for i, frame in enumerate(frames):
+            request_id, op = HEADER.unpack_from(frame)
+            body = memoryview(frame)[HEADER.size:]
+            if op == PING:
+                responses[i] = pack_frame(request_id, OK, bytes(body))
+            elif op == ISSUE:
+                try:
+                    a, b = (name.decode() for name in unpack_fields(body, 2))
+                except ValueError as e:
+                    responses[i] = pack_frame(request_id, BAD_REQUEST, str(e).encode())
+                    continue
+                issues.append((i, request_id, a, b))
+            else:
+                responses[i] = pack_frame(request_id, BAD_REQUEST, f'unknown operation {op}'.encode())
+
+        if issues:
+            for (i, request_id, _, _), (status, body) in zip(issues, await self.issue([issue[2:] for issue in issues])):
+                responses[i] = pack_frame(request_id, status, body)
+        return responses
+
+    async def issue(self, pairs: List[Tuple[str, str]]) -> List[Tuple[int, bytes]]:
+        ttl = self.kdc.sessions.ttl
+        try:
+            return [(OK, pack_grant(grant, ttl)) for grant in await self.kdc.issue_sessions_async(pairs, self.executor)]
+        except KeyError:
+            pass
+        # 有未登记的主体时整批都不会签发, 逐个重试以便只让出错的请求失败
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.issue_each, pairs)
+
+    def issue_each(self, pairs: List[Tuple[str, str]]) -> List[Tuple[int, bytes]]:
+        ttl = self.kdc.sessions.ttl
+        results = []
+        for pair in pairs:
+            try:
+                results.append((OK, pack_grant(self.kdc.issue_session(*pair), ttl)))
+            except KeyError as e:
+                results.append((UNKNOWN_PRINCIPAL, str(e.args[0]).encode()))
+        return results
+
+
+class Connection:
+    """客户端的一个连接, 由一个后台协程读取响应并唤醒对应的请求."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, max_inflight: int):
+        self.reader = reader
+        self.writer = writer
+        self.slots = asyncio.Semaphore(max_inflight)
+        self.pending = {}
+        self.next_id = 0
+        self.closed = False
+        self.task = asyncio.ensure_future(self.read_responses())
+
+    async def request(self, op: int, body: bytes) -> Tuple[int, bytes]:
+        async with self.slots:
+            if self.closed:
+                raise ConnectionError('connection closed')
+            self.next_id = request_id = (self.next_id + 1) & 0xFFFFFFFF
+            future = asyncio.get_running_loop().create_future()
+            self.pending[request_id] = future
+            try:
+                self.writer.write(pack_frame(request_id, op, body))
+                # 写缓冲区超过上限时等待, 避免在服务端处理不过来时无限堆积
+                await self.writer.drain()
+            except ConnectionError:
+                self.pending.pop(request_id, None)
+                raise
+            return await future
+
+    async def read_responses(self) -> None:
+        error = ConnectionError('connection closed')
+        try:
+            while True:
+                frame = await read_frame(self.reader)
+                if frame is None:
+                    break
+                request_id, status = HEADER.unpack_from(frame)
+                future = self.pending.pop(request_id, None)
+                if future is not None and not future.done():
+                    future.set_result((status, frame[HEADER.size:]))
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            error = ConnectionError(str(e))
+        finally:
+            self.closed = True
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(error)
+            self.pending.clear()
+
+    async def close(self) -> None:
+        self.closed = True
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+        await self.task
+
+
+class KeyClient:
+    """密钥分配中心的客户端, 维护 `pool_size` 个连接, 每个请求发往未完成请求最少的连接.
+
+    断开的连接在下次使用时重新建立. 所有方法都要在同一个事件循环中调用.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: Optional[int] = None, path: Optional[str] = None,
+                 pool_size: int = 4, max_inflight: int = 128):
+        if (port is None) == (path is None):
+            raise ValueError('exactly one of port and path is required')
+        self.host = host
+        self.port = port
+        self.path = path
+        self.pool_size = pool_size
+        self.max_inflight = max_inflight
+        self.connections: List[Optional[Connection]] = [None] * pool_size
+        self.lock = None
+
+    def __repr__(self):
+        return (
+            f'<{self.__class__.__name__}'
+            f' address={self.path or (self.host, self.port)!r}'
+            f' pool_size={self.pool_size!r}'
+            f'>'
+        )
+
+    async def __aenter__(self) -> 'KeyClient':
+        await self.connect()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def open_connection(self) -> Connection:
+        if self.path is not None:
+            reader, writer = await asyncio.open_unix_connection(str(self.path))
+        else:
+            reader, writer = await asyncio.open_connection(self.host, self.port)
+        return Connection(reader, writer, self.max_inflight)
+
+    async def connect(self) -> None:
+        """建立所有连接, 不调用时在第一次请求时建立."""
+        for i in range(self.pool_size):
+            await self.connection(i)
+
+    async def connection(self, i: int) -> Connection:
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        async with self.lock:
+            conn = self.connections[i]
+            if conn is None or conn.closed:
+                conn = self.connections[i] = await self.open_connection()
+            return conn
+
+    async def close(self) -> None:
+        connections, self.connections = self.connections, [None] * self.pool_size
+        await asyncio.gather(*(conn.close() for conn in connections if conn is not None))
+
+    async def request(self, op: int, body: bytes = b'') -> bytes:
+        i = min(
+            range(self.pool_size),
+            key=lambda j: -1 if self.connections[j] is None else len(self.connections[j].pending),
+        )
+        conn = self.connections[i]
+        if conn is None or conn.closed:
+            conn = await self.connection(i)
+        status, body = await conn.request(op, body)
+        if status == UNKNOWN_PRINCIPAL:
+            raise KeyError(body.decode())
+        if status != OK:
+            raise ValueError(body.decode())
+        return body
+
+    async def ping(self, payload: bytes = b'') -> bytes:
+        return await self.request(PING, payload)
+
+    async def issue_session(self, a: str, b: str) -> SessionTicket:
+        return unpack_ticket(await self.request(ISSUE, pack_names(a, b)))
+
+    async def issue_sessions(self, pairs: Iterable[Tuple[str, str]]) -> List[SessionTicket]:
+        """并发发出所有请求, 按顺序返回结果."""
+        return list(await asyncio.gather(*(self.issue_session(a, b) for a, b in pairs)))
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=9000)
+    parser.add_argument('--unix', help='监听的 Unix socket 路径, 提供时忽略 --host 和 --port')
+    parser.add_argument('--db', default=':memory:', help='保存主密钥的 SQLite 文件')
+    parser.add_argument('--ttl', type=float, default=300.0, help='会话的有效期 (秒)')
+    options = parser.parse_args(argv)
+
+    async def serve():
+        with KeyDistributionCenter(SQLiteKeyStore(options.db), ttl=options.ttl) as kdc:
+            async with await KeyServer(kdc).start(options.host, options.port, options.unix) as server:
+                print(f'listening on {server.address}')
+                await server.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
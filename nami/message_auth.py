@@ -6,15 +6,142 @@
 
 主要原理是只让有密钥的人才能将数据压缩成更小的数据 (MAC 值), 相同密钥和相同数据的 MAC 值才能相同,
 其余情况均不同.
+
+HMAC 的计算过程:
+
+  hash((key XOR opad) + hash((key XOR ipad) + msg))
+
+其中 `key XOR ipad` 和 `key XOR opad` 都只与密钥有关, 正好是散列函数的一个分组. 因此 `Hmac` 在创建时
+先计算好这两个分组输入后的散列状态, 之后每条消息只需 `copy` 状态再继续输入, 也不需要拼接消息.
+
+`Hmac` 可以使用 `hashlib` 中任意散列函数, 密钥按该散列函数的分组长度填充. 验证 MAC 值使用
+`verify`, 比较过程耗时与内容无关.
 """
 
 __all__ = (
+    'Hmac',
     'HmacWithSha256',
+    'verify',
 )
 
 import hashlib
+import hmac
+from typing import Callable, Iterable, List, Optional, Union
+
+DigestMod = Union[str, Callable]
+
+# 0 - 255 分别与 ipad (0x36) 和 opad (0x5c) XOR 的结果, 配合 `bytes.translate` 一次 XOR 整个密钥
+IPAD_TABLE = bytes(i ^ 0x36 for i in range(256))
+OPAD_TABLE = bytes(i ^ 0x5c for i in range(256))
+
+
+def digest_constructor(digestmod: DigestMod) -> Callable:
+    """`digestmod` 可以是 `hashlib` 的构造函数 (例如 `hashlib.sha512`) 或名称 (例如 'sha3_256')."""
+    if isinstance(digestmod, str):
+        return lambda data=b'': hashlib.new(digestmod, data)
+    return digestmod
+
+
+class Hmac:
+    """预先计算内外两层散列状态的 HMAC.
+
+    用法与 `hashlib` 的散列对象相同, 可以多次 `update` 输入任意长度的消息.
+    密钥不变时可以用 `new` 或 `digest_many` 复用预先计算的状态.
+
+    `digestmod`: 使用的散列函数, 默认 sha256.
+    """
+
+    def __init__(self, key: bytes, msg: bytes = b'', digestmod: DigestMod = hashlib.sha256):
+        digestmod = digest_constructor(digestmod)
+        block_size = digestmod().block_size
+        if len(key) > block_size:
+            key = digestmod(key).digest()
+        key = key.ljust(block_size, b'\x00')
+        self.inner = digestmod(key.translate(IPAD_TABLE))
+        self.outer = digestmod(key.translate(OPAD_TABLE))
+        self.state = self.inner.copy()
+        if msg:
+            self.state.update(msg)
+
+    @property
+    def name(self) -> str:
+        return f'hmac-{self.inner.name}'
+
+    @property
+    def block_size(self) -> int:
+        return self.inner.block_size
+
+    @property
+    def digest_size(self) -> int:
+        return self.outer.digest_size
+
+    def update(self, msg: bytes) -> None:
+        self.state.update(msg)
+
+    def digest(self) -> bytes:
+        outer = self.outer.copy()
+        outer.update(self.state.digest())
+        return outer.digest()
+
+    def hexdigest(self) -> str:
+        return self.digest().hex()
+
+    def copy(self) -> 'Hmac':
+        """复制当前状态, 用于计算有相同前缀的多条消息."""
+        other = self.new()
+        other.state = self.state.copy()
+        return other
+
+    def new(self, msg: bytes = b'') -> 'Hmac':
+        """相同密钥的新 HMAC, 复用预先计算的内外层状态."""
+        other = object.__new__(type(self))
+        other.inner = self.inner
+        other.outer = self.outer
+        other.state = self.inner.copy()
+        if msg:
+            other.state.update(msg)
+        return other
+
+    def digest_many(self, msgs: Iterable[bytes]) -> List[bytes]:
+        """批量计算相同密钥下多条消息的 MAC 值."""
+        inner_copy, outer_copy = self.inner.copy, self.outer.copy
+        res = []
+        for msg in msgs:
+            inner = inner_copy()
+            inner.update(msg)
+            outer = outer_copy()
+            outer.update(inner.digest())
+            res.append(outer.digest())
+        return res
+
+    def verify(self, tag: bytes, min_tag_size: Optional[int] = None) -> bool:
+        """验证当前消息的 MAC 值, `tag` 可以是截断后的 MAC 值 (取前若干字节).
+
+        `min_tag_size`: 截断后最少的字节数, 默认是 MAC 值长度的一半且不少于 10 字节 (RFC 2104).
+        小于 1 时按 1 处理, 空的 `tag` 总是验证失败. 长度不合法时直接返回 `False`, 不再计算散列.
+        """
+        if not valid_tag_size(len(tag), self.digest_size, min_tag_size):
+            return False
+        return hmac.compare_digest(self.digest()[:len(tag)], tag)
+
+
+def valid_tag_size(size: int, digest_size: int, min_tag_size: Optional[int] = None) -> bool:
+    if min_tag_size is None:
+        min_tag_size = min(max(10, digest_size // 2), digest_size)
+    # 空的 tag 与任何 MAC 值的空前缀都相等, 不能接受
+    return max(1, min_tag_size) <= size <= digest_size
+
+
+def verify(key: bytes, msg: bytes, tag: bytes,
+           digestmod: DigestMod = hashlib.sha256, min_tag_size: Optional[int] = None) -> bool:
+    """验证 `msg` 的 MAC 值, 参数含义见 `Hmac.verify`.
 
-from nami.util import Binary
+    先检查 `tag` 的长度, 不合法则不计算 HMAC 直接返回 `False`.
+    """
+    digest_size = digest_constructor(digestmod)().digest_size
+    if not valid_tag_size(len(tag), digest_size, min_tag_size):
+        return False
+    return Hmac(key, msg, digestmod).verify(tag, min_tag_size)
 
 
 class HmacWithSha256:
@@ -24,13 +151,4 @@ class HmacWithSha256:
 
     @classmethod
     def digest(cls, key: bytes, msg: bytes) -> bytes:
-        if len(key) > cls.block_size:
-            key = hashlib.sha256(key).digest()
-        key = key + b'\x00' * (cls.block_size - len(key))
-        ipad = bytes([54] * cls.block_size)
-        opad = bytes([92] * cls.block_size)
-        inner_xor = Binary.bytes_xor(key, ipad)
-        outer_xor = Binary.bytes_xor(key, opad)
-        hash1 = hashlib.sha256(inner_xor + msg).digest()
-        hash2 = hashlib.sha256(outer_xor + hash1).digest()
-        return hash2
+        return Hmac(key, msg).digest()
@@ -0,0 +1,147 @@
+"""分组密码的填充.
+
+明文长度不是分组长度的倍数时, 需要在末尾填充. 以分组长度 8, 需要填充 3 字节为例:
+
+  - PKCS7:      ... 03 03 03
+  - ANSI X.923: ... 00 00 03
+  - ISO 10126:  ... xx xx 03 (xx 是随机字节)
+  - 零填充:     ... 00 00 00
+
+前三种即使明文长度已经是分组长度的倍数, 也要填充一整个分组, 这样才能从最后一个字节得知填充长度.
+零填充在明文长度是分组长度的倍数时不填充, 但无法区分明文末尾的 0, 只适用于明文不以 0 结尾的场景.
+
+`pad_into` 直接在 `bytearray` 末尾追加填充, 不产生新对象. `unpad_size` 检查填充是否合法,
+检查过程不会因为某个字节不合法而提前结束, 避免通过耗时判断出填充哪里不合法 (padding oracle).
+"""
+
+__all__ = (
+    'ANSIX923',
+    'ISO10126',
+    'PKCS7',
+    'Padding',
+    'ZeroPadding',
+)
+
+import secrets
+from abc import ABC, abstractmethod
+
+from nami.util import Buffer
+
+
+class Padding(ABC):
+    """填充的基类, 子类实现 `pad_bytes` 和 `unpad_size`."""
+
+    def __init__(self, block_size: int):
+        if not 0 < block_size < 256:
+            raise ValueError('block_size must be in [1, 255]')
+        self.block_size = block_size
+
+    def __repr__(self):
+        return (
+            f'<{self.__class__.__name__}'
+            f' block_size={self.block_size!r}'
+            f'>'
+        )
+
+    def pad_size(self, length: int) -> int:
+        """长度为 `length` 的明文需要填充的字节数."""
+        return self.block_size - length % self.block_size
+
+    @abstractmethod
+    def pad_bytes(self, size: int) -> bytes:
+        """长度为 `size` 的填充."""
+
+    @abstractmethod
+    def unpad_size(self, data: Buffer) -> int:
+        """检查 `data` 末尾的填充, 返回填充的字节数, 不合法则抛出 `ValueError`."""
+
+    def pad_into(self, buf: bytearray) -> bytearray:
+        """在 `buf` 末尾追加填充, 返回 `buf`."""
+        buf += self.pad_bytes(self.pad_size(len(buf)))
+        return buf
+
+    def pad(self, data: Buffer) -> bytes:
+        return bytes(data) + self.pad_bytes(self.pad_size(len(data)))
+
+    def unpad(self, data: Buffer) -> bytes:
+        return bytes(memoryview(data)[:len(data) - self.unpad_size(data)])
+
+    def last_block(self, data: Buffer) -> memoryview:
+        view = memoryview(data).cast('B')
+        if not view or len(view) % self.block_size != 0:
+            raise ValueError('Invalid padding bytes.')
+        return view[-self.block_size:]
+
+
+class PKCS7(Padding):
+    """填充的每个字节都是填充长度."""
+
+    def __init__(self, block_size: int):
+        super().__init__(block_size)
+        self.pads = [bytes([size]) * size for size in range(block_size + 1)]
+
+    def pad_bytes(self, size: int) -> bytes:
+        return self.pads[size]
+
+    def unpad_size(self, data: Buffer) -> int:
+        block = self.last_block(data)
+        size = block[-1]
+        # 填充长度必须在 [1, block_size] 之间, 否则其中一个差值为负数, 右移后为 -1
+        bad = (size - 1) >> 8 | (self.block_size - size) >> 8
+        for i, byte in enumerate(reversed(block)):
+            # 只比较最后 `size` 个字节, i < size 时 mask 为 -1, 否则为 0
+            mask = (i - size) >> 8
+            bad |= (byte ^ size) & mask
+        if bad:
+            raise ValueError('Invalid padding bytes.')
+        return size
+
+
+class ANSIX923(Padding):
+    """填充的最后一个字节是填充长度, 其余都是 0."""
+
+    def pad_bytes(self, size: int) -> bytes:
+        return bytes(size - 1) + bytes([size])
+
+    def unpad_size(self, data: Buffer) -> int:
+        block = self.last_block(data)
+        size = block[-1]
+        bad = (size - 1) >> 8 | (self.block_size - size) >> 8
+        # 跳过最后一个字节, 比较其余 `size - 1` 个字节是否为 0
+        for i, byte in enumerate(reversed(block[:-1]), start=1):
+            mask = (i - size) >> 8
+            bad |= byte & mask
+        if bad:
+            raise ValueError('Invalid padding bytes.')
+        return size
+
+
+class ISO10126(Padding):
+    """填充的最后一个字节是填充长度, 其余是随机字节."""
+
+    def pad_bytes(self, size: int) -> bytes:
+        return secrets.token_bytes(size - 1) + bytes([size])
+
+    def unpad_size(self, data: Buffer) -> int:
+        size = self.last_block(data)[-1]
+        if (size - 1) >> 8 | (self.block_size - size) >> 8:
+            raise ValueError('Invalid padding bytes.')
+        return size
+
+
+class ZeroPadding(Padding):
+    """用 0 填充, 明文长度是分组长度的倍数时不填充."""
+
+    def pad_size(self, length: int) -> int:
+        return -length % self.block_size
+
+    def pad_bytes(self, size: int) -> bytes:
+        return bytes(size)
+
+    def unpad_size(self, data: Buffer) -> int:
+        view = memoryview(data).cast('B')
+        if len(view) % self.block_size != 0:
+            raise ValueError('Invalid padding bytes.')
+        # 填充长度本身无法隐藏, 无需按常数时间处理
+        block = bytes(view[-self.block_size:])
+        return len(block) - len(block.rstrip(b'\x00'))
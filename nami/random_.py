@@ -1,15 +1,59 @@
 """随机数.
 
 Python 中必须使用 `secret` 模块生成用于密码学的随机数.
+
+批量生成:
+  - `LinearCongruentialRandom.random_array`, `fill` 一次生成 n 个值. 安装了 NumPy 且 m <= 2 ** 32 时,
+    先算出前 k 个值, 再用跳跃 k 步的仿射变换 x -> (a^k * x + c_k) mod m 一次算出后 k 个值,
+    k 每次翻倍, 只需 log2(n) 次向量运算.
+  - `HashRandom.fill`, `random_bytes` 直接把原始的散列值写入 buffer, 不再转换成十六进制字符串.
+
+并行生成:
+  - `jump(n)` 跳过接下来的 n 个值. LCG 用平方-乘法计算 n 步的仿射变换, 只需 O(log n) 次乘法;
+    `HashRandom` 的状态是计数器, 直接加 n.
+  - `spawn(k, stride)` 返回 k 个生成器, 第 i 个从第 i * stride 个值开始. 每个生成器各取 stride 个值,
+    依次拼接后与单个生成器连续生成 k * stride 个值的结果相同, 可以交给进程池分别生成.
+
+`HashDrbg` 是基于 SHAKE256 的确定性随机比特生成器, 状态是 32 字节的密钥, 每次从密钥一次性
+生成一大块输出, 开头的 32 字节作为新的密钥, 其余放入缓冲区.
 """
 
 __all__ = (
+    'HashDrbg',
     'LinearCongruentialRandom',
     'HashRandom',
 )
 
+import secrets
+from array import array
 from datetime import datetime
-from hashlib import sha256
+from hashlib import sha256, shake_256
+from typing import List, Optional, Tuple, Union
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+from nami.util import Buffer
+
+# `HashRandom.fill` 每次生成的散列值个数
+HASH_CHUNK = 1 << 12
+# 可以写入 `LinearCongruentialRandom.fill` 的 buffer 格式 (无符号整数)
+UNSIGNED_FORMATS = frozenset('BHILQ')
+
+
+def affine_pow(a: int, c: int, m: int, n: int) -> Tuple[int, int]:
+    """仿射变换 x -> (a * x + c) mod m 连续作用 `n` 次, 等价于 x -> (A * x + C) mod m, 返回 (A, C)."""
+    result_a, result_c = 1 % m, 0
+    step_a, step_c = a % m, c % m
+    while n:
+        if n & 1:
+            # 先作用 result, 再作用 step
+            result_a, result_c = step_a * result_a % m, (step_a * result_c + step_c) % m
+        step_a, step_c = step_a * step_a % m, (step_a * step_c + step_c) % m
+        n >>= 1
+    return result_a, result_c
 
 
 class LinearCongruentialRandom:
@@ -29,6 +73,76 @@ class LinearCongruentialRandom:
         self.state = value
         return value
 
+    def random_array(self, n: int) -> Union['np.ndarray', array]:
+        """接下来的 `n` 个值, 与调用 `n` 次 `random` 相同.
+
+        安装了 NumPy 时返回 `np.uint64` 数组, 否则返回 `array('Q')`.
+        """
+        if self.m > 1 << 64:
+            raise ValueError('m must not exceed 2 ** 64')
+        out = np.empty(n, np.uint64) if np is not None else array('Q', bytes(8 * n))
+        self.fill(out)
+        return out
+
+    def fill(self, buffer: Buffer) -> None:
+        """用接下来的值依次填满无符号整数的 buffer, 例如 `array('I')`, NumPy 数组, `bytearray`.
+
+        buffer 的元素需要能容纳 m - 1.
+        """
+        view = memoryview(buffer)
+        if view.ndim != 1 or view.format.lstrip('@=<>!') not in UNSIGNED_FORMATS:
+            raise TypeError('buffer must be a one-dimensional array of unsigned integers')
+        if self.m - 1 >> 8 * view.itemsize:
+            raise ValueError(f'values modulo {self.m} do not fit in {view.itemsize} bytes')
+        n = len(view)
+        if n == 0:
+            return
+
+        if np is None or self.m > 1 << 32:
+            a, c, m, x = self.a, self.c, self.m, self.state
+            for i in range(n):
+                x = (a * x + c) % m
+                view[i] = x
+            self.state = x
+            return
+
+        target = np.asarray(view)
+        out = target if target.dtype == np.uint64 else np.empty(n, np.uint64)
+        out[0] = self.random()
+        # (step_a, step_c) 是跳跃 `filled` 步的仿射变换. m <= 2 ** 32 时乘积不会超过 uint64
+        m = np.uint64(self.m)
+        step_a, step_c, filled = self.a % self.m, self.c % self.m, 1
+        while filled < n:
+            size = min(filled, n - filled)
+            chunk = out[filled: filled + size]
+            np.multiply(out[:size], np.uint64(step_a), out=chunk)
+            chunk += np.uint64(step_c)
+            chunk %= m
+            step_a, step_c = step_a * step_a % self.m, (step_a * step_c + step_c) % self.m
+            filled += size
+        if out is not target:
+            target[:] = out
+        self.state = int(out[-1])
+
+    def jump(self, n: int) -> None:
+        """跳过接下来的 `n` 个值."""
+        if n < 0:
+            raise ValueError('n must be non-negative')
+        if n:
+            a, c = affine_pow(self.a, self.c, self.m, n)
+            self.state = (a * self.state + c) % self.m
+
+    def spawn(self, k: int, stride: int) -> List['LinearCongruentialRandom']:
+        """`k` 个生成器, 第 i 个从接下来的第 i * `stride` 个值开始, 自身跳过全部 k * `stride` 个值."""
+        a, c = affine_pow(self.a, self.c, self.m, stride)
+        gens = []
+        for _ in range(k):
+            gen = self.__class__(self.a, self.c, self.m)
+            gen.seed(self.state)
+            gens.append(gen)
+            self.state = (a * self.state + c) % self.m
+        return gens
+
     @classmethod
     def sample(cls):
         r = cls(3, 0, 7)
@@ -50,3 +164,137 @@ class HashRandom:
         value = sha256(str(self.state).encode()).hexdigest()
         self.state += 1
         return value
+
+    def jump(self, n: int) -> None:
+        """跳过接下来的 `n` 个值."""
+        if n < 0:
+            raise ValueError('n must be non-negative')
+        self.state += n
+
+    def spawn(self, k: int, stride: int) -> List['HashRandom']:
+        """`k` 个生成器, 第 i 个从接下来的第 i * `stride` 个值开始, 自身跳过全部 k * `stride` 个值."""
+        gens = []
+        for _ in range(k):
+            gen = self.__class__()
+            gen.seed(self.state)
+            gens.append(gen)
+            self.jump(stride)
+        return gens
+
+    def fill(self, buffer: Buffer) -> None:
+        """用接下来的散列值填满 `buffer`, 与 `random` 返回值对应的原始字节相同.
+
+        `buffer` 的长度不是 32 的倍数时, 最后一个散列值只使用开头的部分.
+        """
+        view = memoryview(buffer).cast('B')
+        size = sha256().digest_size
+        state = self.state
+        for offset in range(0, len(view), HASH_CHUNK * size):
+            count = min(HASH_CHUNK, -(-(len(view) - offset) // size))
+            data = b''.join([sha256(b'%d' % i).digest() for i in range(state, state + count)])
+            view[offset: offset + len(data)] = data[:len(view) - offset]
+            state += count
+        self.state = state
+
+    def random_bytes(self, n: int) -> bytes:
+        buf = bytearray(n)
+        self.fill(buf)
+        return bytes(buf)
+
+
+class HashDrbg:
+    """确定性随机比特生成器 with SHAKE256.
+
+    每次补充缓冲区时计算 shake_256(key).digest(32 + buffer_size), 开头 32 字节替换旧的密钥,
+    其余复制到单独的缓冲区作为输出. 旧的密钥不再保存, 状态泄露时无法推算出之前各个缓冲区的输出;
+    但当前缓冲区直到下次补充之前都保留在内存中, 包括其中已经取出的部分. 需要时调用 `reseed`
+    丢弃它.
+
+    输出是连续的字节流, 与每次取多少字节无关: 例如 `randbytes(10) + randbytes(10)`
+    等于用同样的种子调用 `randbytes(20)`. 相同的种子和 `buffer_size` 得到相同的输出.
+    """
+
+    KEY_SIZE = 32
+    BUFFER_SIZE = 1 << 20
+
+    def __init__(self, seed: Optional[Buffer] = None, buffer_size: int = BUFFER_SIZE):
+        if buffer_size <= 0:
+            raise ValueError('buffer_size must be positive')
+        self.buffer_size = buffer_size
+        self.seed(secrets.token_bytes(self.KEY_SIZE) if seed is None else seed)
+
+    def seed(self, value: Buffer) -> None:
+        """丢弃当前状态, 只由 `value` 决定之后的输出."""
+        self.key = shake_256(b'seed' + bytes(value)).digest(self.KEY_SIZE)
+        self.buffer = b''
+        self.offset = 0
+
+    def reseed(self, entropy: Optional[Buffer] = None) -> None:
+        """把 `entropy` 混入当前状态, 缓冲区中剩余的输出会被丢弃. 不传入时使用系统的随机数."""
+        if entropy is None:
+            entropy = secrets.token_bytes(self.KEY_SIZE)
+        self.key = shake_256(b'reseed' + self.key + bytes(entropy)).digest(self.KEY_SIZE)
+        self.buffer = b''
+        self.offset = 0
+
+    def refill(self) -> None:
+        # 缓冲区不引用新的密钥, 取出的输出无论多长都不会包含密钥
+        output = shake_256(self.key).digest(self.KEY_SIZE + self.buffer_size)
+        self.key = output[:self.KEY_SIZE]
+        self.buffer = output[self.KEY_SIZE:]
+        self.offset = 0
+
+    def fill(self, buffer: Buffer) -> None:
+        """用接下来的输出填满 `buffer`."""
+        view = memoryview(buffer).cast('B')
+        pos, size = 0, len(view)
+        while pos < size:
+            if self.offset == len(self.buffer):
+                self.refill()
+            count = min(size - pos, len(self.buffer) - self.offset)
+            view[pos: pos + count] = memoryview(self.buffer)[self.offset: self.offset + count]
+            pos += count
+            self.offset += count
+
+    def randbytes(self, n: int) -> bytes:
+        if n < 0:
+            raise ValueError('number of bytes must be non-negative')
+        end = self.offset + n
+        # 大部分情况下缓冲区中剩余的字节足够, 直接切片
+        if end <= len(self.buffer):
+            data = self.buffer[self.offset: end]
+            self.offset = end
+            return data
+        # 跨越多个缓冲区时, 用 memoryview 引用各段输出, 拼接时只复制一次
+        parts = [memoryview(self.buffer)[self.offset:]]
+        n -= len(parts[0])
+        while True:
+            self.refill()
+            if n <= self.buffer_size:
+                break
+            parts.append(memoryview(self.buffer))
+            n -= self.buffer_size
+        self.offset = n
+        parts.append(memoryview(self.buffer)[:n])
+        return b''.join(parts)
+
+    def getrandbits(self, k: int) -> int:
+        """`k` 位的随机非负整数."""
+        if k < 0:
+            raise ValueError('number of bits must be non-negative')
+        size = (k + 7) // 8
+        return int.from_bytes(self.randbytes(size), 'little') >> (size * 8 - k)
+
+    def randbelow(self, n: int) -> int:
+        """[0, n) 中的随机整数. 取 n 的位数个随机比特, 不小于 n 时重新生成, 平均不超过 2 次."""
+        if n <= 0:
+            raise ValueError('n must be positive')
+        k = n.bit_length()
+        value = self.getrandbits(k)
+        while value >= n:
+            value = self.getrandbits(k)
+        return value
+
+    def random(self) -> float:
+        """[0, 1) 中的随机浮点数."""
+        return self.getrandbits(53) / (1 << 53)
@@ -0,0 +1,387 @@
+"""随机数的统计检验.
+
+对 `nami.random_` 中生成器的输出做一组检验, 输出按块生成, 每个检验只保存少量累计量,
+因此可以检验任意长度的输出:
+  - `FrequencyTest` 频数的卡方检验.
+  - `RunsTest` 以 0.5 为界的游程检验.
+  - `SerialCorrelationTest` 相邻两个值的相关系数.
+  - `GapTest` 落在区间 [low, high) 中的值之间的间隔 (Knuth 的 gap test).
+  - `BirthdaySpacingsTest` Marsaglia 的生日间隔检验.
+  - `find_period` 用 Brent 算法找出小型线性同余生成器的周期.
+
+检验需要安装 NumPy (`find_period` 除外). 在项目根目录下运行, 例如:
+
+    python -m nami.random_battery LinearCongruentialRandom 48271 0 2147483647 --seed 1
+    python -m nami.random_battery HashDrbg --count 4000000
+"""
+
+__all__ = (
+    'BatteryReport',
+    'BirthdaySpacingsTest',
+    'FrequencyTest',
+    'GapTest',
+    'RunsTest',
+    'SerialCorrelationTest',
+    'TestResult',
+    'chi2_sf',
+    'find_period',
+    'run_battery',
+)
+
+import argparse
+import math
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+from nami import random_
+
+# 每次生成的值的个数
+CHUNK_SIZE = 1 << 16
+# p 值小于 ALPHA 时认为未通过
+ALPHA = 0.001
+
+
+class TestResult(NamedTuple):
+    name: str
+    statistic: float
+    p_value: float
+
+    def passed(self, alpha: float = ALPHA) -> bool:
+        return self.p_value >= alpha
+
+
+class BatteryReport(NamedTuple):
+    generator: str
+    count: int
+    results: List[TestResult]
+    # 生成随机数和运行检验分别花费的秒数
+    generate_seconds: float
+    test_seconds: float
+
+    @property
+    def values_per_second(self) -> float:
+        return self.count / self.generate_seconds if self.generate_seconds else math.inf
+
+    def passed(self, alpha: float = ALPHA) -> bool:
+        return all(result.passed(alpha) for result in self.results)
+
+
+def gamma_q(a: float, x: float) -> float:
+    """正则化的上不完全伽马函数 Q(a, x), x < a + 1 时用级数, 否则用连分数 (Lentz 算法)."""
+    if x <= 0:
+        return 1.0
+    log_prefix = -x + a * math.log(x) - math.lgamma(a)
+    if x < a + 1:
+        term = total = 1 / a
+        n = a
+        while abs(term) > abs(total) * 1e-15:
+            n += 1
+            term *= x / n
+            total += term
+        return max(0.0, 1 - total * math.exp(log_prefix))
+
+    tiny = 1e-300
+    b = x + 1 - a
+    c, d = 1 / tiny, 1 / b
+    h = d
+    for i in range(1, 1000):
+        an = -i * (i - a)
+        b += 2
+        d = an * d + b
+        d = tiny if abs(d) < tiny else d
+        c = b + an / c
+        c = tiny if abs(c) < tiny else c
+        d = 1 / d
+        delta = d * c
+        h *= delta
+        if abs(delta - 1) < 1e-15:
+            break
+    return math.exp(log_prefix) * h
+
+
+def chi2_sf(x: float, df: int) -> float:
+    """自由度为 `df` 的卡方分布, 大于 `x` 的概率."""
+    return gamma_q(df / 2, x / 2)
+
+
+def normal_p_value(z: float) -> float:
+    """标准正态分布的双侧 p 值."""
+    return math.erfc(abs(z) / math.sqrt(2))
+
+
+def chi2_test(name: str, observed: 'np.ndarray', expected: 'np.ndarray') -> TestResult:
+    statistic = float(np.sum((observed - expected) ** 2 / expected))
+    return TestResult(name, statistic, chi2_sf(statistic, len(observed) - 1))
+
+
+class StreamTest(ABC):
+    """检验的基类, 依次传入 [0, 1) 中的浮点数组, 最后调用 `result`."""
+
+    name = ''
+
+    @abstractmethod
+    def update(self, chunk: 'np.ndarray') -> None:
+        pass
+
+    @abstractmethod
+    def result(self) -> TestResult:
+        pass
+
+
+class FrequencyTest(StreamTest):
+    """把 [0, 1) 等分成 `bins` 个区间, 各区间的频数应该相同."""
+
+    name = 'frequency'
+
+    def __init__(self, bins: int = 256):
+        self.counts = np.zeros(bins, np.int64)
+
+    def update(self, chunk: 'np.ndarray') -> None:
+        bins = len(self.counts)
+        self.counts += np.bincount((chunk * bins).astype(np.int64), minlength=bins)
+
+    def result(self) -> TestResult:
+        expected = np.full(len(self.counts), self.counts.sum() / len(self.counts))
+        return chi2_test(self.name, self.counts, expected)
+
+
+class RunsTest(StreamTest):
+    """把每个值记为是否不小于 0.5, 连续相同的一段是一个游程, 游程数近似服从正态分布."""
+
+    name = 'runs'
+
+    def __init__(self):
+        self.count = self.ones = self.changes = 0
+        self.last = None
+
+    def update(self, chunk: 'np.ndarray') -> None:
+        if not len(chunk):
+            return
+        bits = chunk >= 0.5
+        self.count += len(bits)
+        self.ones += int(np.count_nonzero(bits))
+        self.changes += int(np.count_nonzero(bits[1:] != bits[:-1]))
+        if self.last is not None and self.last != bits[0]:
+            self.changes += 1
+        self.last = bits[-1]
+
+    def result(self) -> TestResult:
+        n, n1 = self.count, self.ones
+        n2 = n - n1
+        if not n1 or not n2:
+            return TestResult(self.name, math.inf, 0.0)
+        mean = 2 * n1 * n2 / n + 1
+        var = (mean - 1) * (mean - 2) / (n - 1)
+        z = (self.changes + 1 - mean) / math.sqrt(var)
+        return TestResult(self.name, z, normal_p_value(z))
+
+
+class SerialCorrelationTest(StreamTest):
+    """相邻两个值的相关系数 r, 独立时 r * sqrt(n) 近似服从标准正态分布."""
+
+    name = 'serial correlation'
+
+    def __init__(self):
+        self.count = 0
+        self.sum = self.sum_sq = self.sum_xy = 0.0
+        self.last = None
+
+    def update(self, chunk: 'np.ndarray') -> None:
+        if not len(chunk):
+            return
+        if self.last is not None:
+            self.sum_xy += self.last * chunk[0]
+        self.sum_xy += float(np.dot(chunk[1:], chunk[:-1]))
+        self.sum += float(chunk.sum())
+        self.sum_sq += float(np.dot(chunk, chunk))
+        self.count += len(chunk)
+        self.last = float(chunk[-1])
+
+    def result(self) -> TestResult:
+        n = self.count
+        denominator = n * self.sum_sq - self.sum ** 2
+        if n < 2 or denominator <= 0:
+            return TestResult(self.name, math.inf, 0.0)
+        r = (n * self.sum_xy - self.sum ** 2) / denominator
+        return TestResult(self.name, r, normal_p_value(r * math.sqrt(n)))
+
+
+class GapTest(StreamTest):
+    """落在 [low, high) 中的相邻两个值之间隔了几个值, 间隔服从几何分布. 不小于 `max_gap` 的合并为一类."""
+
+    name = 'gap'
+
+    def __init__(self, low: float = 0.0, high: float = 0.5, max_gap: int = 16):
+        self.low, self.high, self.max_gap = low, high, max_gap
+        self.counts = np.zeros(max_gap + 1, np.int64)
+        # 上一个落在区间中的值之后又过了几个值, 还没有出现时为 `None`
+        self.since = None
+
+    def update(self, chunk: 'np.ndarray') -> None:
+        hits = np.flatnonzero((chunk >= self.low) & (chunk < self.high))
+        if not len(hits):
+            if self.since is not None:
+                self.since += len(chunk)
+            return
+        gaps = np.diff(hits) - 1
+        if self.since is not None:
+            gaps = np.concatenate(([self.since + hits[0]], gaps))
+        self.counts += np.bincount(np.minimum(gaps, self.max_gap), minlength=self.max_gap + 1)
+        self.since = len(chunk) - 1 - int(hits[-1])
+
+    def result(self) -> TestResult:
+        p = self.high - self.low
+        probs = p * (1 - p) ** np.arange(self.max_gap + 1)
+        probs[-1] = (1 - p) ** self.max_gap
+        return chi2_test(self.name, self.counts, probs * self.counts.sum())
+
+
+class BirthdaySpacingsTest(StreamTest):
+    """每 `m` 个值作为一年 `days` 天中的生日, 排序后相邻生日的间隔中重复的个数近似服从
+    参数为 m^3 / (4 * days) 的泊松分布. 所有样本的重复数之和与期望比较.
+    """
+
+    name = 'birthday spacings'
+
+    def __init__(self, m: int = 512, days: int = 1 << 24):
+        self.m, self.days = m, days
+        self.samples = self.duplicates = 0
+        self.pending = np.empty(0, np.int64)
+
+    def update(self, chunk: 'np.ndarray') -> None:
+        birthdays = np.concatenate((self.pending, (chunk * self.days).astype(np.int64)))
+        rows = len(birthdays) // self.m
+        self.pending = birthdays[rows * self.m:]
+        if not rows:
+            return
+        samples = np.sort(birthdays[:rows * self.m].reshape(rows, self.m), axis=1)
+        spacings = np.sort(np.diff(samples, axis=1, prepend=0), axis=1)
+        self.duplicates += int(np.count_nonzero(spacings[:, 1:] == spacings[:, :-1]))
+        self.samples += rows
+
+    def result(self) -> TestResult:
+        expected = self.samples * self.m ** 3 / (4 * self.days)
+        if not expected:
+            return TestResult(self.name, 0.0, 1.0)
+        z = (self.duplicates - expected) / math.sqrt(expected)
+        return TestResult(self.name, z, normal_p_value(z))
+
+
+def default_tests() -> List[StreamTest]:
+    return [FrequencyTest(), RunsTest(), SerialCorrelationTest(), GapTest(), BirthdaySpacingsTest()]
+
+
+def uniform_chunks(gen, count: int, chunk_size: int = CHUNK_SIZE) -> Iterator['np.ndarray']:
+    """`gen` 接下来的 `count` 个值, 换算成 [0, 1) 中的浮点数, 每次最多 `chunk_size` 个.
+
+    有 `random_array` 的 (线性同余) 除以模数, 其余的每 4 个字节作为一个 32 位整数.
+    """
+    read = getattr(gen, 'randbytes', None) or getattr(gen, 'random_bytes', None)
+    for start in range(0, count, chunk_size):
+        size = min(chunk_size, count - start)
+        if hasattr(gen, 'random_array'):
+            yield np.asarray(gen.random_array(size), np.float64) / gen.m
+        else:
+            yield np.frombuffer(read(4 * size), '<u4') / 2.0 ** 32
+
+
+def run_battery(gen, count: int, chunk_size: int = CHUNK_SIZE,
+                tests: Optional[Sequence[StreamTest]] = None) -> BatteryReport:
+    """用 `gen` 接下来的 `count` 个值运行 `tests`, 默认运行全部的检验. 需要安装 NumPy."""
+    if np is None:
+        raise ImportError('run_battery requires numpy')
+    tests = default_tests() if tests is None else tests
+    generate_seconds = test_seconds = 0.0
+    chunks = uniform_chunks(gen, count, chunk_size)
+    while True:
+        start = time.perf_counter()
+        chunk = next(chunks, None)
+        generated = time.perf_counter()
+        generate_seconds += generated - start
+        if chunk is None:
+            break
+        for test in tests:
+            test.update(chunk)
+        test_seconds += time.perf_counter() - generated
+    results = [test.result() for test in tests]
+    return BatteryReport(type(gen).__name__, count, results, generate_seconds, test_seconds)
+
+
+def find_period(step: Callable[[int], int], start: int, limit: int = 1 << 24) -> Optional[Tuple[int, int]]:
+    """Brent 算法找出序列 start, step(start), step(step(start)), ... 的周期.
+
+    返回 (周期长度, 进入循环之前的长度), 走了 `limit` 步仍未找到时返回 `None`.
+    """
+    power = period = 1
+    tortoise, hare = start, step(start)
+    steps = 1
+    while tortoise != hare:
+        if steps >= limit:
+            return None
+        if power == period:
+            tortoise, power, period = hare, power * 2, 0
+        hare = step(hare)
+        period += 1
+        steps += 1
+
+    tortoise = hare = start
+    for _ in range(period):
+        hare = step(hare)
+    tail = 0
+    while tortoise != hare:
+        tortoise, hare = step(tortoise), step(hare)
+        tail += 1
+    return period, tail
+
+
+def lcg_period(gen: random_.LinearCongruentialRandom, limit: int = 1 << 24) -> Optional[Tuple[int, int]]:
+    """线性同余生成器从当前状态开始的周期, 参数含义见 `find_period`."""
+    a, c, m = gen.a, gen.c, gen.m
+    return find_period(lambda x: (a * x + c) % m, gen.state, limit)
+
+
+def make_generator(name: str, args: Sequence[int], seed: int):
+    if name not in random_.__all__:
+        raise ValueError(f'unknown generator {name!r}, choose from {", ".join(random_.__all__)}')
+    cls = getattr(random_, name)
+    gen = cls(*args)
+    # `HashDrbg` 的种子是字节序列
+    gen.seed(str(seed).encode() if cls is random_.HashDrbg else seed)
+    return gen
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('generator', help='`nami.random_` 中的生成器类名')
+    parser.add_argument('args', nargs='*', type=int, help='生成器的构造参数')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--count', type=int, default=1 << 20)
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--period-limit', type=int, default=1 << 24,
+                        help='线性同余生成器查找周期时最多走的步数')
+    options = parser.parse_args(argv)
+    if np is None:
+        parser.error('NumPy is required, install it with `pip install numpy`')
+
+    gen = make_generator(options.generator, options.args, options.seed)
+    if isinstance(gen, random_.LinearCongruentialRandom):
+        period = lcg_period(gen, options.period_limit)
+        print(f'period: {period[0]} (tail {period[1]})' if period else f'period: > {options.period_limit}')
+
+    report = run_battery(gen, options.count, options.chunk_size)
+    for result in report.results:
+        status = 'PASS' if result.passed() else 'FAIL'
+        print(f'{result.name:<20} statistic={result.statistic:<14.6g} p={result.p_value:<10.4g} {status}')
+    print(f'{report.count} values, generate {report.values_per_second / 1e6:.2f} M values/s, '
+          f'test {report.count / report.test_seconds / 1e6:.2f} M values/s')
+    return 0 if report.passed() else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -6,28 +6,50 @@ demo:
   - P47 XOR 运算规则. `xor_rule`
   - P48 比特序列的 XOR. `bit_xor`
   - P50 一次性密码本. `OneTimePad`
-  - P54 Feistel 网络. `Feistel`
+  - P54 Feistel 网络. `Feistel`, 整数版本 `FeistelEngine` 每轮使用不同的子密钥, 可以批量处理分组.
   - P61 三重 DES. `TripleDES`
 
+格式保留加密 `FF1` (NIST SP 800-38G): 密文与明文的字母表和长度相同, 例如 10 位数字加密后还是 10 位数字.
+
 AES 的最终实现涉及第四章内容, 而且 AES 可以用于生产环境所以放到了:
 https://github.com/dyq666/sanji/blob/master/util/third_cryptography.py
 """
 
 __all__ = (
+    'FF1',
     'Feistel',
+    'FeistelEngine',
     'OneTimePad',
     'TripleDES',
 )
 
+import hashlib
+import mmap
+import os
 import secrets
-from typing import Tuple
+from contextlib import ExitStack
+from functools import lru_cache
+from itertools import accumulate, chain
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
 
-from nami.util import Binary
+from nami.block_mode import batch_apply, pack
+from nami.padding import PKCS7, Padding
+from nami.util import Binary, Buffer, bulk_xor
 
 from cryptography.hazmat.backends import default_backend
-from cryptography.hazmat.primitives import padding
 from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
 
+MASK64 = (1 << 64) - 1
+# `FeistelEngine` 的半块不超过此位数时, 整个分组能放进 uint64, 批量处理使用 NumPy
+NUMPY_HALF_BITS = 32
+# `FF1` 默认的字母表, 基数为 radix 时取前 radix 个字符
+DIGITS = '0123456789abcdefghijklmnopqrstuvwxyz'
+
 
 def encode_midnight():
     """编码 midnight demo."""
@@ -78,8 +100,13 @@ class OneTimePad:
     """一次性密码本.
 
     密钥长度必须与消息长度相同.
+
+    大文件使用 `encrypt_file` 和 `generate_key_file`, 内存占用与文件大小无关.
     """
 
+    # 处理文件时每次 XOR 的字节数
+    WINDOW_SIZE = 1 << 24
+
     def __init__(self, key: bytes):
         self.key = key
 
@@ -94,6 +121,49 @@ class OneTimePad:
     def generate_key(length) -> bytes:
         return secrets.token_bytes(length)
 
+    @classmethod
+    def encrypt_file(cls, src: str, key_path: str, dst: str) -> None:
+        """加密文件 `src`, 密钥从文件 `key_path` 中读取, 结果写入 `dst`.
+
+        三个文件都用 `mmap` 映射, 按 `WINDOW_SIZE` 分段 XOR, 结果直接写入 `dst` 的映射中.
+        """
+        size = os.path.getsize(src)
+        if os.path.getsize(key_path) != size:
+            raise ValueError
+        with open(dst, 'wb') as f:
+            f.truncate(size)
+        # 空文件不能 `mmap`
+        if size == 0:
+            return
+
+        with ExitStack() as stack:
+            src_map, key_map = (
+                stack.enter_context(mmap.mmap(
+                    stack.enter_context(open(path, 'rb')).fileno(), 0, access=mmap.ACCESS_READ,
+                ))
+                for path in (src, key_path)
+            )
+            dst_map = stack.enter_context(mmap.mmap(
+                stack.enter_context(open(dst, 'r+b')).fileno(), 0, access=mmap.ACCESS_WRITE,
+            ))
+            # `memoryview` 必须在 `mmap` 关闭前释放, 因此最后进入
+            src_view, key_view, dst_view = (
+                stack.enter_context(memoryview(m)) for m in (src_map, key_map, dst_map)
+            )
+            for start in range(0, size, cls.WINDOW_SIZE):
+                end = min(start + cls.WINDOW_SIZE, size)
+                bulk_xor(src_view[start:end], key_view[start:end], out=dst_view[start:end])
+            dst_map.flush()
+
+    decrypt_file = encrypt_file
+
+    @classmethod
+    def generate_key_file(cls, path: str, length: int) -> None:
+        """生成长度为 `length` 的密钥并分段写入文件 `path`."""
+        with open(path, 'wb') as f:
+            for start in range(0, length, cls.WINDOW_SIZE):
+                f.write(secrets.token_bytes(min(cls.WINDOW_SIZE, length - start)))
+
 
 class Feistel:
     """Feistel 网络的简化版.
@@ -134,30 +204,396 @@ class Feistel:
         return secrets.token_bytes(length)
 
 
+def mix64(subkey: int, half):
+    """`FeistelEngine` 默认的轮函数: splitmix64 的输出函数作用于 half ^ subkey.
+
+    只用到位运算和乘法, `half` 可以是 `int` 或 NumPy 的 uint64 数组 (乘法自动按 2 ** 64 取模).
+    """
+    x = half ^ subkey
+    x = (x ^ (x >> 30)) * 0xbf58476d1ce4e5b9 & MASK64
+    x = (x ^ (x >> 27)) * 0x94d049bb133111eb & MASK64
+    return x ^ (x >> 31)
+
+
+class FeistelEngine:
+    """整数版本的 Feistel 网络, 分组是 `2 * half_bits` 位的整数.
+
+    与 `Feistel` 不同:
+      1. 左右两半是整数, 每轮 (L, R) -> (R, L ^ F(k_i, R)), 不再切片和拼接 `bytes`.
+      2. 每轮使用不同的子密钥, 用 `from_key` 从密钥派生, 也可以直接传入.
+      3. `encrypt_blocks` 一次处理多个分组. 半块不超过 `NUMPY_HALF_BITS` 位且安装了 NumPy 时,
+         每一轮都对整个数组运算.
+
+    轮函数 `algorithm(subkey, half)` 返回整数, 由引擎截断为 `half_bits` 位. 批量处理时 `half` 是
+    NumPy 的 uint64 数组, 轮函数不支持数组时 (例如调用 `hashlib`) 需要传入 `vectorized=False`.
+    """
+
+    def __init__(self, subkeys: Sequence[int], half_bits: int,
+                 algorithm: Callable = mix64, vectorized: bool = True):
+        if not subkeys or half_bits <= 0:
+            raise ValueError
+        self.subkeys = list(subkeys)
+        self.half_bits = half_bits
+        self.mask = (1 << half_bits) - 1
+        self.algorithm = algorithm
+        self.vectorized = vectorized and np is not None and half_bits <= NUMPY_HALF_BITS
+
+    @classmethod
+    def from_key(cls, key: bytes, half_bits: int, rounds: int = 10, **kwargs) -> 'FeistelEngine':
+        return cls(cls.key_schedule(key, rounds), half_bits, **kwargs)
+
+    @staticmethod
+    def key_schedule(key: bytes, rounds: int) -> List[int]:
+        """从 `key` 派生 `rounds` 个 64 位子密钥."""
+        data = hashlib.shake_256(key).digest(8 * rounds)
+        return [int.from_bytes(data[i: i + 8], 'big') for i in range(0, len(data), 8)]
+
+    @property
+    def block_size(self) -> int:
+        """分组的字节数, 只有 `half_bits` 是 4 的倍数时才有意义."""
+        return self.half_bits // 4
+
+    def encrypt_halves(self, l, r):
+        f, mask = self.algorithm, self.mask
+        for k in self.subkeys:
+            l, r = r, l ^ (f(k, r) & mask)
+        return l, r
+
+    def decrypt_halves(self, l, r):
+        f, mask = self.algorithm, self.mask
+        for k in reversed(self.subkeys):
+            l, r = r ^ (f(k, l) & mask), l
+        return l, r
+
+    def encrypt(self, block: int) -> int:
+        l, r = self.encrypt_halves(block >> self.half_bits, block & self.mask)
+        return l << self.half_bits | r
+
+    def decrypt(self, block: int) -> int:
+        l, r = self.decrypt_halves(block >> self.half_bits, block & self.mask)
+        return l << self.half_bits | r
+
+    def encrypt_blocks(self, blocks: Iterable[int]) -> Union['np.ndarray', List[int]]:
+        """ECB 方式加密多个分组. 可以使用 NumPy 时返回 uint64 数组, 否则返回 `list`."""
+        return self._blocks(blocks, self.encrypt_halves, self.encrypt)
+
+    def decrypt_blocks(self, blocks: Iterable[int]) -> Union['np.ndarray', List[int]]:
+        return self._blocks(blocks, self.decrypt_halves, self.decrypt)
+
+    def _blocks(self, blocks, halves_func, block_func):
+        if not self.vectorized:
+            return [block_func(int(block)) for block in blocks]
+        blocks = np.asarray(blocks if isinstance(blocks, np.ndarray) else list(blocks), np.uint64)
+        l, r = halves_func(blocks >> self.half_bits, blocks & self.mask)
+        return l << self.half_bits | r
+
+    def ctr_keystream(self, nonce: int, count: int) -> Union['np.ndarray', List[int]]:
+        """加密 nonce, nonce + 1, ..., nonce + count - 1 (按分组长度取模) 得到的 `count` 个分组."""
+        block_mask = (1 << 2 * self.half_bits) - 1
+        if self.vectorized:
+            counters = (np.arange(count, dtype=np.uint64) + np.uint64(nonce & block_mask)) & block_mask
+        else:
+            counters = ((nonce + i) & block_mask for i in range(count))
+        return self.encrypt_blocks(counters)
+
+    def ctr_xor(self, data: Buffer, nonce: int) -> bytes:
+        """CTR 模式加密或解密 `data`, 密钥流的每个分组按大端序转为 `block_size` 个字节."""
+        if self.half_bits % 4 != 0:
+            raise ValueError('half_bits must be a multiple of 4')
+        size = self.block_size
+        keystream = self.ctr_keystream(nonce, -(-len(data) // size))
+        if self.vectorized:
+            # 每个 uint64 按大端序展开后, 取最后 `size` 个字节
+            keystream = keystream.astype('>u8').view(np.uint8).reshape(-1, 8)[:, 8 - size:].tobytes()
+        else:
+            keystream = b''.join(block.to_bytes(size, 'big') for block in keystream)
+        return bulk_xor(data, keystream[:len(data)])
+
+
+class FF1:
+    """格式保留加密 FF1 (NIST SP 800-38G Rev. 1).
+
+    FF1 是 10 轮的非平衡 Feistel 网络: 长度为 n 的数字串分为 u = n // 2 和 v = n - u 两半,
+    每轮用 AES 的 CBC-MAC 计算 F(tweak, i, B), 再与另一半按 radix^m 取模相加 (而不是 XOR).
+
+    优化:
+      - 每轮 CBC-MAC 的输入中, 只有最后一个分组与轮数和数字串有关. 之前的部分 (P 和 tweak)
+        按 (长度, tweak) 预先计算, 缓存在 `prepare` 中.
+      - `encrypt_many` 等批量接口把同样长度的所有值的同一轮放在一起, 每轮只调用一次 AES.
+      - 数字串在各轮之间保持为整数, 只在开头和结尾与字符串互相转换.
+
+    `encrypt_int` 用循环行走 (cycle-walking) 加密 [0, domain) 中的整数: 在 radix^n >= domain 的
+    最短数字串上加密, 结果不小于 domain 时继续加密, 直到落在 domain 中.
+    """
+
+    ROUNDS = 10
+    # 定义域 radix^n 至少为此值, 见 SP 800-38G Rev. 1
+    MIN_DOMAIN = 1_000_000
+    # `prepare` 缓存的 (长度, tweak) 组合数
+    PREPARE_CACHE_SIZE = 256
+    # 可以用 `format` 直接转换的基数
+    FORMAT_SPECS = {2: 'b', 8: 'o', 10: 'd', 16: 'x'}
+
+    def __init__(self, key: bytes, radix: int = 10, tweak: bytes = b'', alphabet: Optional[str] = None):
+        """`alphabet`: 字符串接口使用的字母表, 默认是 `DIGITS` 的前 `radix` 个字符."""
+        if not 2 <= radix <= 1 << 16:
+            raise ValueError('radix must be in [2, 65536]')
+        if alphabet is None and radix <= len(DIGITS):
+            alphabet = DIGITS[:radix]
+        if alphabet is not None and (len(alphabet) != radix or len(set(alphabet)) != radix):
+            raise ValueError('alphabet must contain radix distinct characters')
+        self.radix = radix
+        self.tweak = tweak
+        self.alphabet = alphabet
+        self.index: Dict[str, int] = {c: i for i, c in enumerate(alphabet or '')}
+        # 默认字母表可以用 `int` 和 `format` 转换
+        self.builtin = alphabet is not None and alphabet == DIGITS[:radix]
+        self.min_length = next(n for n in range(1, 64) if radix ** n >= self.MIN_DOMAIN)
+
+        # 密钥扩展只在这里进行一次; ECB 的 `update` 可以一直调用, 不需要 `finalize`
+        self.ecb = Cipher(algorithm=algorithms.AES(key), mode=modes.ECB(), backend=default_backend()).encryptor()
+        self.prepare = lru_cache(maxsize=self.PREPARE_CACHE_SIZE)(self._prepare)
+
+    def _prepare(self, n: int, tweak: bytes) -> tuple:
+        """长度为 `n` 的数字串使用 `tweak` 时, 每轮都相同的参数.
+
+        返回 (u, v, b, d, state, tail), CBC-MAC 处理完 P 和 tweak 的完整分组后的状态为 `state`,
+        剩余的 `tail` 与每轮的 [i] || [NUM(B)]b 拼成最后的分组.
+        """
+        if n < self.min_length:
+            raise ValueError(f'length must be at least {self.min_length} for radix {self.radix}')
+        u, v, t = n // 2, n - n // 2, len(tweak)
+        # ceil(v * log2(radix)) 等于 radix^v - 1 的位数, 用整数计算避免浮点误差
+        b = -(-(self.radix ** v - 1).bit_length() // 8)
+        d = 4 * -(-b // 4) + 4
+        p = (
+            bytes([1, 2, 1]) + self.radix.to_bytes(3, 'big') + bytes([10, u % 256])
+            + n.to_bytes(4, 'big') + t.to_bytes(4, 'big')
+        )
+        state = self.ecb.update(p)
+        prefix = tweak + bytes((-t - b - 1) % 16)
+        full = len(prefix) // 16 * 16
+        for i in range(0, full, 16):
+            state = self.ecb.update(bulk_xor(state, prefix[i: i + 16]))
+        return u, v, b, d, state, prefix[full:]
+
+    def round_values(self, prepared: tuple, i: int, values: Sequence[int]) -> List[int]:
+        """第 `i` 轮对每个 `values` 计算 y = NUM(S)."""
+        u, v, b, d, state, tail = prepared
+        count = len(values)
+        head = tail + bytes([i])
+        size = len(head) + b
+        data = b''.join([head + value.to_bytes(b, 'big') for value in values])
+        states = state * count
+        for offset in range(0, size, 16):
+            blocks = data if size == 16 else b''.join(
+                data[k * size + offset: k * size + offset + 16] for k in range(count)
+            )
+            states = self.ecb.update(bulk_xor(states, blocks))
+        if d <= 16:
+            return [int.from_bytes(states[k * 16: k * 16 + d], 'big') for k in range(count)]
+
+        # S = R || CIPH(R ^ [1]16) || CIPH(R ^ [2]16) || ...
+        extra = [self.ecb.update(bulk_xor(states, j.to_bytes(16, 'big') * count)) for j in range(1, -(-d // 16))]
+        return [
+            int.from_bytes(b''.join(part[k * 16: k * 16 + 16] for part in (states, *extra))[:d], 'big')
+            for k in range(count)
+        ]
+
+    def encrypt_pairs(self, a: List[int], b: List[int], n: int, tweak: bytes) -> Tuple[List[int], List[int]]:
+        """批量加密长度为 `n` 的数字串, 左右两半分别是 NUM(A) 和 NUM(B)."""
+        prepared = self.prepare(n, tweak)
+        moduli = self.radix ** prepared[0], self.radix ** prepared[1]
+        for i in range(self.ROUNDS):
+            m = moduli[i % 2]
+            ys = self.round_values(prepared, i, b)
+            a, b = b, [(x + y) % m for x, y in zip(a, ys)]
+        return a, b
+
+    def decrypt_pairs(self, a: List[int], b: List[int], n: int, tweak: bytes) -> Tuple[List[int], List[int]]:
+        prepared = self.prepare(n, tweak)
+        moduli = self.radix ** prepared[0], self.radix ** prepared[1]
+        for i in reversed(range(self.ROUNDS)):
+            m = moduli[i % 2]
+            ys = self.round_values(prepared, i, a)
+            a, b = [(x - y) % m for x, y in zip(b, ys)], a
+        return a, b
+
+    def to_int(self, text: str) -> int:
+        # 默认字母表只用小写字母, `int` 却也接受大写字母
+        lowercase = self.radix <= 10 or text.islower() or text.isdigit()
+        if self.builtin and text.isascii() and text.isalnum() and lowercase:
+            return int(text, self.radix)
+        try:
+            digits = [self.index[c] for c in text]
+        except KeyError:
+            raise ValueError(f'invalid character for alphabet {self.alphabet!r}') from None
+        return self.from_numerals(digits)
+
+    def to_text(self, value: int, length: int) -> str:
+        spec = self.FORMAT_SPECS.get(self.radix) if self.builtin else None
+        if spec is not None:
+            return format(value, f'0{length}{spec}')
+        return ''.join(self.alphabet[digit] for digit in self.to_numerals(value, length))
+
+    def from_numerals(self, numerals: Sequence[int]) -> int:
+        value = 0
+        for digit in numerals:
+            if not 0 <= digit < self.radix:
+                raise ValueError('numeral out of range')
+            value = value * self.radix + digit
+        return value
+
+    def to_numerals(self, value: int, length: int) -> List[int]:
+        digits = [0] * length
+        for i in reversed(range(length)):
+            value, digits[i] = divmod(value, self.radix)
+        return digits
+
+    def _texts(self, texts: Sequence[str], tweak: Optional[bytes], encrypt: bool) -> List[str]:
+        tweak = self.tweak if tweak is None else tweak
+        func = self.encrypt_pairs if encrypt else self.decrypt_pairs
+        # 同样长度的值一起处理
+        groups: Dict[int, List[int]] = {}
+        for i, text in enumerate(texts):
+            groups.setdefault(len(text), []).append(i)
+        res = [''] * len(texts)
+        for n, indexes in groups.items():
+            u = n // 2
+            a = [self.to_int(texts[i][:u]) for i in indexes]
+            b = [self.to_int(texts[i][u:]) for i in indexes]
+            a, b = func(a, b, n, tweak)
+            for i, x, y in zip(indexes, a, b):
+                res[i] = self.to_text(x, u) + self.to_text(y, n - u)
+        return res
+
+    def encrypt(self, text: str, tweak: Optional[bytes] = None) -> str:
+        """加密由 `alphabet` 中的字符组成的字符串, `tweak` 默认使用实例的 tweak."""
+        return self._texts([text], tweak, True)[0]
+
+    def decrypt(self, text: str, tweak: Optional[bytes] = None) -> str:
+        return self._texts([text], tweak, False)[0]
+
+    def encrypt_many(self, texts: Sequence[str], tweak: Optional[bytes] = None) -> List[str]:
+        """批量加密, 结果与逐个调用 `encrypt` 相同, 长度可以不同."""
+        return self._texts(texts, tweak, True)
+
+    def decrypt_many(self, texts: Sequence[str], tweak: Optional[bytes] = None) -> List[str]:
+        return self._texts(texts, tweak, False)
+
+    def encrypt_numerals(self, numerals: Sequence[int], tweak: Optional[bytes] = None) -> List[int]:
+        """加密数字序列, 每个数字在 [0, radix) 中, 适用于没有字母表的大基数."""
+        return self._numerals(numerals, tweak, True)
+
+    def decrypt_numerals(self, numerals: Sequence[int], tweak: Optional[bytes] = None) -> List[int]:
+        return self._numerals(numerals, tweak, False)
+
+    def _numerals(self, numerals: Sequence[int], tweak: Optional[bytes], encrypt: bool) -> List[int]:
+        tweak = self.tweak if tweak is None else tweak
+        n, u = len(numerals), len(numerals) // 2
+        func = self.encrypt_pairs if encrypt else self.decrypt_pairs
+        (a,), (b,) = func([self.from_numerals(numerals[:u])], [self.from_numerals(numerals[u:])], n, tweak)
+        return self.to_numerals(a, u) + self.to_numerals(b, n - u)
+
+    def domain_length(self, domain: int) -> int:
+        """循环行走使用的数字串长度: radix^n >= `domain` 的最小 n."""
+        if domain < self.MIN_DOMAIN:
+            raise ValueError(f'domain must be at least {self.MIN_DOMAIN}')
+        n = self.min_length
+        while self.radix ** n < domain:
+            n += 1
+        return n
+
+    def encrypt_ints(self, values: Sequence[int], domain: int, tweak: Optional[bytes] = None) -> List[int]:
+        """用循环行走批量加密 [0, `domain`) 中的整数, 结果也在 [0, `domain`) 中."""
+        return self._ints(values, domain, tweak, True)
+
+    def decrypt_ints(self, values: Sequence[int], domain: int, tweak: Optional[bytes] = None) -> List[int]:
+        return self._ints(values, domain, tweak, False)
+
+    def encrypt_int(self, value: int, domain: int, tweak: Optional[bytes] = None) -> int:
+        return self._ints([value], domain, tweak, True)[0]
+
+    def decrypt_int(self, value: int, domain: int, tweak: Optional[bytes] = None) -> int:
+        return self._ints([value], domain, tweak, False)[0]
+
+    def _ints(self, values: Sequence[int], domain: int, tweak: Optional[bytes], encrypt: bool) -> List[int]:
+        tweak = self.tweak if tweak is None else tweak
+        n = self.domain_length(domain)
+        modulus = self.radix ** (n - n // 2)
+        func = self.encrypt_pairs if encrypt else self.decrypt_pairs
+        res = list(values)
+        if any(not 0 <= value < domain for value in res):
+            raise ValueError('value out of domain')
+        # 每次只处理还没有落在定义域中的值, 平均 radix^n / domain 轮
+        pending = list(range(len(res)))
+        while pending:
+            a, b = func([res[i] // modulus for i in pending], [res[i] % modulus for i in pending], n, tweak)
+            for i, x, y in zip(pending, a, b):
+                res[i] = x * modulus + y
+            pending = [i for i in pending if res[i] >= domain]
+        return res
+
+
 class TripleDES:
-    """三重 DES."""
+    """三重 DES.
+
+    默认按 DES 的分组长度 (8 字节) 做 PKCS7 填充.
+    """
 
     BLOCK_SIZE = 8  # algorithms.TripleDES.block_size / 8
+    PADDING = PKCS7(BLOCK_SIZE)
 
-    def __init__(self, key: bytes, iv: bytes):
-        self.cipher = Cipher(
-            algorithm=algorithms.TripleDES(key),
-            mode=modes.CBC(iv),
-            backend=default_backend(),
-        )
-        self.padding = padding.PKCS7(algorithms.AES.block_size)
+    def __init__(self, key: bytes, iv: bytes, padding: Padding = PADDING):
+        """`padding`: 填充方式, `block_size` 必须是 `BLOCK_SIZE` 的倍数."""
+        if padding.block_size % self.BLOCK_SIZE != 0:
+            raise ValueError
+        self.mode = modes.CBC(iv)
+        self.algorithm = algorithms.TripleDES(key)
+        self.cipher = Cipher(algorithm=self.algorithm, mode=self.mode, backend=default_backend())
+        self.padding = padding
 
     def encrypt(self, msg: bytes) -> bytes:
         encryptor = self.cipher.encryptor()
-        padder = self.padding.padder()
-        msg = padder.update(msg) + padder.finalize()
-        return encryptor.update(msg) + encryptor.finalize()
+        msg = self.padding.pad_into(bytearray(msg))
+        # 填充后长度是分组长度的倍数, `finalize` 没有输出
+        res = encryptor.update(msg)
+        encryptor.finalize()
+        return res
 
     def decrypt(self, msg: bytes) -> bytes:
         decryptor = self.cipher.decryptor()
-        unpadder = self.padding.unpadder()
-        msg = decryptor.update(msg) + decryptor.finalize()
-        return unpadder.update(msg) + unpadder.finalize()
+        msg = decryptor.update(msg)
+        decryptor.finalize()
+        return msg[:len(msg) - self.padding.unpad_size(msg)]
+
+    def encrypt_many(self, records: Iterable[Buffer], ivs: Sequence[bytes]) -> List[memoryview]:
+        """批量加密互相独立的消息, 每条消息的结果与用对应 iv 单独调用 `encrypt` 相同.
+
+        每条消息填充后拼接到同一个 buffer, 一次分配输出 buffer, 返回指向它的 `memoryview`.
+        `ivs`: 每条消息的 iv, 必须提供. CBC 模式下多条消息使用同一个 iv 会泄露相同的前缀.
+        """
+        records = list(records)
+        pad_sizes = [self.padding.pad_size(len(record)) for record in records]
+        packed = b''.join(chain.from_iterable(
+            (record, self.padding.pad_bytes(pad_size)) for record, pad_size in zip(records, pad_sizes)
+        ))
+        offsets = list(accumulate([0] + [len(record) + pad_size for record, pad_size in zip(records, pad_sizes)]))
+        view = batch_apply(self.cipher, packed, offsets, True, self.mode_list(ivs, len(records)))
+        return [view[start:end] for start, end in zip(offsets, offsets[1:])]
+
+    def decrypt_many(self, records: Iterable[Buffer], ivs: Sequence[bytes]) -> List[memoryview]:
+        packed, offsets = pack(records)
+        view = batch_apply(self.cipher, packed, offsets, False, self.mode_list(ivs, len(offsets) - 1))
+        records = (view[start:end] for start, end in zip(offsets, offsets[1:]))
+        return [record[:len(record) - self.padding.unpad_size(record)] for record in records]
+
+    def mode_list(self, ivs: Sequence[bytes], count: int) -> list:
+        if ivs is None:
+            raise ValueError('CBC mode requires a distinct iv for each record')
+        if len(ivs) != count:
+            raise ValueError('ivs and records length mismatch')
+        return [modes.CBC(iv) for iv in ivs]
 
     @classmethod
     def generate_key(cls) -> Tuple[bytes, bytes]:
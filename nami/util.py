@@ -1,5 +1,6 @@
 __all__ = (
     'Binary',
+    'bulk_xor',
     'fill_seq',
     'seq_grouper',
     'strip_seq',
@@ -8,7 +9,19 @@ __all__ = (
 import math
 from typing import Any, Iterable, Optional, Union
 
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
 Seq = Union[str, bytes, list, tuple]
+# 支持 buffer protocol 的对象, 例如 bytes, bytearray, memoryview, mmap
+Buffer = Union[bytes, bytearray, memoryview]
+
+# 小于此长度时大整数 XOR 更快, 否则用 NumPy (如果安装了)
+NUMPY_XOR_THRESHOLD = 512
+# 大整数 XOR 每次处理的字节数, 避免一次性把整个序列转成大整数
+INT_XOR_WINDOW = 1 << 20
 
 
 class Binary:
@@ -30,9 +43,10 @@ class Binary:
         return ''.join(cls.xor_map[item] for item in zip(s1, s2))
 
     @classmethod
-    def bytes_xor(cls, b1: bytes, b2: bytes) -> bytes:
-        """XOR 两个字节序列."""
-        return bytes(item1 ^ item2 for item1, item2 in zip(b1, b2))
+    def bytes_xor(cls, b1: Buffer, b2: Buffer,
+                  out: Optional[Buffer] = None, strict: bool = False) -> Buffer:
+        """XOR 两个字节序列, 参数含义见 `bulk_xor`."""
+        return bulk_xor(b1, b2, out=out, strict=strict)
 
     @classmethod
     def str_2_bytes(cls, s: str) -> bytes:
@@ -64,6 +78,56 @@ class Binary:
         return int(s, 2)
 
 
+def bulk_xor(b1: Buffer, b2: Buffer,
+             out: Optional[Buffer] = None, strict: bool = False) -> Buffer:
+    """XOR 两个字节序列.
+
+    `b1`, `b2`: 任意支持 buffer protocol 的对象, 不会拷贝.
+    `out`: 如果传入可写的 buffer (例如 `bytearray`, 可写的 `mmap`), 则结果直接写入
+           `out` 的开头并返回 `out`, 否则返回新的 `bytes`.
+    `strict`: 长度不同时是否报错, 默认与 `zip` 一样按短的截断.
+
+    短序列转为大整数 XOR, 长序列用 NumPy 按字节 XOR.
+    """
+    v1 = memoryview(b1).cast('B')
+    v2 = memoryview(b2).cast('B')
+    if len(v1) != len(v2):
+        if strict:
+            raise ValueError('length mismatch')
+        size = min(len(v1), len(v2))
+        v1, v2 = v1[:size], v2[:size]
+    size = len(v1)
+
+    if out is None:
+        if size <= INT_XOR_WINDOW and (np is None or size < NUMPY_XOR_THRESHOLD):
+            return _int_xor(v1, v2)
+        if np is not None:
+            return np.bitwise_xor(np.frombuffer(v1, np.uint8), np.frombuffer(v2, np.uint8)).tobytes()
+        res = bytearray(size)
+        bulk_xor(v1, v2, out=res)
+        return bytes(res)
+
+    view = memoryview(out).cast('B')
+    if len(view) < size:
+        raise ValueError('out is too small')
+    if np is not None and size >= NUMPY_XOR_THRESHOLD:
+        np.bitwise_xor(
+            np.frombuffer(v1, np.uint8),
+            np.frombuffer(v2, np.uint8),
+            out=np.frombuffer(view, np.uint8)[:size],
+        )
+    else:
+        for start in range(0, size, INT_XOR_WINDOW):
+            end = min(start + INT_XOR_WINDOW, size)
+            view[start:end] = _int_xor(v1[start:end], v2[start:end])
+    return out
+
+
+def _int_xor(v1: memoryview, v2: memoryview) -> bytes:
+    value = int.from_bytes(v1, 'big') ^ int.from_bytes(v2, 'big')
+    return value.to_bytes(len(v1), 'big')
+
+
 def fill_seq(seq: Seq, size: int, filler: Any) -> Seq:
     """用 `filler` 填充序列使其内被 `size` 整除.
 
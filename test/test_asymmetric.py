@@ -1,4 +1,15 @@
-from nami.asymmetric import Mod12, KeyCenter
+import asyncio
+import math
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from nami.asymmetric import (
+    RSA, KeyDistributionCenter, KeyStore, MemoryKeyStore, MmapKeyStore, ModArray, ModN, Mod12, KeyCenter, Session,
+    SessionCache, SQLiteKeyStore, egcd, generate_prime, generate_rsa_key, generate_rsa_keys, is_probable_prime,
+    mod_inverse, small_primes, unwrap_session_key,
+)
 
 
 def test_KeyCenter():
@@ -21,6 +32,147 @@ def test_KeyCenter():
     assert KeyCenter.decrypt(bob_key, to_bob_key) == session_key
 
 
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture(params=('memory', 'sqlite', 'mmap'))
+def key_store(request, tmp_path):
+    if request.param == 'memory':
+        store = MemoryKeyStore()
+    elif request.param == 'sqlite':
+        store = SQLiteKeyStore(tmp_path / 'keys.db')
+    else:
+        store = MmapKeyStore(tmp_path / 'keys.bin', capacity=4)
+    with store:
+        yield store
+
+
+def test_key_store(key_store):
+    store = key_store
+    assert len(store) == 0 and store.get('alice') is None
+    store.put('alice', b'\x01' * 16)
+    store.put_many((f'user{i}', bytes([i]) * 32) for i in range(100))
+    assert len(store) == 101 and 'alice' in store
+    assert store.get('alice') == b'\x01' * 16
+    assert store.get('user7') == bytes([7]) * 32
+
+    store.put('alice', b'\x02' * 32)
+    assert store.get('alice') == b'\x02' * 32 and len(store) == 101
+    assert store.get_many(['alice', 'user3', 'nobody']) == {'alice': b'\x02' * 32, 'user3': bytes([3]) * 32}
+
+    assert store.delete('user7') and not store.delete('user7')
+    assert store.get('user7') is None and len(store) == 100
+    store.put('中文名', b'\x03' * 24)
+    assert store.get('中文名') == b'\x03' * 24
+
+
+@pytest.mark.parametrize('store_cls, name', ((SQLiteKeyStore, 'keys.db'), (MmapKeyStore, 'keys.bin')))
+def test_key_store_persistent(tmp_path, store_cls, name):
+    path = tmp_path / name
+    with store_cls(path) as store:
+        store.put_many((f'user{i}', i.to_bytes(16, 'big')) for i in range(2000))
+        store.delete('user5')
+    with store_cls(path) as store:
+        assert len(store) == 1999 and store.get('user5') is None
+        assert store.get('user1999') == (1999).to_bytes(16, 'big')
+        # 删除的记录被复用
+        store.put('user5', b'\xff' * 16)
+        assert store.get('user5') == b'\xff' * 16
+
+
+def test_mmap_key_store_limits(tmp_path):
+    with MmapKeyStore(tmp_path / 'keys.bin') as store:
+        with pytest.raises(ValueError):
+            store.put('x' * 65, bytes(16))
+        with pytest.raises(ValueError):
+            store.put('alice', bytes(65))
+    (tmp_path / 'other').write_bytes(b'not a key store')
+    with pytest.raises(ValueError):
+        MmapKeyStore(tmp_path / 'other')
+
+
+def test_abstract_key_store():
+    class Incomplete(KeyStore):
+        def get(self, name):
+            return None
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_session_cache():
+    clock = FakeClock()
+    cache = SessionCache(maxsize=3, ttl=10, clock=clock)
+    sessions = [Session(bytes([i]), b'key', 'a', 'b', cache.expires()) for i in range(4)]
+    cache.put_many(sessions[:3])
+    # 访问过的会话不会被淘汰
+    assert cache.get(b'\x00') == sessions[0]
+    cache.put(sessions[3])
+    assert len(cache) == 3 and cache.get(b'\x01') is None and cache.evictions == 1
+
+    clock.now = 10
+    assert cache.get(b'\x00') is None and cache.expirations == 1
+    assert cache.purge() == 2 and len(cache) == 0
+
+
+def test_key_distribution_center(key_store):
+    clock = FakeClock()
+    kdc = KeyDistributionCenter(key_store, ttl=60, clock=clock)
+    keys = kdc.register_many(f'user{i}' for i in range(50))
+    keys['alice'] = kdc.register('alice', b'\x01' * 16)
+
+    pairs = [('alice', f'user{i}') for i in range(50)] + [('user1', 'user2')]
+    grants = kdc.issue_sessions(pairs)
+    assert len(grants) == len(pairs) == kdc.issued
+    assert len({grant.session.key for grant in grants}) == len(pairs)
+    for (a, b), (session, to_a, to_b) in zip(pairs, grants):
+        assert (session.a, session.b) == (a, b) and len(session.key) == 32
+        assert unwrap_session_key(keys[a], to_a, session.id, a, b) == session.key
+        assert unwrap_session_key(keys[b], to_b, session.id, a, b) == session.key
+        assert kdc.session(session.id) == session
+
+    session, to_a, _ = grants[0]
+    # 会话编号和名字被绑定到封装结果中
+    with pytest.raises(ValueError):
+        unwrap_session_key(keys['alice'], to_a, session.id, 'alice', 'user1')
+    with pytest.raises(ValueError):
+        unwrap_session_key(keys['user0'], to_a, session.id, 'alice', 'user0')
+
+    with pytest.raises(KeyError):
+        kdc.issue_sessions([('alice', 'user0'), ('alice', 'mallory')])
+    assert kdc.issued == len(pairs)
+
+    assert kdc.revoke(session.id) and kdc.session(session.id) is None
+    clock.now = 60
+    assert kdc.session(grants[1].session.id) is None
+
+
+def test_key_distribution_center_concurrent():
+    kdc = KeyDistributionCenter()
+    keys = kdc.register_many(f'user{i}' for i in range(100))
+
+    def issue(i):
+        return kdc.issue_sessions((f'user{i}', f'user{(i + j) % 100}') for j in range(1, 51))
+
+    with ThreadPoolExecutor(8) as executor:
+        batches = list(executor.map(issue, range(100)))
+    assert kdc.issued == len(kdc.sessions) == 5000
+
+    async def issue_async():
+        return await asyncio.gather(*(kdc.issue_session_async('user0', f'user{i}') for i in range(1, 100)))
+
+    grants = [grant for batch in batches for grant in batch] + asyncio.run(issue_async())
+    assert len({grant.session.id for grant in grants}) == len(grants)
+    for session, to_a, to_b in grants[::97]:
+        assert unwrap_session_key(keys[session.b], to_b, session.id, session.a, session.b) == session.key
+
+
 class TestMod12:
 
     def test_add(self):
@@ -97,3 +249,187 @@ class TestMod12:
         assert x ** Mod12(9) == Mod12(7)
         assert x ** Mod12(10) == Mod12(1)
         assert x ** Mod12(11) == Mod12(7)
+
+
+class TestModN:
+
+    @pytest.mark.parametrize('n', (1, 12, 97, 2 ** 16, 2 ** 16 + 1, 2 ** 127 - 1))
+    def test_arithmetic(self, n):
+        for a, b in ((5, 7), (n - 1, n - 2), (0, 3), (2 ** 70, -3)):
+            x, y = ModN(a, n), ModN(b, n)
+            assert (x + y).v == (a + b) % n
+            assert (x - y).v == (a - b) % n
+            assert (a - y).v == (a - b) % n
+            assert (-x).v == -a % n
+            assert (x * y).v == (a * b) % n
+            assert (x * b) == (b * x) == x * y
+            assert (x ** 65537).v == pow(a, 65537, n)
+        assert ModN(3, n) ** 0 == ModN(1, n)
+
+    @pytest.mark.parametrize('n', (12, 97, 2 ** 16, 2 ** 16 + 1, 10 ** 9 + 7, 2 ** 127 - 1))
+    def test_inverse(self, n):
+        for a in range(1, min(n, 200)):
+            x = ModN(a, n)
+            if math.gcd(a, n) != 1:
+                with pytest.raises(ValueError):
+                    x.inverse()
+                continue
+            assert (x * x.inverse()).v == 1
+            assert x.inverse().v == mod_inverse(a, n) == pow(a, -1, n)
+            assert (ModN(1, n) / x) == x.inverse() == x ** -1
+            assert (7 / x) * x == ModN(7, n)
+
+    def test_moduli_mismatch(self):
+        with pytest.raises(ValueError):
+            ModN(1, 12) + ModN(1, 13)
+        with pytest.raises(ValueError):
+            ModN(1, 0)
+        with pytest.raises(TypeError):
+            ModN(1, 12) + 1.0
+
+    def test_eq_hash(self):
+        assert ModN(1, 12) == ModN(13, 12) and hash(ModN(1, 12)) == hash(ModN(13, 12))
+        assert ModN(1, 12) != ModN(1, 13)
+        # 不与 int 相等, 与 int 混合作为字典的键时不会违反散列的约定
+        assert ModN(1, 12) != 1 and ModN(1, 12) != 13
+        assert len({ModN(1, 12), 1, 13}) == 3
+
+    def test_egcd(self):
+        for a, b in ((240, 46), (46, 240), (17, 0), (0, 17), (2 ** 100, 3 ** 50)):
+            g, x, y = egcd(a, b)
+            assert g == math.gcd(a, b) and a * x + b * y == g
+
+
+class TestModArray:
+
+    @pytest.fixture(autouse=True)
+    def numpy(self):
+        return pytest.importorskip('numpy')
+
+    @pytest.mark.parametrize('n', (12, 2 ** 16 + 1, 10 ** 9 + 7, 2 ** 32 - 5))
+    def test_arithmetic(self, numpy, n):
+        rng = numpy.random.default_rng(0)
+        a = rng.integers(0, n, 1000, dtype=numpy.uint64)
+        b = rng.integers(0, n, 1000, dtype=numpy.uint64)
+        x, y = ModArray(a, n), ModArray(b, n)
+        pairs = list(zip(a.tolist(), b.tolist()))
+        assert (x + y).tolist() == [(i + j) % n for i, j in pairs]
+        assert (x - y).tolist() == [(i - j) % n for i, j in pairs]
+        assert (5 - x).tolist() == [(5 - i) % n for i, _ in pairs]
+        assert (-x).tolist() == [-i % n for i, _ in pairs]
+        assert (x * y).tolist() == [i * j % n for i, j in pairs]
+        assert (x * 3).tolist() == [i * 3 % n for i, _ in pairs]
+        assert (x ** 65537).tolist() == [pow(i, 65537, n) for i, _ in pairs]
+        exponents = rng.integers(0, 1000, 1000)
+        assert (x ** exponents).tolist() == [pow(i, int(e), n) for (i, _), e in zip(pairs, exponents)]
+        assert x[3] == ModN(int(a[3]), n) and x[:10] == ModArray(a[:10], n)
+
+    @pytest.mark.parametrize('n', (97, 2 ** 16 + 1, 10 ** 9 + 7, 2 ** 32 - 5))
+    def test_inverse(self, numpy, n):
+        x = ModArray(numpy.arange(1, min(n, 1000)), n)
+        assert ((x * x.inverse()).values == 1).all()
+        assert (x / x) == ModArray(numpy.ones(len(x), numpy.uint64), n)
+        assert (ModArray([6, 4], 12) / 5).tolist() == [6, 8]
+        with pytest.raises(ValueError):
+            ModArray([1, 2, 3], 12).inverse()
+        with pytest.raises(ValueError):
+            ModArray([1, 0], n).inverse()
+
+    def test_signed(self, numpy):
+        assert ModArray([-1, 2 ** 70, 5], 7).tolist() == [6, 2 ** 70 % 7, 5]
+        assert ModArray(numpy.array([-3, 4]), 7).tolist() == [4, 4]
+        with pytest.raises(ValueError):
+            ModArray([1], 2 ** 33)
+        with pytest.raises(ValueError):
+            ModArray([1], 12) + ModArray([1], 13)
+
+
+def test_small_primes():
+    expected = [n for n in range(2, 3000) if all(n % d for d in range(2, math.isqrt(n) + 1))]
+    assert small_primes(3000) == expected
+    assert [n for n in range(3000) if is_probable_prime(n)] == expected
+
+
+@pytest.mark.parametrize('n, expected', (
+    # Carmichael 数和强伪素数
+    (561, False),
+    (41041, False),
+    (3215031751, False),
+    (3825123056546413051, False),
+    ((2 ** 61 - 1) * (2 ** 31 - 1), False),
+    (2 ** 61 - 1, True),
+    (2 ** 127 - 1, True),
+    (2 ** 521 - 1, True),
+))
+def test_is_probable_prime(n, expected):
+    assert is_probable_prime(n) is expected
+
+
+@pytest.mark.parametrize('bits', (16, 100, 512))
+def test_generate_prime(bits):
+    p = generate_prime(bits)
+    assert p.bit_length() == bits and p >> (bits - 2) == 0b11
+    assert is_probable_prime(p)
+
+
+@pytest.fixture(scope='module')
+def rsa_key():
+    return generate_rsa_key(1024)
+
+
+def test_rsa_key(rsa_key):
+    key = rsa_key
+    assert key.n.bit_length() == 1024 and key.n == key.p * key.q
+    assert key.e * key.d % math.lcm(key.p - 1, key.q - 1) == 1
+    assert key.qinv * key.q % key.p == 1
+
+
+def test_rsa_crt(rsa_key):
+    rsa = RSA(rsa_key)
+    for m in (0, 1, 2, rsa_key.p, rsa_key.n - 1, secrets.randbelow(rsa_key.n)):
+        c = rsa.encrypt_int(m)
+        assert rsa.decrypt_int(c) == rsa.decrypt_int(c, crt=False) == m
+    with pytest.raises(ValueError):
+        rsa.encrypt_int(rsa_key.n)
+    with pytest.raises(TypeError):
+        RSA(rsa_key.public_key).decrypt_int(1)
+
+
+def test_rsa_oaep(rsa_key):
+    rsa = RSA(rsa_key)
+    max_size = rsa_key.public_key.size - 2 * 32 - 2
+    for msg in (b'', b'hello', secrets.token_bytes(max_size)):
+        ciphertext = RSA(rsa_key.public_key).encrypt(msg, b'label')
+        assert len(ciphertext) == 128
+        assert rsa.decrypt(ciphertext, b'label') == rsa.decrypt(ciphertext, b'label', crt=False) == msg
+        with pytest.raises(ValueError):
+            rsa.decrypt(ciphertext)
+    with pytest.raises(ValueError):
+        rsa.encrypt(bytes(max_size + 1))
+
+    ciphertext = bytearray(rsa.encrypt(b'hello'))
+    ciphertext[-1] ^= 1
+    with pytest.raises(ValueError):
+        rsa.decrypt(bytes(ciphertext))
+
+
+def test_rsa_cryptography(rsa_key):
+    """与 `cryptography` 的 RSA-OAEP 互相加解密."""
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import padding, rsa as crypto_rsa
+
+    key = rsa_key
+    private_key = crypto_rsa.RSAPrivateNumbers(
+        key.p, key.q, key.d, key.dp, key.dq, key.qinv, crypto_rsa.RSAPublicNumbers(key.e, key.n),
+    ).private_key()
+    oaep = padding.OAEP(mgf=padding.MGF1(hashes.SHA256()), algorithm=hashes.SHA256(), label=b'label')
+
+    rsa = RSA(key)
+    assert private_key.decrypt(rsa.encrypt(b'hello', b'label'), oaep) == b'hello'
+    assert rsa.decrypt(private_key.public_key().encrypt(b'hello', oaep), b'label') == b'hello'
+
+
+def test_generate_rsa_keys():
+    keys = generate_rsa_keys(2, bits=512, workers=2)
+    assert len(keys) == 2 and keys[0].n != keys[1].n
+    assert all(key.n.bit_length() == 512 for key in keys)
@@ -1,7 +1,14 @@
 import base64
+import io
+import secrets
+
 import pytest
 
-from nami.base64_ import b64decode, b64encode
+from nami.base64_ import (
+    MIME, URL_SAFE_NO_PADDING, B64Decoder, B64Encoder, B64Variant,
+    b64decode, b64decode_stream, b64encode, b64encode_stream,
+    bin_str_b64decode, bin_str_b64encode, urlsafe_b64decode, urlsafe_b64encode,
+)
 
 
 @pytest.mark.parametrize('str_', (
@@ -22,3 +29,106 @@ def test_base64(str_):
 
     b64 = base64.b64encode(bytes_)
     assert b64decode(b64) == base64.b64decode(b64)
+
+
+@pytest.mark.parametrize('length', range(0, 10))
+def test_base64_random(length):
+    bytes_ = secrets.token_bytes(length)
+    assert b64encode(bytes_) == base64.b64encode(bytes_)
+    assert b64decode(base64.b64encode(bytes_)) == bytes_
+    assert bin_str_b64encode(bytes_) == b64encode(bytes_)
+    assert bin_str_b64decode(b64encode(bytes_)) == bytes_
+
+
+@pytest.mark.parametrize('b64', (b'YW*j', b'Y', b'YWJjZ'))
+def test_base64_invalid(b64):
+    with pytest.raises(ValueError):
+        b64decode(b64)
+
+
+@pytest.mark.parametrize('chunk_size', (1, 2, 3, 4, 5, 7, 64))
+def test_base64_streaming(chunk_size):
+    bytes_ = secrets.token_bytes(100)
+    b64 = base64.b64encode(bytes_)
+
+    encoder = B64Encoder()
+    chunks = [encoder.update(bytes_[i: i + chunk_size]) for i in range(0, len(bytes_), chunk_size)]
+    assert b''.join(chunks) + encoder.finalize() == b64
+
+    decoder = B64Decoder()
+    chunks = [decoder.update(b64[i: i + chunk_size]) for i in range(0, len(b64), chunk_size)]
+    assert b''.join(chunks) + decoder.finalize() == bytes_
+
+
+def test_base64_stream():
+    bytes_ = secrets.token_bytes(1000)
+    encoded, decoded = io.BytesIO(), io.BytesIO()
+    b64encode_stream(io.BytesIO(bytes_), encoded, chunk_size=10)
+    assert encoded.getvalue() == base64.b64encode(bytes_)
+    b64decode_stream(io.BytesIO(encoded.getvalue()), decoded, chunk_size=10)
+    assert decoded.getvalue() == bytes_
+
+
+@pytest.mark.parametrize('length', (0, 1, 2, 3, 56, 57, 58, 200))
+def test_base64_variants(length):
+    bytes_ = secrets.token_bytes(length)
+
+    b64 = base64.urlsafe_b64encode(bytes_)
+    assert urlsafe_b64encode(bytes_) == b64
+    assert urlsafe_b64decode(b64) == bytes_
+
+    b64 = b64.rstrip(b'=')
+    assert URL_SAFE_NO_PADDING.encode(bytes_) == b64
+    assert URL_SAFE_NO_PADDING.decode(b64) == bytes_
+
+    b64 = base64.encodebytes(bytes_).replace(b'\n', b'\r\n').rstrip(b'\r\n')
+    assert MIME.encode(bytes_) == b64
+    assert MIME.decode(b64) == bytes_
+
+    encoder = MIME.encoder()
+    chunks = [encoder.update(bytes_[i: i + 5]) for i in range(0, len(bytes_), 5)]
+    assert b''.join(chunks) + encoder.finalize() == b64
+    decoder = MIME.decoder()
+    chunks = [decoder.update(b64[i: i + 5]) for i in range(0, len(b64), 5)]
+    assert b''.join(chunks) + decoder.finalize() == bytes_
+
+
+def test_base64_custom_chars():
+    chars = ''.join(reversed(B64Variant().chars))
+    variant = B64Variant(chars)
+    bytes_ = secrets.token_bytes(100)
+    assert variant.decode(variant.encode(bytes_)) == bytes_
+
+    with pytest.raises(ValueError):
+        B64Variant(chars[:-1] + '=')
+    with pytest.raises(ValueError):
+        B64Variant(chars[:-1] + chars[0])
+
+
+@pytest.mark.parametrize('variant, b64', (
+    (B64Variant(), b'YW Jj'),
+    (B64Variant(strict_padding=True), b'YWJ'),
+    (B64Variant(strict_padding=True), b'YQ='),
+    (B64Variant(), b'YQ==YQ=='),
+    (B64Variant(URL_SAFE_NO_PADDING.chars, padding=False, strict_padding=True), b'YQ=='),
+    (URL_SAFE_NO_PADDING, b'YW+j'),
+))
+def test_base64_strict(variant, b64):
+    with pytest.raises(ValueError):
+        variant.decode(b64)
+
+
+@pytest.mark.parametrize('b64, expect', ((b'YQ', b'a'), (b'YWI', b'ab'), (b'YQ=', b'a'), (b'YWJj', b'abc')))
+def test_base64_missing_padding(b64, expect):
+    """默认与最初的 `b64decode` 一样, 允许省略末尾的 '='."""
+    assert b64decode(b64) == expect
+    assert urlsafe_b64decode(b64) == expect
+    assert URL_SAFE_NO_PADDING.decode(b64) == expect
+    decoder = B64Decoder()
+    assert decoder.update(b64) + decoder.finalize() == expect
+
+
+def test_base64_not_strict():
+    variant = B64Variant(strict=False)
+    assert variant.decode(b'Y W\nJj\r\nZA') == b'abcd'
+    assert variant.decode(b'YQ') == b'a'
@@ -1,3 +1,4 @@
+import io
 import secrets
 
 import pytest
@@ -106,3 +107,91 @@ class TestAESMode:
         res2 = Binary.bytes_xor(cipher1, cipher2)
         res3 = Binary.bytes_xor(cipher2, cipher3)
         assert res1 == res2 == res3 == mid1
+
+    @pytest.mark.parametrize('mode_name', ('ECB', 'CBC', 'CTR'))
+    @pytest.mark.parametrize('chunk_size', (AES.BLOCK_SIZE, 100, 1 << 20))
+    def test_streaming(self, tmp_path, key, iv, mode_name, chunk_size):
+        mode = modes.ECB() if mode_name == 'ECB' else getattr(modes, mode_name)(iv)
+        aes = AES(mode, key)
+        msg = secrets.token_bytes(AES.BLOCK_SIZE * 100)
+        ciphertext = aes.encrypt(msg)
+
+        # 复用同一个输出 buffer
+        stream = aes.encryptor()
+        out = bytearray(chunk_size + AES.BLOCK_SIZE - 1)
+        res = b''
+        for i in range(0, len(msg), chunk_size):
+            size = stream.update_into(msg[i: i + chunk_size], out)
+            res += out[:size]
+        assert res + stream.finalize() == ciphertext
+
+        # 迭代器复用输出 buffer, 因此需要拷贝
+        chunks = aes.iter_encrypt(io.BytesIO(msg), chunk_size)
+        assert b''.join(bytes(chunk) for chunk in chunks) == ciphertext
+        chunks = aes.iter_decrypt(io.BytesIO(ciphertext), chunk_size)
+        assert b''.join(bytes(chunk) for chunk in chunks) == msg
+
+        src, dst, res = (tmp_path / name for name in ('src', 'dst', 'res'))
+        src.write_bytes(msg)
+        aes.encrypt_file(src, dst, chunk_size)
+        assert dst.read_bytes() == ciphertext
+        aes.decrypt_file(dst, res, chunk_size)
+        assert res.read_bytes() == msg
+
+    @pytest.mark.parametrize('mode_name', ('ECB', 'CTR'))
+    @pytest.mark.parametrize('size', (0, AES.BLOCK_SIZE, AES.BLOCK_SIZE * 100))
+    @pytest.mark.parametrize('segment_size', (1, AES.BLOCK_SIZE * 3, 1 << 20))
+    def test_parallel(self, tmp_path, key, mode_name, size, segment_size):
+        # 计数器从最大值开始, 验证分段后的计数器会正确溢出
+        mode = modes.ECB() if mode_name == 'ECB' else modes.CTR(b'\xff' * AES.BLOCK_SIZE)
+        aes = AES(mode, key)
+        msg = secrets.token_bytes(size + (5 if mode_name == 'CTR' else 0))
+        ciphertext = aes.encrypt(msg)
+
+        assert aes.parallel_encrypt(msg, workers=4, segment_size=segment_size) == ciphertext
+        assert aes.parallel_decrypt(ciphertext, workers=4, segment_size=segment_size) == msg
+        out = bytearray(len(msg) + AES.BLOCK_SIZE)
+        assert aes.parallel_encrypt(msg, out=out, segment_size=segment_size) is out
+        assert out[:len(msg)] == ciphertext
+
+        src, dst, res = (tmp_path / name for name in ('src', 'dst', 'res'))
+        src.write_bytes(msg)
+        aes.parallel_encrypt_file(src, dst, workers=4, segment_size=segment_size)
+        assert dst.read_bytes() == ciphertext
+        aes.parallel_decrypt_file(dst, res, workers=4, segment_size=segment_size)
+        assert res.read_bytes() == msg
+
+    def test_parallel_unsupported_mode(self, key, iv):
+        with pytest.raises(ValueError):
+            AES(modes.CBC(iv), key).parallel_encrypt(b'1' * AES.BLOCK_SIZE)
+
+    @pytest.mark.parametrize('mode_name', ('ECB', 'CBC', 'CTR'))
+    def test_many(self, key, mode_name):
+        def create_mode(iv):
+            return modes.ECB() if mode_name == 'ECB' else getattr(modes, mode_name)(iv)
+
+        sizes = (0, 1, 15, 16, 33, 160) if mode_name == 'CTR' else (0, 16, 32, 160)
+        records = [secrets.token_bytes(size) for size in sizes]
+        ivs = [secrets.token_bytes(AES.BLOCK_SIZE) for _ in records]
+        aes = AES(create_mode(ivs[0]), key)
+
+        if mode_name == 'ECB':
+            ciphertexts = aes.encrypt_many(records)
+            assert all(isinstance(item, memoryview) for item in ciphertexts)
+            assert [bytes(item) for item in ciphertexts] == [aes.encrypt(record) for record in records]
+            assert aes.decrypt_many(ciphertexts) == records
+            with pytest.raises(ValueError):
+                aes.encrypt_many(records, ivs)
+        else:
+            # 不提供 iv 时所有消息会复用同一个 iv / nonce, 必须报错
+            with pytest.raises(ValueError):
+                aes.encrypt_many(records)
+            with pytest.raises(ValueError):
+                aes.decrypt_many(records)
+            ciphertexts = aes.encrypt_many(records, ivs)
+            assert all(isinstance(item, memoryview) for item in ciphertexts)
+            expect = [AES(create_mode(iv), key).encrypt(record) for iv, record in zip(ivs, records)]
+            assert ciphertexts == expect
+            assert aes.decrypt_many(ciphertexts, ivs) == records
+            with pytest.raises(ValueError):
+                aes.encrypt_many(records, ivs[1:])
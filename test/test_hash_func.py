@@ -1,6 +1,220 @@
-from nami.hash_func import BirthdayParadox
+import hashlib
+import itertools
+import math
+import os
+import secrets
+
+import pytest
+
+from nami import hash_func
+from nami.hash_func import (
+    BirthdayParadox, DigestCache, IntHashSet, counter_keys, default_max_keys, first_collision, hash_file,
+    hash_tree, merkle_hash_file, merkle_root, simulate_collisions,
+)
 
 
 def test_birthday_paradox():
     assert BirthdayParadox.least_number_365(p=0.5) == 23
     assert f'{BirthdayParadox.probability_365(n=23):.1f}' == '0.5'
+
+
+@pytest.mark.parametrize('y, n', (
+    (365, 23), (365, 365), (10 ** 6, 1000), (10 ** 6, 1001), (10 ** 6, 10 ** 5),
+    (2 ** 30, 10 ** 6), (10 ** 7, 10 ** 7 - 5),
+))
+def test_birthday_paradox_log_not_same(y, n):
+    expected = math.fsum(math.log1p(-k / y) for k in range(n))
+    assert math.isclose(BirthdayParadox.log_not_same(y, n), expected, rel_tol=1e-12)
+
+
+def test_birthday_paradox_large():
+    assert BirthdayParadox.probability(10, 11) == 1
+    assert BirthdayParadox.least_number(365, 1) is None
+    # n ≈ sqrt(2 * ln(2) * y)
+    n = BirthdayParadox.least_number(2 ** 64, 0.5)
+    assert abs(n - math.sqrt(2 * math.log(2) * 2 ** 64)) < 2
+    assert BirthdayParadox.probability(2 ** 64, n - 1) < 0.5 <= BirthdayParadox.probability(2 ** 64, n)
+    assert math.isclose(BirthdayParadox.probability(2 ** 128, 2 ** 40), 2 ** -49, rel_tol=1e-6)
+
+
+def test_birthday_paradox_array():
+    np = pytest.importorskip('numpy')
+    y = [365, 10 ** 6, 10 ** 6, 2 ** 30, 2 ** 64, 10 ** 7]
+    n = [23, 1000, 10 ** 5, 10 ** 6, 2 ** 32, 10 ** 7 - 5]
+    expected = [BirthdayParadox.probability(*args) for args in zip(y, n)]
+    np.testing.assert_allclose(BirthdayParadox.probability_array(y, n), expected, rtol=1e-12)
+
+
+def set_first_collision(keys, bits):
+    seen = set()
+    for n, key in enumerate(keys, 1):
+        value = int.from_bytes(hashlib.sha256(key).digest()[:8], 'big') >> (64 - bits)
+        if value in seen:
+            return n
+        seen.add(value)
+
+
+@pytest.mark.parametrize('bitmap_max_bits', (30, 0), ids=('bitmap', 'table'))
+@pytest.mark.parametrize('bits', (1, 16, 32))
+def test_first_collision(monkeypatch, bitmap_max_bits, bits):
+    monkeypatch.setattr(hash_func, 'BITMAP_MAX_BITS', bitmap_max_bits)
+    for trial in range(2):
+        expected = set_first_collision(counter_keys(trial), bits)
+        assert first_collision(counter_keys(trial), bits) == expected
+    assert first_collision(itertools.repeat(b'key'), bits) == 2
+    assert first_collision(counter_keys(0), bits, max_keys=1) is None
+
+
+def test_int_hash_set(monkeypatch):
+    monkeypatch.setattr(hash_func, 'TABLE_INITIAL_KEYS', 6)
+    seen = IntHashSet(1000)
+    assert len(seen.slots) == IntHashSet.capacity_for(6) < IntHashSet.capacity_for(1000)
+    values = [secrets.randbits(64) | 1 for _ in range(1000)]
+    assert not any(seen.add(value) for value in values)
+    # 按需翻倍, 不超过 `max_keys` 对应的容量
+    assert len(seen.slots) == IntHashSet.capacity_for(1000) and seen.count == 1000
+    assert all(seen.add(value) for value in values)
+    assert not seen.add(0) and seen.add(0)
+
+
+def test_default_max_keys():
+    assert default_max_keys(40) < default_max_keys(40, 10 ** 4) < default_max_keys(40, 10 ** 6)
+    assert BirthdayParadox.probability(2 ** 40, default_max_keys(40, 100)) >= 1 - 1e-5
+    assert default_max_keys(64, 10 ** 6) == hash_func.TABLE_MAX_KEYS
+
+
+def test_first_collision_bits():
+    with pytest.raises(ValueError):
+        first_collision([], 65)
+    with pytest.raises(ValueError):
+        first_collision([], 160, 'sha1')
+
+
+def test_simulate_collisions():
+    report = simulate_collisions(16, 200, workers=2)
+    assert report.trials == 200 and report.censored == 0
+    assert report.indices == sorted(report.indices)
+    assert report.cdf(1) == 0 and report.cdf(2 ** 16 + 1) == 1
+    # 200 次试验时, Kolmogorov-Smirnov 检验在 0.1% 显著性水平下的临界值约为 0.14
+    assert report.max_deviation() < 0.15
+    assert abs(report.quantile(0.5) - BirthdayParadox.least_number(2 ** 16, 0.5)) < 100
+
+    report = simulate_collisions(32, 2, max_keys=10)
+    assert report.indices == [] and report.censored == 2
+    assert report.quantile(0.5) is None
+
+
+@pytest.fixture
+def tree(tmp_path):
+    files = {}
+    for i, size in enumerate((0, 1, 1000, 100000)):
+        path = tmp_path / f'dir{i % 2}' / f'file{i}'
+        path.parent.mkdir(exist_ok=True)
+        path.write_bytes(secrets.token_bytes(size))
+        files[str(path)] = path.read_bytes()
+    return tmp_path, files
+
+
+@pytest.mark.parametrize('algorithm', ('sha256', 'blake2b'))
+def test_hash_tree(tree, algorithm):
+    root, files = tree
+    for path, data in files.items():
+        assert hash_file(path, algorithm, buffer_size=7) == hashlib.new(algorithm, data).digest()
+
+    res = list(hash_tree(root, algorithm, workers=2))
+    assert len(res) == len(files)
+    for item in res:
+        assert item.digest == hashlib.new(algorithm, files[item.path]).digest()
+        assert item.size == len(files[item.path])
+
+
+def test_hash_file_unmappable():
+    # 管道无法 `mmap`, 只能按块读取
+    read_fd, write_fd = os.pipe()
+    os.write(write_fd, b'1' * 100)
+    os.close(write_fd)
+    assert hash_file(f'/dev/fd/{read_fd}', buffer_size=7) == hashlib.sha256(b'1' * 100).digest()
+    os.close(read_fd)
+
+
+@pytest.mark.parametrize('size', (0, 1, 16, 17, 100))
+def test_merkle_hash_file(tmp_path, size):
+    path = tmp_path / 'file'
+    data = secrets.token_bytes(size)
+    path.write_bytes(data)
+
+    leaves = [hashlib.sha256(b'\x00' + data[i: i + 16]).digest() for i in range(0, max(size, 1), 16)]
+    assert merkle_hash_file(path, chunk_size=16, workers=3) == merkle_root(leaves)
+    if size == 17:
+        assert merkle_root(leaves) == hashlib.sha256(b'\x01' + leaves[0] + leaves[1]).digest()
+
+
+def test_digest_cache(tree, tmp_path_factory):
+    root, files = tree
+    db = tmp_path_factory.mktemp('cache') / 'cache.db'
+    with DigestCache(db) as cache:
+        res = {item.path: item.digest for item in hash_tree(root, workers=2, cache=cache)}
+        assert res == {path: hashlib.sha256(data).digest() for path, data in files.items()}
+        assert (cache.hits, cache.misses) == (0, len(files))
+
+    # 另一个实例 (可以是另一个进程) 打开同一个缓存文件
+    with DigestCache(db) as cache:
+        res = {item.path: item.digest for item in hash_tree(root, cache=cache)}
+        assert res == {path: hashlib.sha256(data).digest() for path, data in files.items()}
+        assert (cache.hits, cache.misses) == (len(files), 0)
+        assert cache.bytes_skipped == sum(len(data) for data in files.values())
+        assert cache.hit_rate == 1.0
+
+        # 文件被修改后重新计算
+        path = next(iter(files))
+        with open(path, 'wb') as f:
+            f.write(b'changed')
+        assert cache.hash_file(path) == hashlib.sha256(b'changed').digest()
+        assert cache.misses == 1
+        assert cache.hash_file(path, 'md5') == hashlib.md5(b'changed').digest()
+        assert len(cache) == len(files) + 1
+
+
+def test_digest_cache_eviction(tree):
+    root, files = tree
+    with DigestCache(max_entries=2) as cache:
+        for path in sorted(files):
+            cache.hash_file(path)
+        assert len(cache) == 2
+        # 最后两个文件仍在缓存中
+        for path in sorted(files)[-2:]:
+            cache.hash_file(path)
+        assert cache.hits == 2
+
+
+def test_digest_cache_bound(tree, tmp_path):
+    """条目数在每次插入后都不超过上限, 用更小的上限重新打开时立即淘汰."""
+    root, files = tree
+    db = tmp_path / 'cache.db'
+    with DigestCache(db, max_entries=5) as cache:
+        for path in sorted(files):
+            cache.hash_file(path)
+            cache.hash_file(path, 'md5')
+            assert len(cache) <= 5
+        assert len(cache) == 5
+
+    with DigestCache(db, max_entries=3) as cache:
+        assert len(cache) == 3
+
+
+def test_digest_cache_touch_interval(tree):
+    """命中时只在访问时间过期后才写入数据库."""
+    root, files = tree
+    path = sorted(files)[0]
+    with DigestCache() as cache:
+        cache.hash_file(path)
+        changes = cache.conn.total_changes
+        for _ in range(3):
+            cache.hash_file(path)
+        assert cache.hits == 3 and cache.conn.total_changes == changes
+
+    with DigestCache(touch_interval_ns=0) as cache:
+        cache.hash_file(path)
+        changes = cache.conn.total_changes
+        cache.hash_file(path)
+        assert cache.conn.total_changes == changes + 1
@@ -0,0 +1,171 @@
+import asyncio
+import struct
+import threading
+
+import pytest
+
+from nami.asymmetric import KeyDistributionCenter, unwrap_session_key
+from nami.key_server import BAD_REQUEST, HEADER, ISSUE, PING, KeyClient, KeyServer, pack_frame, read_frame
+
+
+@pytest.fixture
+def kdc():
+    kdc = KeyDistributionCenter(ttl=60)
+    kdc.master_keys = kdc.register_many(f'user{i}' for i in range(20))
+    return kdc
+
+
+def run_with_server(kdc, tmp_path, transport, scenario, **server_options):
+    """启动服务端, 用连接到它的客户端参数运行 `scenario`."""
+
+    async def main():
+        server = KeyServer(kdc, **server_options)
+        if transport == 'unix':
+            await server.start(path=tmp_path / 'kdc.sock')
+            client_options = {'path': tmp_path / 'kdc.sock'}
+        else:
+            await server.start()
+            client_options = {'port': server.address[1]}
+        async with server:
+            return await scenario(server, client_options)
+
+    return asyncio.run(main())
+
+
+@pytest.mark.parametrize('transport', ('tcp', 'unix'))
+def test_issue_session(kdc, tmp_path, transport):
+    keys = kdc.master_keys
+
+    async def scenario(server, client_options):
+        async with KeyClient(**client_options, pool_size=2) as client:
+            assert await client.ping(b'hello') == b'hello'
+            ticket = await client.issue_session('user1', 'user2')
+            with pytest.raises(KeyError):
+                await client.issue_session('user1', 'mallory')
+            return ticket
+
+    ticket = run_with_server(kdc, tmp_path, transport, scenario)
+    session = kdc.session(ticket.session_id)
+    assert (session.a, session.b) == ('user1', 'user2') and 0 < ticket.ttl <= 60
+    assert unwrap_session_key(keys['user1'], ticket.to_a, ticket.session_id, 'user1', 'user2') == session.key
+    assert unwrap_session_key(keys['user2'], ticket.to_b, ticket.session_id, 'user1', 'user2') == session.key
+
+
+def test_pipelining(kdc, tmp_path):
+    """大量请求并发发出, 服务端按批处理, 一批中出错的请求不影响其他请求."""
+    keys = kdc.master_keys
+    pairs = [(f'user{i % 20}', f'user{(i * 7 + 1) % 20}') for i in range(2000)]
+
+    async def scenario(server, client_options):
+        async with KeyClient(**client_options, pool_size=3, max_inflight=64) as client:
+            tickets = await client.issue_sessions(pairs)
+            results = await asyncio.gather(
+                *(client.issue_session('user0', 'nobody' if i % 3 == 0 else 'user1') for i in range(30)),
+                return_exceptions=True,
+            )
+        return tickets, results, server.batches
+
+    tickets, results, batches = run_with_server(kdc, tmp_path, 'tcp', scenario, max_batch=32)
+    assert len({ticket.session_id for ticket in tickets}) == len(pairs)
+    # 请求被合并处理
+    assert batches < len(pairs) // 4
+    for (a, b), ticket in list(zip(pairs, tickets))[::101]:
+        key = kdc.session(ticket.session_id).key
+        assert unwrap_session_key(keys[a], ticket.to_a, ticket.session_id, a, b) == key
+    for i, result in enumerate(results):
+        assert isinstance(result, KeyError) if i % 3 == 0 else result.to_a
+
+
+def test_issue_off_event_loop(kdc, tmp_path):
+    """签发在线程池中进行, 包括有未登记主体时的逐个重试."""
+    threads = []
+    issue_sessions = kdc.issue_sessions
+
+    def recording_issue_sessions(pairs):
+        threads.append(threading.current_thread())
+        return issue_sessions(pairs)
+
+    kdc.issue_sessions = recording_issue_sessions
+
+    async def scenario(server, client_options):
+        async with KeyClient(**client_options, pool_size=1) as client:
+            return await asyncio.gather(
+                client.issue_session('user1', 'user2'), client.issue_session('user1', 'mallory'),
+                return_exceptions=True,
+            )
+
+    ticket, error = run_with_server(kdc, tmp_path, 'tcp', scenario)
+    assert ticket.to_a and isinstance(error, KeyError)
+    assert threads and threading.main_thread() not in threads
+
+
+def test_backpressure(kdc, tmp_path):
+    """客户端不读取响应时, 服务端停止读取请求, 未处理的请求不会无限堆积."""
+    count, payload = 400, bytes(60000)
+
+    async def scenario(server, client_options):
+        reader, writer = await asyncio.open_connection(port=client_options['port'])
+        writer.write(b''.join(pack_frame(i, PING, payload) for i in range(count)))
+        await asyncio.sleep(0.5)
+        processed = server.requests
+
+        for i in range(count):
+            frame = await read_frame(reader)
+            assert HEADER.unpack_from(frame) == (i, 0) and len(frame) == HEADER.size + len(payload)
+        writer.close()
+        await writer.wait_closed()
+        return processed
+
+    processed = run_with_server(kdc, tmp_path, 'tcp', scenario, max_pending=4, max_batch=4)
+    assert processed < count
+
+
+def test_close_with_stalled_client(kdc):
+    """关闭服务端时, 不读取响应的客户端不会让关闭卡住."""
+
+    async def main():
+        server = await KeyServer(kdc, max_pending=4, max_batch=4).start()
+        _, writer = await asyncio.open_connection(port=server.address[1])
+        writer.write(b''.join(pack_frame(i, PING, bytes(60000)) for i in range(400)))
+        await asyncio.sleep(0.2)
+        await asyncio.wait_for(server.close(), 5)
+        writer.close()
+        return server.connections
+
+    assert asyncio.run(main()) == {}
+
+
+def test_bad_requests(kdc, tmp_path):
+
+    async def scenario(server, client_options):
+        reader, writer = await asyncio.open_connection(port=client_options['port'])
+        # 名字长度超出参数, 未知的操作, 名字不是 UTF-8
+        truncated = pack_frame(1, ISSUE, b'\x00\x05ab')
+        unknown_op = pack_frame(2, 9)
+        bad_name = pack_frame(3, ISSUE, b'\x00\x01\xff\x00\x00')
+        writer.write(truncated + unknown_op + bad_name)
+        statuses = []
+        for _ in range(3):
+            statuses.append(HEADER.unpack_from(await read_frame(reader)))
+        # 长度超过上限的帧直接断开连接
+        writer.write(struct.pack('>I', 1 << 20))
+        assert await read_frame(reader) is None
+        writer.close()
+        await writer.wait_closed()
+
+        # 服务端断开后, 客户端未完成的请求失败, 之后的请求重新连接
+        async with KeyClient(**client_options, pool_size=1) as client:
+            await client.ping()
+            await client.connections[0].close()
+            assert (await client.issue_session('user1', 'user2')).to_a
+        return statuses
+
+    statuses = run_with_server(kdc, tmp_path, 'tcp', scenario)
+    assert statuses == [(1, BAD_REQUEST), (2, BAD_REQUEST), (3, BAD_REQUEST)]
+
+
+def test_client_options():
+    with pytest.raises(ValueError):
+        KeyClient()
+    with pytest.raises(ValueError):
+        KeyClient(port=1, path='kdc.sock')
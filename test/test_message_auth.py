@@ -2,7 +2,9 @@ import hashlib
 import hmac
 import secrets
 
-from nami.message_auth import HmacWithSha256
+import pytest
+
+from nami.message_auth import Hmac, HmacWithSha256, verify
 
 
 def test_hmac_with_sha256():
@@ -10,3 +12,63 @@ def test_hmac_with_sha256():
     msg = '带带我'.encode()
     for key in keys:
         assert HmacWithSha256.digest(key, msg) == hmac.digest(key, msg, hashlib.sha256)
+
+
+def test_hmac():
+    msgs = [secrets.token_bytes(i) for i in (0, 1, 64, 1000)]
+    for key in (secrets.token_bytes(i) for i in (0, 16, 64, 65, 200)):
+        mac = Hmac(key)
+        assert mac.digest_many(msgs) == [hmac.digest(key, msg, hashlib.sha256) for msg in msgs]
+        assert mac.new(msgs[2]).digest() == hmac.digest(key, msgs[2], hashlib.sha256)
+
+        # 分块输入
+        expect = hmac.new(key, digestmod=hashlib.sha256)
+        for msg in msgs:
+            mac.update(msg)
+            expect.update(msg)
+        copied = mac.copy()
+        assert mac.digest() == copied.digest() == expect.digest()
+        assert mac.hexdigest() == expect.hexdigest()
+
+        # 复制后的对象互相独立
+        copied.update(b'1')
+        expect.update(b'1')
+        assert copied.digest() == expect.digest()
+        assert mac.digest() != copied.digest()
+
+
+@pytest.mark.parametrize('digestmod', (
+    hashlib.sha1, hashlib.sha512, hashlib.blake2b, hashlib.sha3_256, 'sha3_512',
+))
+def test_hmac_digestmod(digestmod):
+    msg = secrets.token_bytes(100)
+    block_size = hashlib.new(digestmod).block_size if isinstance(digestmod, str) else digestmod().block_size
+    for key in (secrets.token_bytes(i) for i in (0, block_size, block_size + 1)):
+        mac = Hmac(key, msg, digestmod=digestmod)
+        expect = hmac.new(key, msg, digestmod)
+        assert mac.digest() == expect.digest()
+        assert mac.block_size == expect.block_size
+        assert mac.digest_size == expect.digest_size
+        assert mac.new(msg).digest() == expect.digest()
+
+
+def test_verify():
+    key, msg = secrets.token_bytes(32), secrets.token_bytes(100)
+    tag = hmac.digest(key, msg, hashlib.sha256)
+    assert verify(key, msg, tag)
+    assert verify(key, msg, tag[:16])
+    assert not verify(key, msg + b'1', tag)
+    assert not verify(secrets.token_bytes(32), msg, tag)
+    # 截断得太短或比 MAC 值更长
+    assert not verify(key, msg, tag[:15])
+    assert not verify(key, msg, tag + b'1')
+    assert verify(key, msg, tag[:4], min_tag_size=4)
+    # 空的 tag 不能验证任何消息
+    assert verify(key, msg, tag[:1], min_tag_size=0)
+    assert not verify(key, msg, b'', min_tag_size=0)
+    assert not Hmac(key, msg).verify(b'', min_tag_size=-1)
+
+    tag = hmac.digest(key, msg, hashlib.sha512)
+    assert verify(key, msg, tag, digestmod=hashlib.sha512)
+    assert Hmac(key, msg, hashlib.sha512).verify(tag[:32])
+    assert not verify(key, msg, tag)
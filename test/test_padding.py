@@ -0,0 +1,66 @@
+import secrets
+
+import pytest
+from cryptography.hazmat.primitives import padding
+
+from nami.padding import ANSIX923, ISO10126, PKCS7, Padding, ZeroPadding
+
+
+@pytest.mark.parametrize('padding_cls, expect_cls', (
+    (PKCS7, padding.PKCS7),
+    (ANSIX923, padding.ANSIX923),
+))
+@pytest.mark.parametrize('block_size', (8, 16))
+@pytest.mark.parametrize('length', range(0, 18))
+def test_padding_with_cryptography(padding_cls, expect_cls, block_size, length):
+    msg = secrets.token_bytes(length)
+    padder = expect_cls(block_size * 8).padder()
+    expect = padder.update(msg) + padder.finalize()
+
+    pad = padding_cls(block_size)
+    assert pad.pad(msg) == expect
+    buf = bytearray(msg)
+    assert pad.pad_into(buf) is buf
+    assert buf == expect
+    assert pad.unpad(expect) == msg
+
+
+@pytest.mark.parametrize('padding_cls', (PKCS7, ANSIX923, ISO10126, ZeroPadding))
+@pytest.mark.parametrize('length', range(0, 18))
+def test_padding(padding_cls, length):
+    # 零填充无法区分明文末尾的 0
+    msg = secrets.token_bytes(length).replace(b'\x00', b'\x01')
+    pad = padding_cls(8)
+    padded = pad.pad(msg)
+    assert len(padded) % 8 == 0
+    assert len(padded) - len(msg) == pad.pad_size(len(msg))
+    assert pad.unpad(padded) == msg
+
+
+@pytest.mark.parametrize('padding_cls, data', (
+    (PKCS7, b''),
+    (PKCS7, b'1234567'),
+    (PKCS7, b'1234567\x00'),
+    (PKCS7, b'1234567\x09'),
+    (PKCS7, b'123456\x03\x02'),
+    (PKCS7, b'12345\x02\x03\x03'),
+    (ANSIX923, b'1234567\x00'),
+    (ANSIX923, b'12345\x01\x00\x03'),
+    (ISO10126, b'1234567\x09'),
+    (ZeroPadding, b'1234567'),
+))
+def test_invalid_padding(padding_cls, data):
+    with pytest.raises(ValueError):
+        padding_cls(8).unpad(data)
+
+
+def test_abstract_padding():
+    class Incomplete(Padding):
+
+        def pad_bytes(self, size: int) -> bytes:
+            return bytes(size)
+
+    with pytest.raises(TypeError):
+        Padding(8)
+    with pytest.raises(TypeError):
+        Incomplete(8)
@@ -1,6 +1,10 @@
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
 import pytest
 
-from nami.random_ import HashRandom, LinearCongruentialRandom
+from nami import random_
+from nami.random_ import HashDrbg, HashRandom, LinearCongruentialRandom
 
 
 @pytest.mark.parametrize('random_gen', (
@@ -14,3 +18,160 @@ def test_crypto_random(random_gen):
     v3 = random_gen.random()
     assert v1 != v2
     assert v1 == v3
+
+
+@pytest.fixture(params=(True, False), ids=('numpy', 'python'))
+def use_numpy(request, monkeypatch):
+    if request.param:
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(random_, 'np', None)
+    return request.param
+
+
+@pytest.mark.parametrize('a, c, m', (
+    (3, 0, 7),
+    (48271, 0, 2 ** 31 - 1),
+    (1103515245, 12345, 2 ** 31),
+    (6364136223846793005, 1442695040888963407, 2 ** 64),
+))
+def test_lcg_random_array(use_numpy, a, c, m):
+    r = LinearCongruentialRandom(a, c, m)
+    r.seed(12345)
+    expected = [r.random() for _ in range(1000)]
+    state = r.state
+
+    r.seed(12345)
+    assert list(map(int, r.random_array(333))) + list(map(int, r.random_array(667))) == expected
+    assert r.state == state
+    assert len(r.random_array(0)) == 0 and r.state == state
+
+    if m <= 2 ** 32:
+        r.seed(12345)
+        buf = array('I', bytes(4 * 1000))
+        r.fill(buf)
+        assert buf.tolist() == expected
+
+
+def test_lcg_fill_invalid():
+    r = LinearCongruentialRandom(48271, 0, 2 ** 31 - 1)
+    with pytest.raises(ValueError):
+        r.fill(bytearray(10))
+    with pytest.raises(TypeError):
+        r.fill(array('i', bytes(40)))
+    with pytest.raises(ValueError):
+        LinearCongruentialRandom(3, 0, 2 ** 65).random_array(10)
+
+
+@pytest.mark.parametrize('size', (0, 1, 32, 100, 32 * random_.HASH_CHUNK + 5))
+def test_hash_random_fill(size):
+    r = HashRandom()
+    r.seed(5)
+    count = -(-size // 32)
+    expected = b''.join(bytes.fromhex(r.random()) for _ in range(count))[:size]
+
+    r.seed(5)
+    assert r.random_bytes(size) == expected
+    assert r.state == 5 + count
+
+
+def lcg_values(gen, n):
+    return bytes(gen.random_array(n))
+
+
+def hash_values(gen, n):
+    return gen.random_bytes(32 * n)
+
+
+@pytest.mark.parametrize('a, c, m', (
+    (3, 0, 7),
+    (48271, 0, 2 ** 31 - 1),
+    (6364136223846793005, 1442695040888963407, 2 ** 64),
+))
+@pytest.mark.parametrize('n', (0, 1, 2, 1000, 12345))
+def test_lcg_jump(a, c, m, n):
+    r = LinearCongruentialRandom(a, c, m)
+    r.seed(42)
+    for _ in range(n):
+        r.random()
+    expected = r.state
+
+    r.seed(42)
+    r.jump(n)
+    assert r.state == expected
+    with pytest.raises(ValueError):
+        r.jump(-1)
+
+
+@pytest.mark.parametrize('make, values', (
+    (lambda: LinearCongruentialRandom(6364136223846793005, 1442695040888963407, 2 ** 64), lcg_values),
+    (HashRandom, hash_values),
+))
+def test_spawn(make, values):
+    r = make()
+    r.seed(7)
+    expected = values(r, 4 * 250)
+    state = r.state
+
+    r.seed(7)
+    gens = r.spawn(4, 250)
+    assert r.state == state
+    with ProcessPoolExecutor(2) as pool:
+        results = list(pool.map(values, gens, [250] * len(gens)))
+    assert b''.join(results) == expected
+
+
+@pytest.mark.parametrize('buffer_size', (1, 100, HashDrbg.BUFFER_SIZE))
+def test_hash_drbg_stream(buffer_size):
+    size = 3 * 1000 + 2 * buffer_size
+    expected = HashDrbg(b'seed', buffer_size).randbytes(size)
+    assert len(expected) == size
+
+    drbg = HashDrbg(b'seed', buffer_size)
+    sizes = (0, 10, 1000, buffer_size, 1, 1990, buffer_size - 1)
+    assert b''.join(drbg.randbytes(n) for n in sizes) == expected[:sum(sizes)]
+
+    drbg = HashDrbg(b'seed', buffer_size)
+    buf = bytearray(size)
+    drbg.fill(memoryview(buf)[:10])
+    drbg.fill(memoryview(buf)[10:])
+    assert buf == expected
+
+    assert HashDrbg(b'other', buffer_size).randbytes(size) != expected
+
+
+def test_hash_drbg_reseed():
+    d1, d2 = HashDrbg(b'seed'), HashDrbg(b'seed')
+    d1.randbytes(10)
+    d2.randbytes(10)
+    d1.reseed(b'entropy')
+    d2.reseed(b'entropy')
+    assert d1.randbytes(100) == d2.randbytes(100)
+    d2.reseed()
+    assert d1.randbytes(100) != d2.randbytes(100)
+
+    d1.seed(b'seed')
+    assert d1.randbytes(100) == HashDrbg(b'seed').randbytes(100)
+
+
+def test_hash_drbg_integers():
+    drbg = HashDrbg(b'seed')
+    assert drbg.getrandbits(0) == 0
+    assert all(0 <= drbg.getrandbits(k) < 2 ** k for k in range(1, 130) for _ in range(10))
+    assert {drbg.randbelow(6) for _ in range(1000)} == set(range(6))
+    assert all(drbg.randbelow(2 ** 64 + 1) <= 2 ** 64 for _ in range(100))
+    assert all(0 <= drbg.random() < 1 for _ in range(100))
+    with pytest.raises(ValueError):
+        drbg.randbelow(0)
+    with pytest.raises(ValueError):
+        drbg.getrandbits(-1)
+
+
+def test_hash_drbg_negative_size():
+    drbg = HashDrbg(b'seed', 64)
+    first = drbg.randbytes(16)
+    with pytest.raises(ValueError):
+        drbg.randbytes(-16)
+    # 失败的调用不移动读取位置, 输出不会重复, 也不会包含当前的密钥
+    rest = drbg.randbytes(48 + 64)
+    assert rest[:16] != first and drbg.key not in first + rest
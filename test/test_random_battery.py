@@ -0,0 +1,113 @@
+import math
+
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from nami.random_ import HashDrbg, HashRandom, LinearCongruentialRandom  # noqa: E402
+from nami import random_battery  # noqa: E402
+from nami.random_battery import (  # noqa: E402
+    BirthdaySpacingsTest, FrequencyTest, GapTest, RunsTest, SerialCorrelationTest, StreamTest, chi2_sf,
+    find_period, lcg_period, main, run_battery,
+)
+
+
+@pytest.mark.parametrize('x, df, expected', (
+    (3.841458820694124, 1, 0.05),
+    (18.307038053275146, 10, 0.05),
+    (0.0, 5, 1.0),
+    (1e-3, 2, math.exp(-5e-4)),
+    (100, 2, math.exp(-50)),
+))
+def test_chi2_sf(x, df, expected):
+    assert math.isclose(chi2_sf(x, df), expected, rel_tol=1e-9)
+
+
+def make_lcg():
+    gen = LinearCongruentialRandom(48271, 0, 2 ** 31 - 1)
+    gen.seed(1)
+    return gen
+
+
+def make_hash_random():
+    gen = HashRandom()
+    gen.seed(1)
+    return gen
+
+
+@pytest.mark.parametrize('make', (make_lcg, make_hash_random, lambda: HashDrbg(b'seed')))
+def test_run_battery_pass(make):
+    report = run_battery(make(), 100000, chunk_size=10000)
+    assert report.count == 100000 and len(report.results) == 5
+    assert report.passed(), report.results
+    assert report.values_per_second > 0
+
+
+def test_run_battery_fail():
+    gen = LinearCongruentialRandom(3, 0, 7)
+    gen.seed(6)
+    report = run_battery(gen, 10000)
+    assert not any(result.passed() for result in report.results)
+
+
+@pytest.mark.parametrize('test_cls', (
+    FrequencyTest, RunsTest, SerialCorrelationTest, GapTest, BirthdaySpacingsTest,
+))
+def test_chunk_independent(test_cls):
+    """同样的数据, 无论怎样分块, 结果都相同."""
+    data = np.frombuffer(HashDrbg(b'seed').randbytes(4 * 50000), '<u4') / 2.0 ** 32
+    results = []
+    for chunk_size in (50000, 1000, 777):
+        test = test_cls()
+        for start in range(0, len(data), chunk_size):
+            test.update(data[start: start + chunk_size])
+        results.append(test.result())
+    assert all(math.isclose(result.statistic, results[0].statistic) for result in results)
+
+
+@pytest.mark.parametrize('a, c, m, seed, expected', (
+    (3, 0, 7, 6, (6, 0)),
+    (5, 3, 16, 0, (16, 0)),
+    (2, 0, 12, 1, (2, 2)),
+    (1, 1, 1000, 0, (1000, 0)),
+))
+def test_lcg_period(a, c, m, seed, expected):
+    gen = LinearCongruentialRandom(a, c, m)
+    gen.seed(seed)
+    assert lcg_period(gen) == expected
+    assert lcg_period(gen, limit=expected[0] // 2) is None
+
+
+def test_find_period():
+    assert find_period(lambda x: x, 5) == (1, 0)
+    assert find_period(lambda x: min(x + 1, 100), 0) == (1, 100)
+
+
+def test_main(capsys):
+    assert main(['LinearCongruentialRandom', '48271', '0', '2147483647', '--count', '20000',
+                 '--period-limit', '1000']) == 0
+    assert main(['LinearCongruentialRandom', '3', '0', '7', '--seed', '6', '--count', '20000']) == 1
+    assert main(['HashDrbg', '--count', '20000']) == 0
+    out = capsys.readouterr().out
+    assert 'period: 6' in out and 'FAIL' in out
+    with pytest.raises(ValueError):
+        main(['Feistel'])
+
+
+def test_abstract_stream_test():
+    class Incomplete(StreamTest):
+        def update(self, chunk):
+            pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_main_without_numpy(monkeypatch, capsys):
+    monkeypatch.setattr(random_battery, 'np', None)
+    with pytest.raises(SystemExit) as exc_info:
+        main(['HashDrbg'])
+    assert exc_info.value.code == 2
+    assert 'NumPy is required' in capsys.readouterr().err
+    with pytest.raises(ImportError):
+        run_battery(HashDrbg(), 100)
@@ -1,6 +1,11 @@
+import hashlib
+import secrets
+
 import pytest
 
-from nami.symmetric import Feistel, OneTimePad, TripleDES
+from nami.padding import ANSIX923, ISO10126, PKCS7
+from nami import symmetric
+from nami.symmetric import FF1, Feistel, FeistelEngine, OneTimePad, TripleDES
 from nami.util import Binary
 
 
@@ -18,6 +23,25 @@ def test_oneTimePad():
         assert pad2.decrypt(pad2.encrypt(msg)) == msg
 
 
+@pytest.mark.parametrize('size', (0, 1, 100, 1000))
+def test_oneTimePad_file(tmp_path, monkeypatch, size):
+    monkeypatch.setattr(OneTimePad, 'WINDOW_SIZE', 64)
+    msg = secrets.token_bytes(size)
+    src, key, dst, res = (tmp_path / name for name in ('src', 'key', 'dst', 'res'))
+    src.write_bytes(msg)
+    OneTimePad.generate_key_file(key, size)
+    assert key.stat().st_size == size
+
+    OneTimePad.encrypt_file(src, key, dst)
+    assert dst.read_bytes() == OneTimePad(key.read_bytes()).encrypt(msg)
+    OneTimePad.decrypt_file(dst, key, res)
+    assert res.read_bytes() == msg
+
+    key.write_bytes(b'1' * (size + 1))
+    with pytest.raises(ValueError):
+        OneTimePad.encrypt_file(src, key, dst)
+
+
 @pytest.mark.parametrize('algorithm', (
     lambda x, y: Binary.bytes_xor(x, y),
     lambda x, y: Binary.bytes_xor(10 * x, y),
@@ -33,8 +57,149 @@ def test_Feistel(algorithm, msg, count):
     assert res == msg
 
 
+def hash_round(subkey, half):
+    return int.from_bytes(hashlib.sha256(subkey.to_bytes(8, 'big') + half.to_bytes(8, 'big')).digest()[:8], 'big')
+
+
+@pytest.mark.parametrize('vectorized', (True, False), ids=('numpy', 'int'))
+@pytest.mark.parametrize('half_bits', (4, 20, 32, 48))
+def test_FeistelEngine(monkeypatch, vectorized, half_bits):
+    if not vectorized:
+        monkeypatch.setattr(symmetric, 'np', None)
+    engine = FeistelEngine.from_key(b'key', half_bits)
+    blocks = [secrets.randbits(2 * half_bits) for _ in range(100)]
+    ciphertexts = [engine.encrypt(block) for block in blocks]
+    assert [engine.decrypt(block) for block in ciphertexts] == blocks
+    assert [int(block) for block in engine.encrypt_blocks(blocks)] == ciphertexts
+    assert [int(block) for block in engine.decrypt_blocks(ciphertexts)] == blocks
+
+    data = secrets.token_bytes(101)
+    encrypted = engine.ctr_xor(data, 2 ** 64 - 3)
+    assert engine.ctr_xor(encrypted, 2 ** 64 - 3) == data
+    assert encrypted == FeistelEngine(engine.subkeys, half_bits, vectorized=False).ctr_xor(data, 2 ** 64 - 3)
+
+    # 子密钥的顺序不同, 结果不同
+    reordered = FeistelEngine(engine.subkeys[::-1], half_bits)
+    assert [reordered.encrypt(block) for block in blocks] != ciphertexts
+
+
+def test_FeistelEngine_algorithm():
+    engine = FeistelEngine.from_key(b'key', 16, rounds=4, algorithm=hash_round, vectorized=False)
+    blocks = list(range(1000))
+    ciphertexts = engine.encrypt_blocks(blocks)
+    assert sorted(ciphertexts) != blocks and len(set(ciphertexts)) == len(blocks)
+    assert engine.decrypt_blocks(ciphertexts) == blocks
+    with pytest.raises(ValueError):
+        FeistelEngine.from_key(b'key', 6).ctr_xor(b'data', 0)
+
+
+FF1_KEY = '2B7E151628AED2A6ABF7158809CF4F3C'
+
+
+@pytest.mark.parametrize('key, radix, tweak, plaintext, ciphertext', (
+    # NIST SP 800-38G 示例
+    (FF1_KEY, 10, '', '0123456789', '2433477484'),
+    (FF1_KEY, 10, '39383736353433323130', '0123456789', '6124200773'),
+    (FF1_KEY, 36, '3737373770717273373737', '0123456789abcdefghi', 'a9tv40mll9kdu509eum'),
+    (FF1_KEY + 'EF4359D8D580AA4F', 10, '', '0123456789', '2830668132'),
+    (FF1_KEY + 'EF4359D8D580AA4F7F036D6F04FC6A94', 10, '', '0123456789', '6657667009'),
+))
+def test_FF1_vectors(key, radix, tweak, plaintext, ciphertext):
+    ff1 = FF1(bytes.fromhex(key), radix)
+    assert ff1.encrypt(plaintext, bytes.fromhex(tweak)) == ciphertext
+    assert ff1.decrypt(ciphertext, bytes.fromhex(tweak)) == plaintext
+
+
+@pytest.mark.parametrize('radix, alphabet, length', (
+    (10, None, 6),
+    (10, None, 40),
+    (10, None, 60),
+    (2, None, 200),
+    (16, None, 7),
+    (36, None, 30),
+    (26, 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 8),
+))
+def test_FF1_many(radix, alphabet, length):
+    ff1 = FF1(secrets.token_bytes(16), radix, b'tweak', alphabet=alphabet)
+    texts = [''.join(secrets.choice(ff1.alphabet) for _ in range(length)) for _ in range(20)]
+    texts.append(ff1.alphabet[-1] * (length + 1))
+    ciphertexts = ff1.encrypt_many(texts)
+    assert ciphertexts == [ff1.encrypt(text) for text in texts]
+    assert ff1.decrypt_many(ciphertexts) == texts
+    assert all(len(c) == len(t) and set(c) <= set(ff1.alphabet) for c, t in zip(ciphertexts, texts))
+    assert ff1.encrypt_many(texts, tweak=b'other') != ciphertexts
+
+
+def test_FF1_numerals():
+    ff1 = FF1(secrets.token_bytes(16), 1000)
+    numerals = [999, 0, 123, 456]
+    ciphertext = ff1.encrypt_numerals(numerals)
+    assert len(ciphertext) == 4 and all(0 <= x < 1000 for x in ciphertext)
+    assert ff1.decrypt_numerals(ciphertext) == numerals
+    with pytest.raises(ValueError):
+        ff1.encrypt_numerals([1000, 0, 0, 0])
+
+
+def test_FF1_cycle_walking():
+    ff1 = FF1(secrets.token_bytes(16))
+    domain = 1_234_567
+    values = list(range(0, domain, 997)) + [domain - 1]
+    ciphertexts = ff1.encrypt_ints(values, domain)
+    assert all(0 <= value < domain for value in ciphertexts)
+    assert len(set(ciphertexts)) == len(values)
+    assert ff1.decrypt_ints(ciphertexts, domain) == values
+    assert ff1.decrypt_int(ff1.encrypt_int(42, domain), domain) == 42
+    with pytest.raises(ValueError):
+        ff1.encrypt_int(domain, domain)
+    with pytest.raises(ValueError):
+        ff1.encrypt_int(1, 1000)
+
+
+def test_FF1_invalid():
+    ff1 = FF1(secrets.token_bytes(16))
+    with pytest.raises(ValueError):
+        ff1.encrypt('12345')
+    for text in ('12345a', '123 456', '123_456', '１２３４５６'):
+        with pytest.raises(ValueError):
+            ff1.encrypt(text)
+    with pytest.raises(ValueError):
+        FF1(secrets.token_bytes(16), 1 << 17)
+    with pytest.raises(ValueError):
+        FF1(secrets.token_bytes(16), 3, alphabet='aab')
+
+
 @pytest.mark.parametrize('msg', (b'1', b'1' * TripleDES.BLOCK_SIZE))
 def test_aes(msg):
     key, iv = TripleDES.generate_key()
     aes = TripleDES(key, iv)
     assert aes.decrypt(aes.encrypt(msg)) == msg
+
+
+@pytest.mark.parametrize('padding', (PKCS7(8), ANSIX923(8), ISO10126(16)))
+def test_tripleDES_padding(padding):
+    key, iv = TripleDES.generate_key()
+    des = TripleDES(key, iv, padding=padding)
+    for size in range(0, 20):
+        msg = secrets.token_bytes(size)
+        ciphertext = des.encrypt(msg)
+        # 按分组长度填充, 不会多填充一个分组
+        assert len(ciphertext) == size + padding.pad_size(size)
+        assert des.decrypt(ciphertext) == msg
+
+    with pytest.raises(ValueError):
+        TripleDES(key, iv, padding=PKCS7(12))
+
+
+def test_tripleDES_many():
+    key, iv = TripleDES.generate_key()
+    des = TripleDES(key, iv)
+    records = [secrets.token_bytes(size) for size in (0, 1, 7, 8, 9, 16, 100)]
+    ivs = [TripleDES.generate_key()[1] for _ in records]
+
+    ciphertexts = des.encrypt_many(records, ivs)
+    assert ciphertexts == [TripleDES(key, iv).encrypt(record) for iv, record in zip(ivs, records)]
+    assert des.decrypt_many(ciphertexts, ivs) == records
+    with pytest.raises(ValueError):
+        des.encrypt_many(records, None)
+    with pytest.raises(ValueError):
+        des.decrypt_many(ciphertexts, ivs[1:])
@@ -0,0 +1,46 @@
+import mmap
+import secrets
+
+import pytest
+
+from nami import util
+from nami.util import Binary, bulk_xor
+
+
+def simple_xor(b1: bytes, b2: bytes) -> bytes:
+    return bytes(item1 ^ item2 for item1, item2 in zip(b1, b2))
+
+
+@pytest.fixture(params=(True, False), ids=('numpy', 'int'))
+def backend(request, monkeypatch):
+    if not request.param:
+        monkeypatch.setattr(util, 'np', None)
+        monkeypatch.setattr(util, 'INT_XOR_WINDOW', 7)
+    elif util.np is None:
+        pytest.skip('numpy is not installed')
+
+
+@pytest.mark.parametrize('size', (0, 1, 7, 8, 100, 511, 512, 2000))
+def test_bulk_xor(backend, size):
+    b1, b2 = secrets.token_bytes(size), secrets.token_bytes(size)
+    expect = simple_xor(b1, b2)
+    assert bulk_xor(b1, b2) == expect
+    assert Binary.bytes_xor(bytearray(b1), memoryview(b2)) == expect
+
+    out = bytearray(size + 3)
+    assert bulk_xor(b1, b2, out=out) is out
+    assert out == expect + b'\x00' * 3
+
+    with mmap.mmap(-1, max(size, 1)) as buf:
+        buf[:size] = b1
+        bulk_xor(buf, b2, out=buf)
+        assert buf[:size] == expect
+
+
+def test_bulk_xor_length_mismatch(backend):
+    b1, b2 = secrets.token_bytes(1000), secrets.token_bytes(1001)
+    assert bulk_xor(b1, b2) == simple_xor(b1, b2)
+    with pytest.raises(ValueError):
+        bulk_xor(b1, b2, strict=True)
+    with pytest.raises(ValueError):
+        bulk_xor(b1, b1, out=bytearray(999))